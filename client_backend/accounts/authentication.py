@@ -0,0 +1,103 @@
+import threading
+import uuid
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from monitoring.memory import container_stats, register_memory_source
+from monitoring.metrics import record_cache_lookup
+
+# Per-process LRU of (generation, User), so authenticated requests skip the User query
+_user_cache = TTLCache(maxsize=settings.JWT_USER_CACHE_SIZE, ttl=settings.JWT_USER_CACHE_TTL)
+_user_cache_lock = threading.Lock()
+
+
+def _user_cache_stats():
+    with _user_cache_lock:
+        return {**container_stats(dict(_user_cache.items())), 'maxsize': _user_cache.maxsize}
+
+
+register_memory_source('jwt_user', _user_cache_stats)
+
+
+def get_tokens_for_user(user):
+    """Create a refresh/access token pair carrying the user's email, client_id and is_active"""
+    from .models import UserProfile
+
+    refresh = RefreshToken.for_user(user)
+    refresh['email'] = user.email
+    refresh['is_active'] = user.is_active
+    # For the frontend, as of login; the backend reads the live user and profile
+    refresh['client_id'] = (
+        UserProfile.objects.filter(user_id=user.id).values_list('client_id', flat=True).first() or ''
+    )
+    return refresh
+
+
+def user_generation_key(user_id):
+    return f"jwt_user_generation:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Get a full User from the per-process LRU, loading it on a miss.
+
+    Entries are stamped with the user's generation, kept in the shared cache, so
+    invalidate_cached_user() in any worker drops the user from every worker's
+    LRU; each lookup costs one shared cache read instead of a User query.
+    """
+    generation_key = user_generation_key(user_id)
+    generation = cache.get(generation_key)
+    if generation is None:
+        # None yet, or evicted: start one, so no older entry can match it
+        cache.add(generation_key, uuid.uuid4().hex, None)
+        generation = cache.get(generation_key)
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+    hit = entry is not None and entry[0] == generation
+    record_cache_lookup('jwt_user', hit)
+    if hit:
+        return entry[1]
+
+    try:
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+
+    with _user_cache_lock:
+        _user_cache[user_id] = (generation, user)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    """Drop a user from every process's LRU, including a load running right now"""
+    cache.set(user_generation_key(user_id), uuid.uuid4().hex, None)
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that takes the User from get_cached_user().
+
+    request.user is a real User, so views can pass it to the ORM, and is_active
+    is checked on every request: deactivating or deleting a user locks them out
+    on their next request rather than when their token expires.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = get_cached_user(user_id)
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+INVITE_SUBJECT = "Your Service Charge UK client portal account"
+
+INVITE_BODY = """Hello,
+
+An account has been created for you on the Service Charge UK client portal.
+
+Set your password to activate it:
+{link}
+
+This link stops working once your password has been set.
+"""
+
+
+def make_invite_link(user):
+    """Build the frontend link a provisioned user follows to set their password
+
+    Uses Django's password reset token, which is tied to the user's password
+    hash and last login, so the link can only be used once.
+    """
+    frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    return f"{frontend_url}/accept-invite?uid={uid}&token={token}"
+
+
+def build_invite_message(user):
+    """Invite email as a (subject, message, from_email, recipient_list) tuple for send_mass_mail"""
+    return (
+        INVITE_SUBJECT,
+        INVITE_BODY.format(link=make_invite_link(user)),
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+    )
+
+
+def get_invited_user(uidb64, token):
+    """Get the user an invite link belongs to, or None if the link is invalid or used"""
+    try:
+        user = User.objects.get(pk=force_str(urlsafe_base64_decode(uidb64)))
+    except (TypeError, ValueError, OverflowError, User.DoesNotExist):
+        return None
+    if not default_token_generator.check_token(user, token):
+        return None
+    return user
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Lower
+
+from accounts.authentication import invalidate_cached_user
+from accounts.profile_cache import invalidate_profile_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve accounts that share an email case-insensitively, so migration "
+        "accounts.0006 can build its unique index on lower(email). Of each group the "
+        "account that logged in last (else the oldest) keeps the email; the others "
+        "have it cleared and can still log in with their username."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report the duplicates without changing them")
+
+    def handle(self, *args, **options):
+        emails = list(
+            User.objects.filter(email__gt='')
+            .annotate(email_lower=Lower('email'))
+            .values('email_lower')
+            .annotate(count=Count('id'))
+            .filter(count__gt=1)
+            .values_list('email_lower', flat=True)
+        )
+        cleared = []
+        with transaction.atomic():
+            for email in emails:
+                users = list(
+                    User.objects.annotate(email_lower=Lower('email')).filter(email_lower=email)
+                    .order_by(F('last_login').desc(nulls_last=True), 'date_joined', 'id')
+                    .select_for_update()
+                )
+                keep, duplicates = users[0], users[1:]
+                self.stdout.write(
+                    f"{email}: keeping {keep.username} (id {keep.id}), clearing "
+                    + ', '.join(f"{user.username} (id {user.id})" for user in duplicates)
+                )
+                cleared.extend(user.id for user in duplicates)
+            if cleared and not options['dry_run']:
+                # update() skips the post_save signals, so drop the cached profiles here
+                User.objects.filter(id__in=cleared).update(email='')
+                invalidate_profile_cache(*cleared)
+                for user_id in cleared:
+                    invalidate_cached_user(user_id)
+
+        verb = "Would clear" if options['dry_run'] else "Cleared"
+        self.stdout.write(self.style.SUCCESS(f"{verb} the email of {len(cleared)} duplicate account(s)"))
@@ -0,0 +1,57 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+INDEX_NAME = 'accounts_user_email_lower_uniq'
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """Refuse to build the unique index while case-insensitive duplicates exist"""
+    User = apps.get_model('auth', 'User')
+    duplicates = list(
+        # Read where the index is built: outside a transaction the router would pick the replica
+        User.objects.using(schema_editor.connection.alias).filter(email__gt='')
+        .annotate(email_lower=Lower('email'))
+        .values('email_lower')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+        .values_list('email_lower', flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Cannot create a unique index on lower(auth_user.email); these emails are used by "
+            f"more than one account: {', '.join(duplicates)}. "
+            "Run `python manage.py dedupe_user_emails` first."
+        )
+
+
+def concurrently(schema_editor):
+    # PostgreSQL builds the index without locking auth_user against writes (outside a transaction)
+    return ' CONCURRENTLY' if schema_editor.connection.vendor == 'postgresql' else ''
+
+
+def create_index(apps, schema_editor):
+    # Blank emails (e.g. createsuperuser without an email) are left out
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX{concurrently(schema_editor)} {INDEX_NAME} "
+        "ON auth_user (lower(email)) WHERE email > ''"
+    )
+
+
+def drop_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX{concurrently(schema_editor)} IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0005_admingoogleoauthtoken'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        # Functional index for case-insensitive email lookups (login, signup)
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,13 +1,31 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
+
+def normalize_email(email):
+    """Normalize an email address for case-insensitive comparison"""
+    return (email or '').strip().lower()
+
+
+def users_with_email(email):
+    """Users whose email matches case-insensitively
+
+    The query matches the unique lower(email) index on auth_user (migration
+    0006): LOWER(email) = %s with the index's email > '' predicate.
+    """
+    return User.objects.filter(email__gt='').annotate(
+        email_lower=Lower('email')
+    ).filter(email_lower=normalize_email(email))
+
+
 # Create your models here.
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     client_id = models.CharField(max_length=255, unique=True)
     postcode = models.CharField(max_length=20, null=True, blank=True)
-    
+
     # Additional profile fields
     first_name = models.CharField(max_length=150, blank=True, null=True)
     last_name = models.CharField(max_length=150, blank=True, null=True)
@@ -47,23 +65,23 @@ class AdminGoogleOAuthToken(models.Model):
     scopes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
     def is_expired(self):
         if not self.token_expiry:
             return True
         return timezone.now() >= self.token_expiry
-    
+
     class Meta:
         verbose_name = "Admin Google OAuth Token"
         verbose_name_plural = "Admin Google OAuth Tokens"
-    
+
     def save(self, *args, **kwargs):
         # Ensure only one admin token exists
         if not self.pk and AdminGoogleOAuthToken.objects.exists():
             # Delete existing token if creating new one
             AdminGoogleOAuthToken.objects.all().delete()
         super().save(*args, **kwargs)
-    
+
     def __str__(self):
         return f"Admin Google OAuth Token - Created: {self.created_at}"
 
@@ -0,0 +1,90 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from monitoring.metrics import record_cache_lookup
+from .models import UserProfile
+
+PROFILE_CACHE_ALIAS = 'profiles'
+
+# What a cached entry holds: the profile's columns, and of its user only what
+# UserProfileSerializer shows (never the password hash). Both in model field order.
+PROFILE_FIELDS = tuple(field.attname for field in UserProfile._meta.concrete_fields)
+USER_FIELDS = ('id', 'username', 'email')
+
+
+def profile_cache():
+    return caches[PROFILE_CACHE_ALIAS]
+
+
+def profile_cache_key(user_id):
+    return f"user_profile:{user_id}"
+
+
+def profile_generation_key(user_id):
+    return f"user_profile_generation:{user_id}"
+
+
+def get_cached_profile(user, create=False):
+    """Get a user's profile (with its user's id, username and email) from the profile cache
+
+    Cached entries are dropped by the post_save signals in signals.py, so any
+    profile or user change is picked up on the next request. Each entry is
+    stamped with the user's cache generation, which invalidation replaces: a
+    request that read the profile before a save can't put the old one back.
+    Misses are read wherever the database router sends them: the read replica,
+    unless this request or one of the user's last few wrote (ReplicaPinningMiddleware
+    then pins the reads to the primary, so a lagging replica can't refill the
+    cache with the profile as it was before the save).
+
+    Args:
+        user: Django User object (or any object with an id)
+        create: Create the profile if it doesn't exist yet
+
+    Returns:
+        UserProfile object; fields of profile.user other than USER_FIELDS are
+        deferred (loaded from the database if used)
+
+    Raises:
+        UserProfile.DoesNotExist: If there is no profile and create is False
+    """
+    cache = profile_cache()
+    key = profile_cache_key(user.id)
+    generation_key = profile_generation_key(user.id)
+    found = cache.get_many([key, generation_key])
+    generation = found.get(generation_key)
+    if generation is None:
+        # None yet, or evicted: start one, so no older entry can match it
+        cache.add(generation_key, uuid.uuid4().hex, None)
+        generation = cache.get(generation_key)
+    entry = found.get(key)
+    hit = entry is not None and entry['generation'] == generation
+    record_cache_lookup('profile', hit)
+    if hit:
+        profile = UserProfile.from_db(DEFAULT_DB_ALIAS, PROFILE_FIELDS, entry['profile'])
+        profile.user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, entry['user'])
+        return profile
+
+    queryset = UserProfile.objects.select_related('user')
+    try:
+        profile = queryset.get(user_id=user.id)
+    except UserProfile.DoesNotExist:
+        if not create:
+            raise
+        profile, created = queryset.get_or_create(user_id=user.id)
+
+    cache.set(key, {
+        'generation': generation,
+        'profile': [getattr(profile, name) for name in PROFILE_FIELDS],
+        'user': [getattr(profile.user, name) for name in USER_FIELDS],
+    }, settings.PROFILE_CACHE_TTL)
+    return profile
+
+
+def invalidate_profile_cache(*user_ids):
+    """Drop cached profiles for the given user ids, including ones being filled right now"""
+    cache = profile_cache()
+    cache.set_many({profile_generation_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+    cache.delete_many([profile_cache_key(user_id) for user_id in user_ids])
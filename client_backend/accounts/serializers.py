@@ -1,8 +1,30 @@
+import re
+
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from .models import UserProfile
 
+# Unique constraints a signup can violate: the lower(email) index (migration 0006) and auth_user.username.
+# SQLite names the index, or the column for a column constraint, in its message instead
+EMAIL_CONSTRAINTS = {'accounts_user_email_lower_uniq'}
+USERNAME_CONSTRAINTS = {'auth_user_username_key', 'auth_user.username'}
+
+_sqlite_unique_re = re.compile(r"UNIQUE constraint failed: (?:index '([^']+)'|(\S+))")
+
+
+def violated_constraint(error):
+    """Name of the unique constraint an IntegrityError violated, or None"""
+    diag = getattr(error.__cause__, 'diag', None)  # psycopg
+    if diag is not None:
+        return diag.constraint_name
+    match = _sqlite_unique_re.search(str(error))
+    if match:
+        return match.group(1) or match.group(2)
+    return None
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source='user.email', read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
@@ -35,41 +57,38 @@ class signupSerializer(serializers.ModelSerializer):
         model = User
         fields = ['username', 'email', 'password', 'postcode']
 
-    def validate_username(self, value):
-        # Check if username already exists
-        if User.objects.filter(username=value).exists():
-            raise serializers.ValidationError("A user with this username already exists.")
-        return value
-
-    def validate_email(self, value):
-        # Check if email already exists
-        if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
-        return value
-
     def create(self, validated_data):
-        # Extract postcode before creating user
-        postcode = validated_data.pop('postcode', None)
+        """
+        Create the user and their profile in one transaction.
 
-        # Create user - signal will automatically create UserProfile
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password']
+        Duplicate usernames and emails are caught by the database's unique
+        constraints (auth_user.username and the lower(email) index) rather than
+        by pre-check queries, so signup is BEGIN, two INSERTs and COMMIT.
+        """
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
         )
-        
-        # Update postcode if provided (signal creates profile but may not have postcode)
-        if postcode:
-            try:
-                profile = UserProfile.objects.get(user=user)
-                profile.postcode = postcode
-                profile.save()
-            except UserProfile.DoesNotExist:
-                # If signal didn't create it (shouldn't happen), create it now
-                UserProfile.objects.create(
-                    user=user,
-                    client_id=f"client_{user.id}",
-                    postcode=postcode
-                )
-        
-        return user
\ No newline at end of file
+        user.set_password(validated_data['password'])
+        # Picked up by the create_user_profile signal so the profile is inserted with it
+        user._profile_postcode = validated_data.get('postcode') or ''
+
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError as e:
+            # By constraint name: the message's DETAIL line contains the duplicate value itself
+            constraint = violated_constraint(e)
+            if constraint in EMAIL_CONSTRAINTS:
+                raise serializers.ValidationError({'email': ["A user with this email already exists."]})
+            if constraint in USERNAME_CONSTRAINTS:
+                raise serializers.ValidationError({'username': ["A user with this username already exists."]})
+            raise
+
+        return user
+
+
+class acceptInviteSerializer(serializers.Serializer):
+    uid = serializers.CharField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True, min_length=8)
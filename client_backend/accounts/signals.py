@@ -1,17 +1,36 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import UserProfile
+from .profile_cache import invalidate_profile_cache
+from .authentication import invalidate_cached_user
 
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        # Use get_or_create to avoid duplicate if serializer already created it
-        UserProfile.objects.get_or_create(
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        # Signup sets _profile_postcode so the profile is created complete in one INSERT
+        UserProfile.objects.create(
             user=instance,
-            defaults={
-                'client_id': f"client_{instance.id}",
-                'postcode': kwargs.get('postcode', '') or ''
-            }
-        )
\ No newline at end of file
+            client_id=f"client_{instance.id}",
+            postcode=getattr(instance, '_profile_postcode', '') or ''
+        )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_profile_cache(sender, instance, created=False, **kwargs):
+    # Nothing can be cached yet for a user that was just created
+    if created:
+        return
+    # Cached profiles carry the user's email and username
+    invalidate_profile_cache(instance.id)
+    invalidate_cached_user(instance.id)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    invalidate_profile_cache(instance.user_id)
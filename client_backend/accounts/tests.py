@@ -1,3 +1,192 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import get_tokens_for_user
+from .invites import make_invite_link
+from .models import GoogleOAuthToken, UserProfile
+from .profile_cache import PROFILE_CACHE_ALIAS, get_cached_profile, profile_cache_key
+
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}'}
+    for alias in ('default', 'profiles')
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SignupTests(TestCase):
+    url = '/api/accounts/signup/'
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.client = APIClient()
+        response = self.signup('alice', 'alice@example.com')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def signup(self, username, email):
+        return self.client.post(self.url, {
+            'username': username, 'email': email, 'password': 'test-pass-123', 'postcode': 'SW18 1AA',
+        }, format='json')
+
+    def test_signup_creates_profile(self):
+        profile = UserProfile.objects.get(user__username='alice')
+        self.assertEqual(profile.postcode, 'SW18 1AA')
+
+    def test_duplicate_email_is_rejected(self):
+        response = self.signup('alice2', 'Alice@Example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['email'])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_duplicate_username_is_rejected(self):
+        response = self.signup('alice', 'other@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['username'])
+        self.assertEqual(User.objects.count(), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProfileCacheTests(TestCase):
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.user = User.objects.create_user('bob', email='bob@example.com', password='test-pass-123')
+
+    def test_cached_profile_is_served_without_queries_or_password(self):
+        get_cached_profile(self.user)
+        with self.assertNumQueries(0):
+            profile = get_cached_profile(self.user)
+        self.assertEqual((profile.client_id, profile.user.username, profile.user.email),
+                         (f'client_{self.user.id}', 'bob', 'bob@example.com'))
+        entry = caches[PROFILE_CACHE_ALIAS].get(profile_cache_key(self.user.id))
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_save_during_a_miss_is_not_overwritten(self):
+        cache = caches[PROFILE_CACHE_ALIAS]
+        user = self.user
+
+        class SaveBeforeSet:
+            """The profile cache, with another request saving the profile just before a miss is stored"""
+
+            def __getattr__(self, name):
+                return getattr(cache, name)
+
+            def set(self, *args, **kwargs):
+                profile = UserProfile.objects.get(user=user)
+                profile.city = 'Leeds'
+                profile.save()  # post_save invalidates
+                cache.set(*args, **kwargs)
+
+        with mock.patch('accounts.profile_cache.profile_cache', return_value=SaveBeforeSet()):
+            self.assertIsNone(get_cached_profile(self.user).city)
+        self.assertEqual(get_cached_profile(self.user).city, 'Leeds')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class JWTAuthenticationTests(TestCase):
+    url = '/api/accounts/profile/'
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        self.user = User.objects.create_user('carol', email='carol@example.com', password='test-pass-123')
+        self.client = APIClient()
+
+    def get_profile(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return self.client.get(self.url)
+
+    def test_active_user_is_a_real_user(self):
+        token = get_tokens_for_user(self.user).access_token
+        self.assertEqual(token['email'], 'carol@example.com')
+        response = self.get_profile(token)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['email'], 'carol@example.com')
+        # The ORM accepts request.user
+        user = response.wsgi_request.user
+        self.assertFalse(GoogleOAuthToken.objects.filter(user=user).exists())
+
+    def test_deactivated_user_is_rejected_before_the_token_expires(self):
+        token = get_tokens_for_user(self.user).access_token
+        self.assertEqual(self.get_profile(token).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_profile(token).status_code, 401)
+
+    def test_token_without_claims_is_accepted(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertNotIn('email', token)
+        self.assertEqual(self.get_profile(token).status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DedupeUserEmailsTests(TestCase):
+    def setUp(self):
+        # Accounts from before the unique lower(email) index
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX accounts_user_email_lower_uniq")
+        self.old = User.objects.create_user('dave', email='dave@example.com')
+        self.recent = User.objects.create_user('dave2', email='DAVE@example.com')
+        User.objects.filter(id=self.recent.id).update(last_login=timezone.now())
+
+    def dedupe(self, *args):
+        call_command('dedupe_user_emails', *args, stdout=StringIO())
+        return dict(User.objects.values_list('username', 'email'))
+
+    def test_account_that_logged_in_last_keeps_the_email(self):
+        self.assertEqual(self.dedupe(), {'dave': '', 'dave2': 'DAVE@example.com'})
+
+    def test_dry_run_changes_nothing(self):
+        self.assertEqual(self.dedupe('--dry-run'), {'dave': 'dave@example.com', 'dave2': 'DAVE@example.com'})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AcceptInviteTests(TestCase):
+    url = '/api/accounts/invite/accept/'
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        # As provision_clients creates them: no usable password
+        self.user = User.objects.create_user('erin@example.com', email='erin@example.com')
+        query = parse_qs(urlsplit(make_invite_link(self.user)).query)
+        self.data = {'uid': query['uid'][0], 'token': query['token'][0], 'password': 'new-pass-123'}
+        self.client = APIClient()
+
+    def accept(self):
+        return self.client.post(self.url, self.data, format='json')
+
+    def test_valid_link_sets_the_password_and_logs_in(self):
+        response = self.accept()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('access', response.json())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-pass-123'))
+
+    def test_link_works_once(self):
+        self.assertEqual(self.accept().status_code, 200)
+        self.data['password'] = 'other-pass-456'
+        self.assertEqual(self.accept().status_code, 400)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-pass-123'))
+
+    def test_expired_link_is_rejected(self):
+        expired = default_token_generator._now() + timedelta(seconds=settings.PASSWORD_RESET_TIMEOUT + 1)
+        with mock.patch.object(default_token_generator, '_now', return_value=expired):
+            response = self.accept()
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.has_usable_password())
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import signup, login, user_profile
+from .views import signup, login, user_profile, accept_invite
 from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
@@ -9,4 +9,5 @@ urlpatterns = [
     path('login/', login),  # Custom login with better error messages
     path('token/refresh/', TokenRefreshView.as_view()),
     path('profile/', user_profile),  # Get and update user profile
+    path('invite/accept/', accept_invite),  # Set password for a provisioned account
 ]
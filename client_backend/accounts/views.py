@@ -1,12 +1,15 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
-from .serializers import signupSerializer, UserProfileSerializer
-from .models import UserProfile
+from client_backend.db_router import pin_to_primary, replica_configured
+from .serializers import signupSerializer, UserProfileSerializer, acceptInviteSerializer
+from .models import UserProfile, users_with_email
+from .profile_cache import get_cached_profile
+from .authentication import get_tokens_for_user
+from .invites import get_invited_user
 
 @api_view(['POST'])
 @permission_classes([AllowAny]) 
@@ -17,6 +20,9 @@ def signup(request):
             serializer.save()
             return Response({'message':'User registered successfully'},status=status.HTTP_201_CREATED)
         return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    except serializers.ValidationError as e:
+        # Raised by the serializer when a unique constraint rejects the signup
+        return Response({'errors': e.detail}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({
             'error': 'An error occurred during signup',
@@ -41,12 +47,23 @@ def login(request):
             )
         
         # Try to find user by email first, then by username
-        try:
+        def find_user():
             if '@' in username_or_email:
-                user = User.objects.get(email=username_or_email)
-            else:
-                user = User.objects.get(username=username_or_email)
+                return users_with_email(username_or_email).get()
+            return User.objects.get(username=username_or_email)
+
+        try:
+            user = find_user()
         except User.DoesNotExist:
+            user = None
+        if user is None and replica_configured():
+            # An account created moments ago may not have reached the read replica yet
+            pin_to_primary()
+            try:
+                user = find_user()
+            except User.DoesNotExist:
+                pass
+        if user is None:
             return Response(
                 {'error': 'Account not found'},
                 status=status.HTTP_401_UNAUTHORIZED
@@ -66,8 +83,8 @@ def login(request):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        # Generate tokens
-        refresh = RefreshToken.for_user(user)
+        # Generate tokens (with user claims so requests skip the User query)
+        refresh = get_tokens_for_user(user)
         
         return Response({
             'access': str(refresh.access_token),
@@ -84,6 +101,44 @@ def login(request):
             'detail': str(e) if settings.DEBUG else 'Please try again later'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def accept_invite(request):
+    """
+    Activate a provisioned account from its invite link
+    Sets the password and logs the user in
+    """
+    try:
+        serializer = acceptInviteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = get_invited_user(serializer.validated_data['uid'], serializer.validated_data['token'])
+        if user is None or not user.is_active:
+            return Response(
+                {'error': 'This invite link is invalid or has already been used.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user.set_password(serializer.validated_data['password'])
+        user.save(update_fields=['password'])
+
+        refresh = get_tokens_for_user(user)
+        return Response({
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+            'user': {
+                'id': user.id,
+                'username': user.username,
+                'email': user.email,
+            }
+        }, status=status.HTTP_200_OK)
+    except Exception as e:
+        return Response({
+            'error': 'An error occurred while accepting the invite',
+            'detail': str(e) if settings.DEBUG else 'Please try again later'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET', 'PUT'])
 @permission_classes([IsAuthenticated])
 def user_profile(request):
@@ -93,7 +148,7 @@ def user_profile(request):
     PUT: Updates user profile data
     """
     try:
-        profile, created = UserProfile.objects.get_or_create(user=request.user)
+        profile = get_cached_profile(request.user, create=True)
         
         if request.method == 'GET':
             serializer = UserProfileSerializer(profile)
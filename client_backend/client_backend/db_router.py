@@ -0,0 +1,147 @@
+"""
+Primary/replica database routing.
+
+When DATABASE_REPLICA_URL is configured, ORM reads go to the 'replica' database
+and writes to 'default'. Once a request writes, the rest of the request reads
+from the primary too, and so do that user's requests for the next
+DATABASE_REPLICA_PIN_SECONDS, which covers replication lag (a profile PUT
+followed by a GET sees the new values). Streamed response bodies, produced after
+the middleware has returned, are routed with their request's pin too.
+"""
+import base64
+import binascii
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework_simplejwt.settings import api_settings
+
+from monitoring.telemetry import stream_in_scope
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Set when the current request must read from the primary
+_pinned = ContextVar('db_primary_pinned', default=False)
+# Set when the current request has written to the primary
+_wrote = ContextVar('db_primary_wrote', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def pin_to_primary():
+    """Send the rest of the current request's reads to the primary"""
+    _pinned.set(True)
+
+
+def primary_pin_key(user_id):
+    return f"db_primary_pin:{user_id}"
+
+
+def bearer_user_id(request):
+    """
+    User id claimed by the request's JWT, without verifying the token.
+
+    Only used to decide which database serves the reads; a forged token can at
+    most move its own reads to the primary, and the view still rejects it.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    parts = header.split()
+    if len(parts) != 2 or parts[0] not in api_settings.AUTH_HEADER_TYPES:
+        return None
+    segments = parts[1].split('.')
+    if len(segments) != 3:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(segments[1] + '=' * (-len(segments[1]) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    return payload.get(api_settings.USER_ID_CLAIM) if isinstance(payload, dict) else None
+
+
+class PrimaryReplicaRouter:
+    """Route reads to the replica and writes to the primary (no-op without a replica)"""
+
+    def __init__(self):
+        self.has_replica = replica_configured()
+
+    def db_for_read(self, model, **hints):
+        if not self.has_replica:
+            return None
+        # Reads inside a transaction must see that transaction's writes
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if not self.has_replica:
+            return None
+        _wrote.set(True)
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Scope the primary pin to one request, and carry it over to the user's next requests after a write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.has_replica = replica_configured()
+        self.pin_seconds = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5)
+
+    def __call__(self, request):
+        if not self.has_replica:
+            return self.get_response(request)
+
+        user_id = bearer_user_id(request)
+        state = {'pinned': bool(user_id) and cache.get(primary_pin_key(user_id)) is not None, 'wrote': False}
+        with self.scope(state):
+            response = self.get_response(request)
+        if response.streaming:
+            # The body is produced after this returns; its reads and writes keep the request's pin
+            response.streaming_content = stream_in_scope(
+                lambda: self.scope(state), response.streaming_content,
+                finished=lambda: self.carry_pin(request, user_id, state),
+            )
+        else:
+            self.carry_pin(request, user_id, state)
+        return response
+
+    @contextmanager
+    def scope(self, state):
+        """Route with the request's pin, recording in state whether it wrote"""
+        pinned_token = _pinned.set(state['pinned'])
+        wrote_token = _wrote.set(state['wrote'])
+        try:
+            yield
+        finally:
+            state['pinned'], state['wrote'] = _pinned.get(), _wrote.get()
+            _pinned.reset(pinned_token)
+            _wrote.reset(wrote_token)
+
+    def carry_pin(self, request, user_id, state):
+        """Pin the user's next requests to the primary if this one wrote"""
+        if not state['wrote']:
+            return
+        # DRF sets request.user once it authenticates (signup/login have no bearer token)
+        user = request.__dict__.get('user')
+        if user_id is None and getattr(user, 'is_authenticated', False):
+            user_id = user.id
+        if user_id is not None:
+            cache.set(primary_pin_key(user_id), True, self.pin_seconds)
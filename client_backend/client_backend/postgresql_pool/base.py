@@ -0,0 +1,100 @@
+"""
+PostgreSQL backend that takes its connections from a psycopg_pool ConnectionPool.
+
+Django 4.2 has no built-in pooling, so this wraps the stock postgresql backend:
+each process keeps one pool per database, shared by all of its threads, and a
+connection goes back to the pool when Django closes it at the end of a request
+(CONN_MAX_AGE must be 0).
+
+Pool sizing comes from DATABASES[alias]['OPTIONS']['pool'] (see settings.py).
+"""
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from psycopg import IsolationLevel
+from psycopg_pool import ConnectionPool
+
+# (pid, alias, database name) -> ConnectionPool. Keyed by pid so a forked
+# gunicorn worker never uses pool threads or sockets inherited from its parent.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool_stats():
+    """Statistics for the pools of the current process, by database alias"""
+    pid = os.getpid()
+    stats = {}
+    for (pool_pid, alias, _), pool in list(_pools.items()):
+        if pool_pid == pid:
+            stats[alias] = {
+                'name': pool.name,
+                'min_size': pool.min_size,
+                'max_size': pool.max_size,
+                **pool.get_stats(),
+            }
+    return stats
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        # Pool sizing lives in OPTIONS but isn't a libpq connection parameter
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @property
+    def pool(self):
+        key = (os.getpid(), self.alias, self.settings_dict['NAME'])
+        pool = _pools.get(key)
+        if pool is None:
+            with _pools_lock:
+                pool = _pools.get(key)
+                if pool is None:
+                    pool = self._create_pool()
+                    _pools[key] = pool
+        return pool
+
+    def _create_pool(self):
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured(
+                "The pooled PostgreSQL backend requires CONN_MAX_AGE = 0; "
+                "connections are returned to the pool at the end of each request."
+            )
+        options = dict(self.settings_dict['OPTIONS'].get('pool') or {})
+        # Validate connections as they leave the pool when health checks are enabled
+        check = options.pop('check', self.settings_dict['CONN_HEALTH_CHECKS'])
+        pool = ConnectionPool(
+            kwargs=self.get_connection_params(),
+            name=f"{self.alias}-{os.getpid()}",
+            check=ConnectionPool.check_connection if check else None,
+            open=False,
+            **options,
+        )
+        pool.open(wait=False)
+        return pool
+
+    def get_new_connection(self, conn_params):
+        # Same isolation level handling as the stock backend's get_new_connection
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(
+                IsolationLevel.READ_COMMITTED if isolation_level is None else isolation_level
+            )
+        except ValueError:
+            raise ImproperlyConfigured(
+                f"Invalid transaction isolation level {isolation_level} "
+                f"specified. Use one of the psycopg.IsolationLevel values."
+            )
+        connection = self.pool.getconn()
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            # The pool rolls back anything left open and discards broken connections
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
@@ -36,12 +36,16 @@ INSTALLED_APPS = [
     'rest_framework',
     'sheets',
     'accounts',
+    'monitoring',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be at the top
+    'monitoring.telemetry.RequestTelemetryMiddleware',  # Server-Timing, metrics, request log (REQUEST_LOG)
+    'monitoring.profiling.RequestProfilerMiddleware',  # cProfile for requests with an admin-issued token
     'django.middleware.security.SecurityMiddleware',
+    'client_backend.db_router.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +75,8 @@ CSRF_TRUSTED_ORIGINS = CORS_ALLOWED_ORIGINS.copy()
 
 # Allow all headers and methods for development
 CORS_ALLOW_ALL_HEADERS = True
+# Let the frontend read the per-request timing breakdown
+CORS_EXPOSE_HEADERS = ['Server-Timing', 'X-Profile-Id', 'X-Data-Age']
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -106,15 +112,38 @@ WSGI_APPLICATION = 'client_backend.wsgi.application'
 # Use PostgreSQL if DATABASE_URL is set (Railway provides this automatically)
 # Otherwise, use SQLite for local development
 
+# DATABASE_POOL=True takes connections from a per-process psycopg_pool pool
+# (shared by all threads of a worker) instead of one persistent connection per thread.
+# Each worker process opens up to DATABASE_POOL_MAX_SIZE connections.
+DATABASE_POOL = os.getenv('DATABASE_POOL', 'False') == 'True'
+
 if os.getenv('DATABASE_URL'):
     import dj_database_url
     DATABASES = {
         'default': dj_database_url.config(
             default=os.getenv('DATABASE_URL'),
-            conn_max_age=600,
+            conn_max_age=0 if DATABASE_POOL else 600,
             conn_health_checks=True,
         )
     }
+    # Optional read replica: ORM reads are routed to it by client_backend.db_router
+    if os.getenv('DATABASE_REPLICA_URL'):
+        DATABASES['replica'] = dj_database_url.parse(
+            os.getenv('DATABASE_REPLICA_URL'),
+            conn_max_age=0 if DATABASE_POOL else 600,
+            conn_health_checks=True,
+        )
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    if DATABASE_POOL:
+        for database in DATABASES.values():
+            database['ENGINE'] = 'client_backend.postgresql_pool'
+            database.setdefault('OPTIONS', {})['pool'] = {
+                'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', '10')),
+                'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', '10')),  # Wait for a free connection (seconds)
+                'max_idle': float(os.getenv('DATABASE_POOL_MAX_IDLE', '300')),
+                'max_lifetime': float(os.getenv('DATABASE_POOL_MAX_LIFETIME', '3600')),
+            }
 else:
     DATABASES = {
         'default': {
@@ -123,6 +152,37 @@ else:
         }
     }
 
+DATABASE_ROUTERS = ['client_backend.db_router.PrimaryReplicaRouter']
+
+# After a request writes, that user's reads stay on the primary this long (covers replica lag)
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', '5'))
+
+
+# Cache
+# File-based by default so every gunicorn worker on the host shares one cache
+# (replica pins, Drive metadata and sheet headers must reach all workers).
+# User profiles are kept in a cache of their own (accounts/profile_cache.py),
+# which only stores profile field values, never User objects.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+        },
+    },
+    'profiles': {
+        'BACKEND': os.getenv('PROFILE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('PROFILE_CACHE_LOCATION', str(BASE_DIR / '.cache' / 'profiles')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+        },
+    },
+}
+
+# Lifetime of cached user profiles (seconds); entries are also invalidated on save
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '3600'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -174,7 +234,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedUserJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -187,6 +247,10 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Per-process cache of the User objects that authenticate requests
+JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', '1024'))
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '60'))
+
 
 
 GOOGLE_SHEET_ID = os.getenv('GOOGLE_SHEET_ID', '16KsD6zG9YtOXnrVXg0oRAdie5KBNUfxcbvrTBMFTEd0')
@@ -198,10 +262,93 @@ ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'accounts@servicechargeuk.com')
 GOOGLE_OAUTH_CLIENT_ID = os.getenv('GOOGLE_OAUTH_CLIENT_ID', '')
 GOOGLE_OAUTH_CLIENT_SECRET = os.getenv('GOOGLE_OAUTH_CLIENT_SECRET', '')
 GOOGLE_OAUTH_REDIRECT_URI = os.getenv('GOOGLE_OAUTH_REDIRECT_URI', 'http://localhost:8000/api/sheets/oauth/callback/')
+GOOGLE_OAUTH_TOKEN_URI = os.getenv('GOOGLE_OAUTH_TOKEN_URI', 'https://oauth2.googleapis.com/token')
+
+# Send Sheets/Drive/OAuth2 API calls to this base URL instead of *.googleapis.com,
+# e.g. http://127.0.0.1:8900 for the local fake server (manage.py run_fake_google).
+# Set GOOGLE_OAUTH_TOKEN_URI to <base>/token alongside it.
+GOOGLE_API_BASE_URL = os.getenv('GOOGLE_API_BASE_URL', '')
+
+# Chatbot conversation context cache lifetime (seconds)
+CHATBOT_CONTEXT_TTL = int(os.getenv('CHATBOT_CONTEXT_TTL', '300'))
+
+# Chatbot FAQ corpus (JSON), the minimum similarity for an FAQ answer and the
+# similarity at which an FAQ answer replaces the keyword-based templates
+CHATBOT_FAQ_PATH = os.getenv('CHATBOT_FAQ_PATH', str(BASE_DIR / 'sheets' / 'data' / 'faq.json'))
+CHATBOT_FAQ_MIN_SCORE = float(os.getenv('CHATBOT_FAQ_MIN_SCORE', '0.5'))
+CHATBOT_FAQ_OVERRIDE_SCORE = float(os.getenv('CHATBOT_FAQ_OVERRIDE_SCORE', '0.75'))
 
 # Frontend URL for redirects
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 
+# Outgoing email (account invites from provision_clients)
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', ADMIN_EMAIL)
+
+# Seconds the client sheet tabs are kept as snapshots (sheets/snapshots.py);
+# 0 reads from Google on every lookup
+SHEET_SNAPSHOT_TTL = int(os.getenv('SHEET_SNAPSHOT_TTL', '300'))
+# Directory of the snapshot files the workers share (memory-mapped); empty keeps a copy in each worker
+SHEET_SNAPSHOT_DIR = os.getenv('SHEET_SNAPSHOT_DIR', str(BASE_DIR / '.snapshots'))
+# Seconds past SHEET_SNAPSHOT_TTL during which the old snapshot is still served while it is read again
+# in the background
+SHEET_SNAPSHOT_STALE_GRACE = int(os.getenv('SHEET_SNAPSHOT_STALE_GRACE', '600'))
+# Seconds a worker waits for another worker reading the same tab before reading it itself
+SHEET_SNAPSHOT_LOCK_TIMEOUT = int(os.getenv('SHEET_SNAPSHOT_LOCK_TIMEOUT', '30'))
+
+# How the views look up a client's row without snapshots: 'targeted' reads the header rows (cached for
+# SHEET_HEAD_CACHE_TTL seconds), the identifier column and then only the matching row;
+# 'full' reads the whole sheet
+SHEET_READ_MODE = os.getenv('SHEET_READ_MODE', 'targeted')
+SHEET_HEAD_CACHE_TTL = int(os.getenv('SHEET_HEAD_CACHE_TTL', '300'))
+
+# Seconds the Drive metadata of listed documents is cached (sheets/drive_metadata.py), and for how long
+# after that it is still served while being fetched again in the background
+DRIVE_METADATA_TTL = int(os.getenv('DRIVE_METADATA_TTL', '300'))
+DRIVE_METADATA_STALE_GRACE = int(os.getenv('DRIVE_METADATA_STALE_GRACE', '3600'))
+
+# Per-request timing breakdown (Server-Timing header and Prometheus metrics)
+REQUEST_TELEMETRY = os.getenv('REQUEST_TELEMETRY', 'True') == 'True'
+# Also log the breakdown as one JSON line per request on the 'monitoring.requests' logger
+REQUEST_LOG = os.getenv('REQUEST_LOG', 'False') == 'True'
+
+# Requests slower than this go into the per-worker slow request journal (monitoring/journal.py)
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '2000'))
+SLOW_REQUEST_JOURNAL_SIZE = int(os.getenv('SLOW_REQUEST_JOURNAL_SIZE', '200'))
+
+# Opt-in request profiling (monitoring/profiling.py): requests carrying an admin-issued
+# token are run under cProfile and the newest REQUEST_PROFILE_KEEP profiles are kept
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'True') == 'True'
+REQUEST_PROFILE_DIR = os.getenv('REQUEST_PROFILE_DIR', str(BASE_DIR / '.profiles'))
+REQUEST_PROFILE_KEEP = int(os.getenv('REQUEST_PROFILE_KEEP', '50'))
+REQUEST_PROFILE_TOKEN_TTL = int(os.getenv('REQUEST_PROFILE_TOKEN_TTL', '900'))
+
+# Stack frames recorded per allocation once a tracemalloc snapshot is requested (monitoring/memory.py)
+TRACEMALLOC_FRAMES = int(os.getenv('TRACEMALLOC_FRAMES', '1'))
+
+# Bearer token Prometheus must send to scrape /metrics (the endpoint is off in production without one)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'monitoring': {
+            'handlers': ['console'],
+            'level': os.getenv('MONITORING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Security settings for production
 # Railway handles SSL termination, so we need to trust the proxy
 if not DEBUG:
@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
+from monitoring.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/accounts/', include('accounts.urls')),
     path('api/sheets/', include('sheets.urls')),
+    path('api/monitoring/', include('monitoring.urls')),
+    path('metrics', metrics),  # Prometheus scrape endpoint
 ]
@@ -0,0 +1,22 @@
+"""
+Gunicorn settings, read automatically from the working directory (see Procfile).
+Command-line options in the Procfile take precedence.
+"""
+import os
+import shutil
+
+# Prometheus multiprocess mode: every worker writes its samples to files in
+# this directory and /metrics aggregates them. Set here, before the workers
+# import Django, so prometheus_client picks it up.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/client_portal_metrics')
+
+
+def on_starting(server):
+    # Files left by a previous run would be merged into the new totals
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
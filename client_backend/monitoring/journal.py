@@ -0,0 +1,83 @@
+"""
+Slow request journal.
+
+Requests that take longer than SLOW_REQUEST_THRESHOLD_MS are kept in a ring
+buffer of the last SLOW_REQUEST_JOURNAL_SIZE entries per worker, and logged on
+'monitoring.slow'. Each entry has the endpoint, a hash of the user id, the
+timing breakdown, the Google calls in the order they were made (range or file,
+status, bytes, latency) and the request's notes, such as the step of the
+client lookup that found the user's row. The journal is served to admins at
+/api/monitoring/slow-requests/.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+logger = logging.getLogger('monitoring.slow')
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def hash_user_id(user_id):
+    """Stable, non-reversible stand-in for a user id"""
+    if user_id is None:
+        return None
+    digest = hmac.new(settings.SECRET_KEY.encode('utf-8'), str(user_id).encode('utf-8'), hashlib.sha256)
+    return digest.hexdigest()[:12]
+
+
+def _entries():
+    global _journal
+    if _journal is None:
+        _journal = deque(maxlen=settings.SLOW_REQUEST_JOURNAL_SIZE)
+    return _journal
+
+
+def record_slow_request(request, response, endpoint, telemetry):
+    user = request.__dict__.get('user')
+    entry = {
+        'time': time.time(),
+        'endpoint': endpoint,
+        'method': request.method,
+        'status': response.status_code,
+        'user': hash_user_id(user.id if getattr(user, 'is_authenticated', False) else None),
+        'duration_ms': round(telemetry.elapsed() * 1000, 1),
+        'phases': telemetry.breakdown(),
+        'google_calls': telemetry.google_trace,
+        'notes': telemetry.notes,
+    }
+    with _journal_lock:
+        _entries().append(entry)
+    logger.warning(json.dumps({'event': 'slow_request', **entry}, separators=(',', ':')))
+
+
+def slow_requests(endpoint=None, user=None, limit=None):
+    """Journal entries, newest first, optionally for one endpoint or hashed user"""
+    with _journal_lock:
+        entries = list(_entries())
+    entries.reverse()
+    if endpoint:
+        entries = [entry for entry in entries if entry['endpoint'] == endpoint]
+    if user:
+        entries = [entry for entry in entries if entry['user'] == user]
+    return entries[:limit] if limit else entries
+
+
+def journal_summary(entries):
+    """How often each endpoint and lookup step shows up among the entries"""
+    return {
+        'pid': os.getpid(),
+        'entries': len(entries),
+        'threshold_ms': settings.SLOW_REQUEST_THRESHOLD_MS,
+        'endpoints': Counter(entry['endpoint'] for entry in entries),
+        'lookup_steps': Counter(entry['notes']['lookup_step'] for entry in entries
+                                if 'lookup_step' in entry['notes']),
+    }
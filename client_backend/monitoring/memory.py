@@ -0,0 +1,195 @@
+"""
+Memory accounting for the worker process.
+
+memory_report() gives the worker's resident set size, the Django cache, and the
+size of each in-process cache that registered itself with
+register_memory_source() (the JWT user cache, the FAQ index, ...). Sizes are
+estimated by walking the cached objects, so they cover the strings and lists a
+cache holds, not only the container.
+
+take_snapshot() records a tracemalloc snapshot, starting tracing first if
+needed, so allocations can be ranked by source line and compared between two
+snapshots (before and after a burst of dashboard requests, say). Tracing slows
+allocation down, so it stays off until the first snapshot and stop_tracing()
+turns it off again. It can also be on from startup with PYTHONTRACEMALLOC=<frames>.
+
+Everything here is per worker: each gunicorn worker has its own caches and
+snapshots, and reports its pid.
+"""
+import gc
+import itertools
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+SNAPSHOTS_KEPT = 5
+
+_sources = {}
+_snapshots = OrderedDict()  # id -> (taken at, snapshot)
+_snapshot_numbers = itertools.count(1)
+_snapshot_lock = threading.Lock()
+
+_snapshot_filters = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def register_memory_source(name, stats):
+    """
+    Report an in-process cache in memory_report().
+
+    Args:
+        stats: Callable returning a dict of figures for the cache, usually container_stats(...)
+    """
+    _sources[name] = stats
+
+
+def deep_sizeof(obj):
+    """Approximate bytes held by an object and everything it references through containers and attributes"""
+    seen = set()
+    pending = [obj]
+    total = 0
+    while pending:
+        item = pending.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            pending.extend(item)
+        else:
+            if hasattr(item, '__dict__'):
+                pending.append(item.__dict__)
+            for slot in getattr(type(item), '__slots__', ()):
+                if hasattr(item, slot):
+                    pending.append(getattr(item, slot))
+    return total
+
+
+def container_stats(container):
+    """Entry count and estimated size of a cache container"""
+    return {'entries': len(container), 'bytes': deep_sizeof(container)}
+
+
+def process_memory():
+    """Current and peak resident set size of this process, in bytes"""
+    rss = None
+    try:
+        with open('/proc/self/statm') as statm:
+            rss = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = peak if sys.platform == 'darwin' else peak * 1024
+    return {'rss_bytes': rss, 'peak_rss_bytes': peak}
+
+
+def django_cache_stats(alias='default'):
+    """Entries and size of a Django cache, where the backend allows it"""
+    backend = caches[alias]
+    stats = {'backend': f"{type(backend).__module__}.{type(backend).__name__}"}
+    if hasattr(backend, '_cache') and isinstance(backend._cache, dict):
+        # locmem: values are pickled bytes
+        stats['entries'] = len(backend._cache)
+        stats['bytes'] = sum(len(value) for value in list(backend._cache.values()))
+    elif hasattr(backend, '_dir'):
+        # file-based: on disk, shared by the workers
+        entries = size = 0
+        for name in os.listdir(backend._dir) if os.path.isdir(backend._dir) else ():
+            if name.endswith(backend.cache_suffix):
+                entries += 1
+                try:
+                    size += os.path.getsize(os.path.join(backend._dir, name))
+                except OSError:
+                    pass
+        stats.update(entries=entries, bytes=size, location=backend._dir)
+    return stats
+
+
+def memory_report():
+    sources = {}
+    for name, stats in sorted(_sources.items()):
+        try:
+            sources[name] = stats()
+        except Exception as e:  # a broken source shouldn't hide the others
+            sources[name] = {'error': str(e)}
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    return {
+        'pid': os.getpid(),
+        **process_memory(),
+        'gc': {'objects': len(gc.get_objects()), 'counts': gc.get_count()},
+        'caches': sources,
+        'django_caches': {alias: django_cache_stats(alias) for alias in settings.CACHES},
+        'tracemalloc': {
+            'tracing': tracemalloc.is_tracing(),
+            'frames': tracemalloc.get_traceback_limit(),
+            'traced_bytes': traced,
+            'traced_peak_bytes': traced_peak,
+            'snapshots': list(_snapshots),
+        },
+    }
+
+
+def take_snapshot(frames=None):
+    """Take a tracemalloc snapshot (starting tracing if it is off); returns (snapshot id, snapshot)"""
+    with _snapshot_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or settings.TRACEMALLOC_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces(_snapshot_filters)
+        snapshot_id = f"{os.getpid()}-{next(_snapshot_numbers)}"
+        _snapshots[snapshot_id] = (time.time(), snapshot)
+        while len(_snapshots) > SNAPSHOTS_KEPT:
+            _snapshots.popitem(last=False)
+    return snapshot_id, snapshot
+
+
+def get_snapshot(snapshot_id):
+    """A snapshot taken by this worker, or None"""
+    entry = _snapshots.get(snapshot_id)
+    return entry[1] if entry else None
+
+
+def stop_tracing():
+    """Stop tracemalloc and drop this worker's snapshots"""
+    with _snapshot_lock:
+        _snapshots.clear()
+        tracemalloc.stop()
+
+
+def top_allocations(snapshot, group_by='lineno', limit=20, compare_to=None):
+    """
+    The largest allocation sites of a snapshot, or the largest changes since compare_to.
+
+    Returns:
+        List of dicts with the site, size and count (plus size_diff/count_diff when comparing)
+    """
+    if compare_to is not None:
+        stats = snapshot.compare_to(compare_to, group_by)
+    else:
+        stats = snapshot.statistics(group_by)
+    rows = []
+    for stat in stats[:limit]:
+        row = {
+            'site': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            'bytes': stat.size,
+            'count': stat.count,
+        }
+        if compare_to is not None:
+            row.update(bytes_diff=stat.size_diff, count_diff=stat.count_diff)
+        rows.append(row)
+    return rows
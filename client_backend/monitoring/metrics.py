@@ -0,0 +1,72 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py): every
+worker writes its samples to files in that directory and /metrics aggregates
+all workers. Without it (runserver, management commands) the default
+in-process registry is used.
+"""
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Google calls are mostly 50ms-2s; whole-sheet reads can take several seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+GOOGLE_API_CALLS = Counter(
+    'google_api_calls_total', "Google API HTTP calls", ['api', 'method', 'status']
+)
+GOOGLE_API_LATENCY = Histogram(
+    'google_api_call_duration_seconds', "Google API call latency", ['api', 'method'], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS = Counter(
+    'http_requests_total', "Requests handled", ['endpoint', 'method', 'status']
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', "Request latency", ['endpoint', 'method'], buckets=LATENCY_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', "Cache lookups by cache and result (hit/miss/stale)", ['cache', 'result']
+)
+COALESCED_FETCHES = Counter(
+    'coalesced_fetches_total', "Fetches served by another caller's identical fetch instead of their own",
+    ['source', 'scope']
+)
+SNAPSHOT_AGE = Gauge(
+    'sheet_snapshot_age_seconds', "Age of the sheet snapshot data being served", ['sheet'],
+    multiprocess_mode='livemax'
+)
+
+
+def observe_google_call(api, method, status, seconds):
+    GOOGLE_API_CALLS.labels(api, method, status).inc()
+    GOOGLE_API_LATENCY.labels(api, method).observe(seconds)
+
+
+def observe_request(endpoint, method, status, seconds):
+    HTTP_REQUESTS.labels(endpoint, method, str(status)).inc()
+    HTTP_LATENCY.labels(endpoint, method).observe(seconds)
+
+
+def record_cache_lookup(cache_name, hit, stale=False):
+    """stale: an expired entry was served while it is refreshed in the background"""
+    CACHE_REQUESTS.labels(cache_name, 'stale' if stale else 'hit' if hit else 'miss').inc()
+
+
+def record_coalesced_fetch(source, scope):
+    """scope: 'process' (waited for another thread) or 'workers' (another worker refreshed the shared copy)"""
+    COALESCED_FETCHES.labels(source, scope).inc()
+
+
+def set_snapshot_age(sheet, seconds):
+    SNAPSHOT_AGE.labels(sheet).set(seconds)
+
+
+def render_metrics():
+    """Metrics in the Prometheus text format, aggregated across workers when running multiprocess"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
@@ -0,0 +1,11 @@
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsPortalAdmin(BasePermission):
+    """Only the admin account (settings.ADMIN_EMAIL) may see monitoring data"""
+    message = "Only the admin account can access monitoring endpoints."
+
+    def has_permission(self, request, view):
+        admin_email = getattr(settings, 'ADMIN_EMAIL', 'accounts@servicechargeuk.com')
+        return bool(request.user and request.user.is_authenticated and request.user.email == admin_email)
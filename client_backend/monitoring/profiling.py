@@ -0,0 +1,162 @@
+"""
+Opt-in profiling of single requests.
+
+An admin asks for a signed profiling token (POST /api/monitoring/profiles/token/)
+and sends it with the requests to profile, either as the X-Portal-Profile header
+or as ?profile=<token> for page loads where headers can't be set. A token can be
+limited to one user's requests, so it can be used against a real client's slow
+dashboard. Those requests run under cProfile, and their stats are kept in
+REQUEST_PROFILE_DIR (the newest REQUEST_PROFILE_KEEP of them). The response
+carries an X-Profile-Id header naming the stored profile, which the admin lists,
+reads as a summary or downloads as a .pstats file (snakeviz and gprof2dot turn
+it into a flame graph).
+
+Requests without a token cost one header lookup and a substring check on the
+query string; with REQUEST_PROFILING off the middleware is not loaded at all.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+from client_backend.db_router import bearer_user_id
+
+from .telemetry import current_telemetry
+
+PROFILE_HEADER = 'X-Portal-Profile'
+PROFILE_PARAM = 'profile'
+TOKEN_SALT = 'monitoring.profiling'
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls', 'filename')
+
+_header_key = 'HTTP_' + PROFILE_HEADER.upper().replace('-', '_')
+_param_marker = PROFILE_PARAM + '='
+_profile_id_re = re.compile(r'^[0-9a-f]{32}$')
+
+
+def make_profile_token(issued_by, user_id=None):
+    """Signed token that turns on profiling for requests carrying it (only user_id's requests, if given)"""
+    return signing.dumps({'by': issued_by, 'user': user_id}, salt=TOKEN_SALT)
+
+
+def read_profile_token(token):
+    """The token's grant, or None when it is forged or expired"""
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=settings.REQUEST_PROFILE_TOKEN_TTL)
+    except signing.BadSignature:
+        return None
+
+
+def _path(profile_id, extension):
+    return os.path.join(settings.REQUEST_PROFILE_DIR, f"{profile_id}.{extension}")
+
+
+def save_profile(profiler, request, response, seconds, grant):
+    """Write the stats and a metadata file for one profiled request; returns the profile id"""
+    os.makedirs(settings.REQUEST_PROFILE_DIR, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    profiler.dump_stats(_path(profile_id, 'pstats'))
+
+    telemetry = current_telemetry()
+    metadata = {
+        'id': profile_id,
+        'created': time.time(),
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'user_id': bearer_user_id(request),
+        'duration_ms': round(seconds * 1000, 1),
+        'issued_by': grant.get('by'),
+        'pid': os.getpid(),
+        'phases': telemetry.breakdown() if telemetry else None,
+        'google_calls': telemetry.google_calls if telemetry else None,
+    }
+    temporary = _path(profile_id, 'json.tmp')
+    with open(temporary, 'w', encoding='utf-8') as metadata_file:
+        json.dump(metadata, metadata_file)
+    os.replace(temporary, _path(profile_id, 'json'))
+
+    prune_profiles(settings.REQUEST_PROFILE_KEEP)
+    return profile_id
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first"""
+    try:
+        names = os.listdir(settings.REQUEST_PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        if name.endswith('.json'):
+            metadata = load_profile(name[:-len('.json')])
+            if metadata:
+                profiles.append(metadata)
+    return sorted(profiles, key=lambda metadata: metadata['created'], reverse=True)
+
+
+def prune_profiles(keep):
+    for metadata in list_profiles()[keep:]:
+        for extension in ('json', 'pstats'):
+            try:
+                os.remove(_path(metadata['id'], extension))
+            except FileNotFoundError:
+                pass
+
+
+def load_profile(profile_id):
+    """Metadata of a stored profile, or None"""
+    if not _profile_id_re.match(profile_id):
+        return None
+    try:
+        with open(_path(profile_id, 'json'), encoding='utf-8') as metadata_file:
+            return json.load(metadata_file)
+    except (OSError, ValueError):
+        return None
+
+
+def profile_stats_path(profile_id):
+    return _path(profile_id, 'pstats')
+
+
+def profile_summary(profile_id, sort='cumulative', limit=40):
+    """pstats report of the top functions of a stored profile"""
+    output = io.StringIO()
+    stats = pstats.Stats(profile_stats_path(profile_id), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+class RequestProfilerMiddleware:
+    """Run requests that carry a valid profiling token under cProfile"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get(_header_key)
+        if token is None and _param_marker in request.META.get('QUERY_STRING', ''):
+            token = request.GET.get(PROFILE_PARAM)
+        if not token:
+            return self.get_response(request)
+
+        grant = read_profile_token(token)
+        if grant is None or (grant.get('user') is not None and str(bearer_user_id(request)) != str(grant['user'])):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        seconds = time.perf_counter() - start
+
+        response['X-Profile-Id'] = save_profile(profiler, request, response, seconds, grant)
+        return response
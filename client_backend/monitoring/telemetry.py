@@ -0,0 +1,251 @@
+"""
+Per-request timing breakdown.
+
+RequestTelemetryMiddleware starts a RequestTelemetry for every request; code
+that calls out to slow dependencies records into it through timed()/record()
+(the Google transport, the DB execute wrapper, response rendering). At the end
+of the request the phases are sent as a Server-Timing header and the request is
+counted in the Prometheus metrics; with REQUEST_LOG on they are also logged as
+one JSON line on the 'monitoring.requests' logger. Requests slower than
+SLOW_REQUEST_THRESHOLD_MS also go into the slow request journal, with the trace
+of their Google calls and any notes the code attached with annotate() (such as
+the client lookup step that matched).
+
+Code serving cached data reports its age with note_data_age(); the oldest is
+sent as the X-Data-Age header (seconds), so clients can tell how fresh the
+sheet and Drive data they show is.
+
+A streaming response's body is produced after the middleware has returned;
+its steps are run with the request's telemetry current (stream_in_scope()), and
+the request is reported when the stream ends. Its Server-Timing header only
+covers the time until the headers were sent.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .journal import record_slow_request
+from .metrics import observe_request
+
+logger = logging.getLogger('monitoring.requests')
+
+# Descriptions for the Server-Timing header
+PHASE_DESCRIPTIONS = {
+    'google': "Google API calls",
+    'google_auth': "Google token requests",
+    'google_build': "Google client setup",
+    'db': "Database",
+    'render': "Response rendering",
+    'app': "Application code",
+}
+
+# Google calls kept in a request's trace; later calls are only counted
+MAX_TRACED_GOOGLE_CALLS = 100
+
+_current = ContextVar('request_telemetry', default=None)
+
+
+class RequestTelemetry:
+    """Timings accumulated while one request is handled"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # phase -> [seconds, count]
+        self.google_calls = {}  # API method -> count
+        self.google_trace = []  # the Google calls in order, see trace_google_call()
+        self.notes = {}
+        self.data_age = None  # seconds, oldest cached data served
+
+    def record(self, phase, seconds, label=None):
+        totals = self.phases.setdefault(phase, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        if label and phase == 'google':
+            self.google_calls[label] = self.google_calls.get(label, 0) + 1
+
+    def trace_google_call(self, label, target, status, size, seconds):
+        if len(self.google_trace) < MAX_TRACED_GOOGLE_CALLS:
+            self.google_trace.append({
+                'call': label,
+                'target': target,
+                'status': status,
+                'bytes': size,
+                'ms': round(seconds * 1000, 1),
+                'at_ms': round((time.perf_counter() - seconds - self.started) * 1000, 1),
+            })
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def breakdown(self):
+        """
+        Phase totals in milliseconds, plus 'app' for the time not covered by any
+        phase and 'total' for the whole request so far.
+        """
+        total = self.elapsed()
+        phases = {phase: {'ms': round(seconds * 1000, 1), 'count': count}
+                  for phase, (seconds, count) in self.phases.items()}
+        covered = sum(seconds for seconds, _ in self.phases.values())
+        phases['app'] = {'ms': round(max(total - covered, 0.0) * 1000, 1), 'count': 1}
+        phases['total'] = {'ms': round(total * 1000, 1), 'count': 1}
+        return phases
+
+    def server_timing(self):
+        """Server-Timing header value"""
+        entries = []
+        for phase, values in self.breakdown().items():
+            entry = f"{phase};dur={values['ms']}"
+            description = PHASE_DESCRIPTIONS.get(phase)
+            if description:
+                if phase in ('google', 'db'):
+                    description = f"{description} ({values['count']})"
+                entry += f';desc="{description}"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+def current_telemetry():
+    """The RequestTelemetry of the request being handled, or None outside a request"""
+    return _current.get()
+
+
+def record(phase, seconds, label=None):
+    """Add a timing to the current request, if there is one"""
+    telemetry = _current.get()
+    if telemetry is not None:
+        telemetry.record(phase, seconds, label)
+
+
+def annotate(key, value):
+    """Attach a note to the current request's log line and slow request journal entry"""
+    telemetry = _current.get()
+    if telemetry is not None:
+        telemetry.notes[key] = value
+
+
+def note_data_age(seconds):
+    """Record the age of cached data the current request used"""
+    telemetry = _current.get()
+    if telemetry is not None and (telemetry.data_age is None or seconds > telemetry.data_age):
+        telemetry.data_age = seconds
+
+
+@contextmanager
+def timed(phase, label=None):
+    """Time a block of code as one call of a phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start, label)
+
+
+def _time_query(execute, sql, params, many, context):
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def collecting(telemetry):
+    """Make telemetry the current request's, timing its database queries"""
+    token = _current.set(telemetry)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(_time_query))
+            yield telemetry
+    finally:
+        _current.reset(token)
+
+
+def stream_in_scope(scope, content, finished=None):
+    """
+    Iterate a streaming response's content, running each step inside scope().
+
+    Middleware uses it to keep its per-request state (contextvars) in place
+    while the body is produced, after the middleware itself has returned.
+
+    Args:
+        scope: Callable returning a context manager
+        content: The response's streaming_content
+        finished: Called once the stream has ended or was closed
+    """
+    iterator = iter(content)
+    try:
+        while True:
+            with scope():
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+            yield chunk
+    finally:
+        if finished is not None:
+            finished()
+
+
+class RequestTelemetryMiddleware:
+    """Collect per-phase timings for each request and report them"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_TELEMETRY', True)
+        self.log_requests = getattr(settings, 'REQUEST_LOG', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        telemetry = RequestTelemetry()
+        with collecting(telemetry):
+            response = self.get_response(request)
+
+        response['Server-Timing'] = telemetry.server_timing()
+        if telemetry.data_age is not None:
+            response['X-Data-Age'] = str(int(telemetry.data_age))
+        if response.streaming:
+            response.streaming_content = stream_in_scope(
+                lambda: collecting(telemetry), response.streaming_content,
+                finished=lambda: self.report(request, response, telemetry),
+            )
+        else:
+            self.report(request, response, telemetry)
+        return response
+
+    def report(self, request, response, telemetry):
+        """Count, log and journal a finished request"""
+        # Label by URL pattern, not the raw path, to keep metric cardinality bounded
+        endpoint = request.resolver_match.route if request.resolver_match else 'unmatched'
+        observe_request(endpoint, request.method, response.status_code, telemetry.elapsed())
+        if self.log_requests:
+            self.log(request, response, telemetry)
+        if telemetry.elapsed() * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            record_slow_request(request, response, endpoint, telemetry)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time the rendering
+        telemetry = _current.get()
+        if telemetry is not None:
+            render_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: telemetry.record('render', time.perf_counter() - render_started)
+            )
+        return response
+
+    def log(self, request, response, telemetry):
+        user = request.__dict__.get('user')
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user_id': user.id if getattr(user, 'is_authenticated', False) else None,
+            'phases': telemetry.breakdown(),
+            'google_calls': telemetry.google_calls,
+            **({'notes': telemetry.notes} if telemetry.notes else {}),
+        }, separators=(',', ':')))
@@ -0,0 +1,23 @@
+from django.urls import path
+from .views import (
+    db_pool_stats,
+    memory_snapshot_detail,
+    memory_snapshots,
+    memory_stats,
+    profile_detail,
+    profile_list,
+    profile_token,
+    slow_request_journal,
+)
+
+
+urlpatterns = [
+    path('db-pool/', db_pool_stats, name='db_pool_stats'),
+    path('memory/', memory_stats, name='memory_stats'),
+    path('memory/snapshots/', memory_snapshots, name='memory_snapshots'),
+    path('memory/snapshots/<str:snapshot_id>/', memory_snapshot_detail, name='memory_snapshot_detail'),
+    path('profiles/', profile_list, name='profile_list'),
+    path('profiles/token/', profile_token, name='profile_token'),
+    path('profiles/<str:profile_id>/', profile_detail, name='profile_detail'),
+    path('slow-requests/', slow_request_journal, name='slow_request_journal'),
+]
@@ -0,0 +1,218 @@
+import os
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse, HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from accounts.models import users_with_email
+
+from .journal import hash_user_id, journal_summary, slow_requests
+from .memory import GROUP_BY, get_snapshot, memory_report, stop_tracing, take_snapshot, top_allocations
+from .metrics import render_metrics
+from .permissions import IsPortalAdmin
+from .profiling import (
+    PROFILE_HEADER,
+    PROFILE_PARAM,
+    SORT_KEYS,
+    list_profiles,
+    load_profile,
+    make_profile_token,
+    profile_stats_path,
+    profile_summary,
+)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def db_pool_stats(request):
+    """Database connection settings and pool statistics for the worker process serving the request
+
+    Each gunicorn worker has its own pool, so repeated calls may report different workers (see pid).
+    """
+    databases = {}
+    pool_stats = None
+    for alias in connections:
+        connection = connections[alias]
+        pooled = hasattr(type(connection), 'pool')
+        if pooled and pool_stats is None:
+            from client_backend.postgresql_pool.base import get_pool_stats
+            pool_stats = get_pool_stats()
+        databases[alias] = {
+            'engine': connection.settings_dict['ENGINE'],
+            'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+            'pooled': pooled,
+            # None until the worker opens its first connection
+            'pool': pool_stats.get(alias) if pooled else None,
+        }
+    return Response({'pid': os.getpid(), 'databases': databases}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def profile_token(request):
+    """Issue a signed token that profiles the requests carrying it
+
+    Body (optional): {"user_id": ...} or {"email": ...} to profile only that user's requests.
+    """
+    if not getattr(settings, 'REQUEST_PROFILING', True):
+        return Response({'error': 'Request profiling is disabled (REQUEST_PROFILING)'},
+                        status=status.HTTP_409_CONFLICT)
+    user_id = request.data.get('user_id')
+    email = request.data.get('email')
+    if email and user_id is None:
+        user = users_with_email(email).first()
+        if user is None:
+            return Response({'error': 'No user with that email'}, status=status.HTTP_404_NOT_FOUND)
+        user_id = user.id
+    return Response({
+        'token': make_profile_token(request.user.email, user_id),
+        'user_id': user_id,
+        'expires_in': settings.REQUEST_PROFILE_TOKEN_TTL,
+        'header': PROFILE_HEADER,
+        'query_param': PROFILE_PARAM,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def profile_list(request):
+    """Stored request profiles, newest first"""
+    return Response({'profiles': list_profiles()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def profile_detail(request, profile_id):
+    """A stored profile's metadata and top functions, or the .pstats file with ?download=1
+
+    ?sort= one of cumulative (default), tottime, ncalls, filename; ?limit= number of functions.
+    """
+    metadata = load_profile(profile_id)
+    if metadata is None:
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    if request.GET.get('download'):
+        return FileResponse(open(profile_stats_path(profile_id), 'rb'), as_attachment=True,
+                            filename=f"{profile_id}.pstats", content_type='application/octet-stream')
+
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in SORT_KEYS:
+        return Response({'error': f"sort must be one of {', '.join(SORT_KEYS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 40)), 500))
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({**metadata, 'summary': profile_summary(profile_id, sort, limit)}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def memory_stats(request):
+    """RSS, cache sizes and tracemalloc state of the worker process serving the request"""
+    return Response(memory_report(), status=status.HTTP_200_OK)
+
+
+def _allocation_options(params):
+    group_by = params.get('group_by', 'lineno')
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+    try:
+        limit = max(1, min(int(params.get('limit', 20)), 200))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a number")
+    return group_by, limit
+
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def memory_snapshots(request):
+    """Take a tracemalloc snapshot in this worker (POST), or stop tracing and drop the snapshots (DELETE)
+
+    POST body (optional): {"group_by": "lineno"|"filename"|"traceback", "limit": 20, "compare_to": "<snapshot id>",
+    "frames": <frames per allocation, when this starts tracing>}. The first snapshot starts tracing, so it only
+    covers allocations from then on; take another after some traffic and compare the two.
+    """
+    if request.method == 'DELETE':
+        stop_tracing()
+        return Response({'pid': os.getpid(), 'tracing': False}, status=status.HTTP_200_OK)
+
+    try:
+        group_by, limit = _allocation_options(request.data)
+        frames = int(request.data['frames']) if request.data.get('frames') else None
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    compare_to = None
+    if request.data.get('compare_to'):
+        compare_to = get_snapshot(request.data['compare_to'])
+        if compare_to is None:
+            return Response({'error': f"No snapshot {request.data['compare_to']} in worker {os.getpid()}"},
+                            status=status.HTTP_404_NOT_FOUND)
+
+    snapshot_id, snapshot = take_snapshot(frames)
+    return Response({
+        'id': snapshot_id,
+        'pid': os.getpid(),
+        'compared_to': request.data.get('compare_to'),
+        'top': top_allocations(snapshot, group_by, limit, compare_to),
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def memory_snapshot_detail(request, snapshot_id):
+    """Top allocation sites of a snapshot, or the changes since another one with ?compare_to=<snapshot id>
+
+    Snapshots stay in the worker that took them; other workers answer 404.
+    """
+    snapshot = get_snapshot(snapshot_id)
+    compare_id = request.GET.get('compare_to')
+    compare_to = get_snapshot(compare_id) if compare_id else None
+    for wanted, found in ((snapshot_id, snapshot), (compare_id, compare_to)):
+        if wanted and found is None:
+            return Response({'error': f"No snapshot {wanted} in worker {os.getpid()}"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        group_by, limit = _allocation_options(request.GET)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'id': snapshot_id,
+        'pid': os.getpid(),
+        'compared_to': compare_id,
+        'top': top_allocations(snapshot, group_by, limit, compare_to),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsPortalAdmin])
+def slow_request_journal(request):
+    """Slow requests recorded by the worker serving the request, newest first
+
+    Filters: ?endpoint=<URL pattern>, ?user_id=<id> (matched by its hash), ?limit=<n>.
+    """
+    try:
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    user = hash_user_id(request.GET['user_id']) if request.GET.get('user_id') else None
+    entries = slow_requests(request.GET.get('endpoint'), user, limit)
+    return Response({'summary': journal_summary(entries), 'requests': entries}, status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint
+
+    Requires 'Authorization: Bearer <METRICS_TOKEN>' when METRICS_TOKEN is set;
+    without a token it is only served in DEBUG.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f"Bearer {token}"):
+            return HttpResponse("Unauthorized", status=401)
+    elif not settings.DEBUG:
+        return HttpResponse("Not found", status=404)
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
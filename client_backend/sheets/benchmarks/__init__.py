@@ -0,0 +1,70 @@
+"""
+Offline benchmark suites for the sheets app.
+Run through the bench_* management commands; baselines are stored as JSON in data/.
+"""
+import json
+import os
+import time
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+# Text handed to the calibration loop
+CALIBRATION_TEXT = "Could you tell me how much service charge I pay each year for my flat, please?"
+
+
+def load_baseline(path):
+    """Load a stored JSON baseline, or None if there isn't one yet"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, results):
+    """Store benchmark results as the new JSON baseline"""
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(results, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def calibration_rate(repeat=3, iterations=20000):
+    """
+    Loops per second of a fixed pure-Python workload (lower-casing, splitting
+    and counting words), best of several passes.
+
+    Throughput divided by this rate is roughly the same on any machine, so it
+    can be compared with a baseline recorded elsewhere.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            counts = {}
+            for word in CALIBRATION_TEXT.lower().split():
+                counts[word.strip('?,.')] = counts.get(word, 0) + 1
+        elapsed = time.perf_counter() - start
+        best = max(best, iterations / elapsed if elapsed else 0.0)
+    return best
+
+
+def compare_metric(name, current, baseline, tolerance, higher_is_better=True):
+    """
+    Compare one metric with its baseline value.
+
+    Args:
+        tolerance: Allowed relative change in the bad direction (0.2 = 20%)
+
+    Returns:
+        Regression message, or None if the metric is within tolerance
+    """
+    if baseline is None or current is None:
+        return None
+    if higher_is_better:
+        limit = baseline * (1 - tolerance)
+        if current < limit:
+            return f"{name}: {current:.4g} < baseline {baseline:.4g} (-{tolerance:.0%} allowed)"
+    else:
+        limit = baseline * (1 + tolerance)
+        if current > limit:
+            return f"{name}: {current:.4g} > baseline {baseline:.4g} (+{tolerance:.0%} allowed)"
+    return None
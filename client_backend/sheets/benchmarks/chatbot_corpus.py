@@ -0,0 +1,368 @@
+"""
+Labeled leaseholder message corpus for the chatbot benchmark.
+
+Messages are generated deterministically from phrasing templates so the corpus
+can be rebuilt, and are stored as JSON lines:
+    {"text": ..., "relevant": true/false, "intent": "service_charge" | "faq:<id>" | null}
+
+The labels are what a person would expect, not what the current chatbot does,
+so the benchmark measures real classification accuracy. FAQ messages are
+paraphrases written apart from the FAQ's own questions (which the retrieval
+engine is built from), so they measure how well it generalises.
+
+measure_accuracy() scores the chatbot against the corpus; the bench_chatbot
+command and sheets/tests.py compare it with the stored baseline.
+"""
+import json
+import os
+import random
+
+from sheets.chatbot import detect_intent, find_faq_answer, is_relevant_message
+
+from . import DATA_DIR
+
+CORPUS_PATH = os.path.join(DATA_DIR, 'chatbot_corpus.jsonl')
+BASELINE_PATH = os.path.join(DATA_DIR, 'chatbot_baseline.json')
+
+# Allowed relative drop in accuracy against the baseline
+ACCURACY_TOLERANCE = 0.005
+
+# Phrasings per keyword intent
+INTENT_PHRASES = {
+    "greeting": [
+        "hi", "hello", "hey", "hello there", "hi there", "good morning", "good afternoon",
+        "good evening", "hey there, anyone around?", "greetings", "hiya",
+    ],
+    "service_charge": [
+        "what is my service charge", "how much is my service charge", "what's my annual service charge",
+        "how much service charge do I pay each year", "what is the service charge for my flat",
+        "can you tell me my service charge amount", "how much do I owe in service charges",
+        "what are my service charges this year", "is my service charge going up",
+        "what does the service charge cover",
+    ],
+    "property_size": [
+        "what is my property size", "how big is my property", "how many bedrooms does my flat have",
+        "what size is my property", "how many bedrooms are in my apartment",
+        "what is the floor area of my property", "number of bedrooms in my unit",
+    ],
+    "lease": [
+        "how long is left on my lease", "when does my lease expire", "how many years remain on my lease",
+        "what is my lease term", "am I a leaseholder", "what does my lease say",
+        "when does the lease end",
+    ],
+    "landlord": [
+        "who is my landlord", "who is the managing agent", "what is the name of my landlord",
+        "who manages my building", "who is our managing agent", "how do I contact my landlord",
+    ],
+    "documents": [
+        "where can I find my documents", "can I download the budget report", "where is my invoice pdf",
+        "show me my monthly report", "where are my docs", "I need a copy of my service charge invoice",
+        "how do I view my reports",
+    ],
+    "payment": [
+        "when is my payment due", "what are the payment dates", "when is the next due date",
+        "when do I need to make a payment", "when are payments due", "what is the due date for my bill",
+    ],
+    "location": [
+        "where is my property located", "what is the location of my property", "where is my property",
+        "which area is my flat in", "is my property in wandsworth", "what is my property's postcode",
+    ],
+    "score": [
+        "what is my score", "how is my property rated", "what rating does my building have",
+        "is my charge high compared to others", "is my charge low compared to similar flats",
+        "what's my comparison score",
+    ],
+    "amenities": [
+        "what amenities do we have", "is there a concierge", "what services does my property include",
+        "does the building have a concierge service", "what amenities are included",
+    ],
+    "help": [
+        "can you help me", "I need help", "what can you do", "can you assist me", "help",
+        "what can you help with",
+    ],
+}
+
+# Off-topic questions the chatbot should decline
+OFF_TOPIC_PHRASES = [
+    "what's the weather like tomorrow", "tell me a joke", "who won the football last night",
+    "recommend a good movie", "what's a good recipe for lasagne", "should I buy bitcoin",
+    "what's the price of apple stock", "can you play some music", "who will win the election",
+    "book me a hotel in paris", "what are the best restaurants near me", "any good video games",
+    "what's the latest news", "how do I bake bread", "where should I go on vacation",
+    "what is the capital of france", "how tall is mount everest", "write me a poem",
+    "what's the score in the basketball game", "translate hello into spanish",
+    "how do I fix my car engine", "what is the meaning of life", "who is the best singer",
+    "how many calories in a banana", "what time is it in new york",
+]
+
+# FAQ questions reworded, per FAQ id; never the FAQ's own questions, which the engine is built from
+FAQ_PARAPHRASES = {
+    "reserve_fund": [
+        "what is the reserve fund used for", "why is part of my bill going into a sinking fund",
+        "how does the building reserve fund work",
+    ],
+    "section_20": [
+        "what does section 20 mean for leaseholders", "should the landlord consult us before big works",
+        "explain the section 20 process",
+    ],
+    "major_works": [
+        "who covers the cost of major works", "how will the major works be funded",
+        "do leaseholders pay for the major works",
+    ],
+    "ground_rent": [
+        "how much ground rent do I pay", "is ground rent the same thing as the service charge",
+        "what date is the ground rent payable",
+    ],
+    "year_end_accounts": [
+        "when will the annual service charge accounts be ready", "where can I find last year's accounts",
+        "are the end of year accounts available",
+    ],
+    "balancing_charge": [
+        "why have I been sent a balancing charge", "what is this extra bill after the accounts were done",
+        "what if the actual costs were more than the budget",
+    ],
+    "budget_setting": [
+        "who sets the service charge budget", "how do you work out the annual budget",
+        "how was this year's budget decided",
+    ],
+    "apportionment": [
+        "what share of the building costs do I pay", "how is my percentage of the costs worked out",
+        "how are costs split between the flats",
+    ],
+    "challenge_charge": [
+        "how can I dispute my service charge", "my service charge seems too high, can I challenge it",
+        "can I take my service charge to a tribunal",
+    ],
+    "inspect_invoices": [
+        "can I look at the invoices for the service charge", "I want to see the supporting invoices",
+        "can you send a summary of the costs",
+    ],
+    "buildings_insurance": [
+        "who is the building insured with", "does the service charge include buildings insurance",
+        "can I have a copy of the buildings insurance",
+    ],
+    "insurance_claim": [
+        "how do I claim on the buildings insurance", "my ceiling has water damage, can I make a claim",
+        "who do I speak to about claiming for a leak",
+    ],
+    "emergency_repair": [
+        "who do I ring for an emergency", "there is an emergency in the building, what should I do",
+        "is there an out of hours emergency repair number",
+    ],
+    "report_repair": [
+        "how can I report something that needs repairing", "the light in the communal hallway is broken",
+        "where do I report a maintenance problem",
+    ],
+    "fire_safety": [
+        "has a fire risk assessment been done", "what fire safety measures does the building have",
+        "can I see the latest fire risk assessment",
+    ],
+    "cladding": [
+        "is the cladding on our building safe", "has the building got an EWS1 certificate",
+        "what is the plan for the cladding remediation",
+    ],
+    "subletting": [
+        "am I allowed to sublet my flat", "do I need consent to rent my flat out",
+        "can I let my flat to a tenant",
+    ],
+    "short_lets": [
+        "can I list my flat on airbnb", "are holiday lets allowed in the building",
+        "can I rent out my flat short term",
+    ],
+    "pets": [
+        "am I allowed a dog in my flat", "can I keep a cat in the building", "are pets allowed",
+    ],
+    "alterations": [
+        "do I need permission to renovate my flat", "can I knock down a wall in my flat",
+        "am I allowed to change the flooring",
+    ],
+    "lease_extension": [
+        "what does a lease extension cost", "can I extend my lease", "how do I go about extending my lease",
+    ],
+    "enfranchisement": [
+        "can the leaseholders buy the freehold", "how does collective enfranchisement work",
+        "can we purchase the freehold together",
+    ],
+    "right_to_manage": [
+        "how do we set up a right to manage company", "can the leaseholders take over managing the building",
+        "what does right to manage mean",
+    ],
+    "selling": [
+        "what do I need to sell my flat", "can you send me a management pack", "where do I get an LPE1 form",
+    ],
+    "moving_in": [
+        "I am a new owner, how do I register", "how do I give notice of assignment",
+        "I just bought a flat here, what should I do",
+    ],
+    "payment_methods": [
+        "how do I pay my service charge", "can I set up a direct debit", "what bank details do I pay to",
+    ],
+    "payment_plan": [
+        "can I spread my service charge over instalments", "I can't afford to pay my service charge",
+        "is a payment plan available",
+    ],
+    "arrears": [
+        "what happens if I don't pay my service charge", "will I be charged interest for paying late",
+        "what are the consequences of arrears",
+    ],
+    "demand_form": [
+        "why is there a summary of rights with my demand", "is a demand valid without the summary of rights",
+        "what is the summary of rights and obligations for",
+    ],
+    "vat": [
+        "do you charge VAT on the service charge", "why is VAT added to the management fee",
+    ],
+    "management_fee": [
+        "what is the management fee for", "why do we pay the managing agent a fee",
+        "how much is the managing agent's fee",
+    ],
+    "communal_cleaning": [
+        "how often are the stairwells cleaned", "the communal hallway is dirty", "who cleans the communal areas",
+    ],
+    "lift": [
+        "the lift is out of order", "when will the lift be fixed", "who is responsible for maintaining the lift",
+    ],
+    "parking": [
+        "how do I apply for a parking permit", "someone keeps parking in my space",
+        "where am I allowed to park",
+    ],
+    "refuse": [
+        "what day are the bins collected", "where does the rubbish go", "is there a recycling bin",
+    ],
+    "noise": [
+        "my neighbour is making too much noise", "how do I complain about a noisy neighbour",
+        "who handles disputes between neighbours",
+    ],
+    "keys_fobs": [
+        "I have lost my fob", "how can I get a replacement key fob", "can I get an extra key for the building",
+    ],
+    "complaints": [
+        "how do I complain about the managing agent", "what is your complaints procedure",
+        "I want to make a formal complaint",
+    ],
+    "contact_landlord": [
+        "how can I contact the freeholder", "what address do I use for my landlord", "who is the freeholder",
+    ],
+    "residents_association": [
+        "do we have a residents association", "how do I set up a recognised tenants association",
+        "what is a residents association for",
+    ],
+    "heating": [
+        "does the service charge include heating", "there is no hot water", "who maintains the boiler",
+    ],
+    "window_cleaning": [
+        "how often do the windows get cleaned", "are the outside windows cleaned",
+    ],
+    "gardens": [
+        "who looks after the gardens", "does the service charge cover gardening",
+    ],
+    "portal_access": [
+        "how do I change my email address on the portal", "where can I update my contact details",
+        "how do I change my account details",
+    ],
+}
+
+PREFIXES = ["", "", "", "Quick question: ", "Could you tell me ", "I'd like to know ", "Can you check ", "Sorry, "]
+SUFFIXES = ["", "", "?", "?", " thanks", " please", "??", "."]
+
+
+def _vary(rng, text):
+    """Apply a random prefix, suffix and casing to a phrase"""
+    prefix = rng.choice(PREFIXES)
+    text = prefix + (text[0].lower() + text[1:] if prefix else text)
+    text += rng.choice(SUFFIXES)
+    casing = rng.random()
+    if casing < 0.1:
+        text = text.upper()
+    elif casing < 0.5:
+        text = text[0].upper() + text[1:]
+    return text
+
+
+def generate_corpus(seed=29, variants=16):
+    """
+    Build the labeled corpus.
+
+    Args:
+        seed: Random seed so the corpus is reproducible
+        variants: Number of varied copies of each phrase
+
+    Returns:
+        List of labeled message dictionaries
+    """
+    rng = random.Random(seed)
+    corpus = []
+
+    for intent, phrases in INTENT_PHRASES.items():
+        for phrase in phrases:
+            for _ in range(variants):
+                text = phrase if intent == "greeting" else _vary(rng, phrase)
+                corpus.append({"text": text, "relevant": True, "intent": intent})
+
+    for faq_id, phrases in FAQ_PARAPHRASES.items():
+        for phrase in phrases:
+            for _ in range(variants // 2):
+                corpus.append({"text": _vary(rng, phrase), "relevant": True, "intent": f"faq:{faq_id}"})
+
+    for phrase in OFF_TOPIC_PHRASES:
+        for _ in range(variants * 2):
+            corpus.append({"text": _vary(rng, phrase), "relevant": False, "intent": None})
+
+    rng.shuffle(corpus)
+    return corpus
+
+
+def write_corpus(path=CORPUS_PATH, **kwargs):
+    """Generate the corpus and write it as JSON lines"""
+    corpus = generate_corpus(**kwargs)
+    with open(path, 'w', encoding='utf-8') as corpus_file:
+        for item in corpus:
+            corpus_file.write(json.dumps(item, ensure_ascii=False) + '\n')
+    return corpus
+
+
+def load_corpus(path=CORPUS_PATH):
+    """Load the labeled corpus from JSON lines"""
+    with open(path, encoding='utf-8') as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+def resolve_label(message):
+    """The intent label the chatbot actually answers a message with"""
+    intent = detect_intent(message)
+    faq_match = find_faq_answer(message, intent)
+    if faq_match:
+        return f"faq:{faq_match.entry.faq_id}"
+    return intent
+
+
+def measure_accuracy(corpus):
+    """
+    Score relevance and intent classification against the corpus labels.
+
+    Returns:
+        (results dict, list of (text, 'relevant' or 'intent', expected, actual) errors)
+    """
+    relevance_correct = 0
+    intent_total = 0
+    intent_correct = 0
+    errors = []
+    for item in corpus:
+        is_relevant = is_relevant_message(item['text'])
+        if is_relevant == item['relevant']:
+            relevance_correct += 1
+        else:
+            errors.append((item['text'], 'relevant', item['relevant'], is_relevant))
+        if item['relevant']:
+            intent_total += 1
+            label = resolve_label(item['text'])
+            if label == item['intent']:
+                intent_correct += 1
+            else:
+                errors.append((item['text'], 'intent', item['intent'], label))
+    results = {
+        'messages': len(corpus),
+        'relevance_accuracy': relevance_correct / len(corpus),
+        'intent_accuracy': intent_correct / intent_total if intent_total else 0.0,
+    }
+    return results, errors
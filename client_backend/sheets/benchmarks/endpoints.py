@@ -0,0 +1,33 @@
+"""
+The portal requests the endpoint benchmarks and cassette recordings make.
+"""
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+# upload_document adds documents for the client, so it runs last
+ENDPOINTS = ['client_dashboard', 'client_documents', 'test_client_data', 'chatbot_message', 'upload_document']
+# Endpoints that only read from Google, safe to run against the live sheet
+READ_ENDPOINTS = ENDPOINTS[:-1]
+
+CHATBOT_MESSAGE = "what is my service charge"
+
+
+def endpoint_requests(client, client_id):
+    """
+    One callable per endpoint that makes its request with an authenticated APIClient.
+
+    Args:
+        client_id: Client id the test_client_data request looks up
+    """
+    def upload():
+        document = SimpleUploadedFile('benchmark.pdf', b'%PDF-1.4 ' + b'0' * 10240, content_type='application/pdf')
+        return client.post(reverse('upload_document'), {'file': document, 'name': 'Benchmark upload'},
+                           format='multipart')
+
+    return {
+        'client_dashboard': lambda: client.get(reverse('client_dashboard')),
+        'client_documents': lambda: client.get(reverse('client_documents')),
+        'test_client_data': lambda: client.get(reverse('test_client_data', args=[client_id])),
+        'chatbot_message': lambda: client.post(reverse('chatbot_message'), {'message': CHATBOT_MESSAGE}, format='json'),
+        'upload_document': upload,
+    }
@@ -0,0 +1,122 @@
+"""
+Synthetic client portfolio for the endpoint benchmarks.
+
+generate_portfolio() builds a fixture for sheets.fake_google with the tabs the
+portal reads, at any size:
+    LTP        row 1 unit codes ("degrees"), row 2 header names, then one row per client
+    Input      one header row, then clients that are only on the Input sheet
+    VR         unit code -> header name mapping (columns C:D), one row per unit code
+    Documents  one row per document, with Drive files for the benchmark client's documents
+
+The benchmark client is the last LTP row, so client lookups scan the whole
+sheet. Data is generated from a seed, so a given size always produces the same
+sheets.
+"""
+import random
+
+# LTP headers the dashboard and chatbot use, followed by generic columns
+LTP_HEADERS = [
+    'Client ID', 'Email', 'Name', 'Postcode', 'Service Charge', 'Property Size', 'Bedrooms',
+    'Location', 'Landlord', 'Managing Agent', 'Lease Term', 'Score',
+]
+INPUT_HEADERS = ['client_id', 'email', 'Name', 'Postcode', 'Service Charge', 'Property Size', 'Bedrooms']
+DOCUMENT_HEADERS = ['client_id', 'name', 'type', 'property', 'date', 'uploaded_by', 'file_id', 'description']
+
+FIRST_NAMES = ['Alice', 'Bilal', 'Chloe', 'Dmitri', 'Emeka', 'Fatima', 'George', 'Hana', 'Ivan', 'Jade']
+LAST_NAMES = ['Adams', 'Begum', 'Clarke', 'Dubois', 'Evans', 'Fischer', 'Green', 'Hughes', 'Iqbal', 'Jones']
+AREAS = [('Wandsworth', 'SW18'), ('Hackney', 'E8'), ('Camden', 'NW1'), ('Lambeth', 'SE11'), ('Islington', 'N1')]
+LANDLORDS = ['Star Building Ltd.', 'Riverside Freehold Ltd.', 'Oak Estates plc', 'Northgate Holdings']
+AGENTS = ['London Building Ltd.', 'City Block Management', 'Prime Estates Ltd.']
+DOCUMENT_TYPES = ['budget', 'invoice', 'report', 'lease', 'insurance']
+
+BENCHMARK_EMAIL = 'benchmark.client@example.com'
+BENCHMARK_POSTCODE = 'SW18 1UZ'
+BENCHMARK_DOCUMENTS = 5
+FOLDER_ID = 'bench-folder'
+FOLDER_NAME = 'Client Portal Documents'
+
+
+def ltp_client_id(index):
+    return str(100000 + index)
+
+
+def benchmark_client(rows):
+    """Identifiers of the benchmark client in a portfolio of this size"""
+    return {'email': BENCHMARK_EMAIL, 'client_id': ltp_client_id(rows - 1), 'postcode': BENCHMARK_POSTCODE}
+
+
+def generate_portfolio(rows, spreadsheet_id, extra_columns=18, seed=41):
+    """
+    Fixture for FakeGoogle.load_fixture() with rows clients on each of LTP and Input and rows documents.
+
+    Args:
+        extra_columns: Generic numeric columns added to each LTP row after the named ones
+    """
+    rng = random.Random(seed)
+    headers = LTP_HEADERS + [f"Field {number}" for number in range(1, extra_columns + 1)]
+    # Columns after Postcode carry a unit code, which VR maps back to the header name
+    unit_codes = [''] * 4 + [f'{1 + index // 100}"{index % 100:02d}' for index in range(len(headers) - 4)]
+
+    ltp = [unit_codes, headers]
+    for index in range(rows):
+        area, district = rng.choice(AREAS)
+        if index == rows - 1:
+            email, postcode = BENCHMARK_EMAIL, BENCHMARK_POSTCODE
+        else:
+            email, postcode = f"client{index}@example.com", f"{district} {rng.randint(1, 9)}{rng.choice('ABDEFG')}{rng.choice('HJLNPQ')}"
+        bedrooms = rng.randint(1, 4)
+        ltp.append([
+            ltp_client_id(index),
+            email,
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            postcode,
+            f"£{rng.randint(800, 4500):,}",
+            f"{bedrooms * 250 + rng.randint(0, 200)} Sq ft",
+            str(bedrooms),
+            f"{area}, {postcode}",
+            rng.choice(LANDLORDS),
+            rng.choice(AGENTS),
+            f"{rng.randint(40, 990)} years remaining",
+            rng.choice(['LOW', 'MEDIUM', 'HIGH']),
+        ] + [str(rng.randint(0, 99999)) for _ in range(extra_columns)])
+
+    input_rows = [INPUT_HEADERS]
+    for index in range(rows):
+        area, district = rng.choice(AREAS)
+        bedrooms = rng.randint(1, 4)
+        input_rows.append([
+            str(500000 + index), f"input{index}@example.com", f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            f"{district} {rng.randint(1, 9)}AA", f"£{rng.randint(800, 4500):,}",
+            f"{bedrooms * 250} Sq ft", str(bedrooms),
+        ])
+
+    vr = [['', '', 'Header', 'Unit']]
+    vr += [['', '', header, code] for header, code in zip(headers, unit_codes) if code]
+
+    # The benchmark client's documents are spread through the sheet; only they need Drive files
+    target = benchmark_client(rows)
+    target_rows = {int(rows * (number + 1) / (BENCHMARK_DOCUMENTS + 1)) for number in range(BENCHMARK_DOCUMENTS)}
+    documents = [DOCUMENT_HEADERS]
+    files = [{'id': FOLDER_ID, 'name': FOLDER_NAME, 'mimeType': 'application/vnd.google-apps.folder'}]
+    for index in range(rows):
+        doc_type = rng.choice(DOCUMENT_TYPES)
+        file_id = f"bench-doc-{index}"
+        if index in target_rows:
+            client_id = target['client_id']
+            files.append({'id': file_id, 'name': f"{doc_type}-{index}.pdf", 'mimeType': 'application/pdf',
+                          'parents': [FOLDER_ID], 'content': f"%PDF-1.4 {doc_type} {index}"})
+        else:
+            client_id = ltp_client_id(rng.randrange(max(rows - 1, 1)))
+        documents.append([
+            client_id, f"{doc_type.title()} {index}", doc_type, '',
+            f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2026", 'Admin', file_id, '',
+        ])
+
+    return {
+        'account_email': 'admin@example.com',
+        'spreadsheets': {spreadsheet_id: {
+            'title': f"Benchmark portfolio ({rows} rows)",
+            'sheets': {'LTP': ltp, 'Input': input_rows, 'VR': vr, 'Documents': documents},
+        }},
+        'files': files,
+    }
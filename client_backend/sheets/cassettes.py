@@ -0,0 +1,327 @@
+"""
+Record and replay Google API traffic.
+
+record_cassette() captures every Sheets/Drive/OAuth2 call made by services built
+inside it into a cassette: each call's method and path, the response status,
+headers and body, and how long it took. The cassette is scrubbed before it is
+written:
+    - access/refresh tokens, client secrets and authorization codes are removed,
+      and request headers (Authorization) are never stored
+    - email addresses become stable pseudonyms (user-<hash>@example.invalid),
+      so lookups by email still match on replay
+    - every sheet cell is masked (letters -> x, digits -> 9, so lengths and
+      shapes are kept) except the header rows and the identifier columns
+      (client id, email, Drive file id) the lookups match on; the headers and
+      identifier columns of a tab are learned from the reads that include
+      its first rows, and until then all its cells are masked. The VR tab
+      (unit codes to header names) holds no client data and is kept.
+    - downloaded and uploaded file contents are replaced by their size
+    - any extra patterns passed in (names in Drive file names, say) are masked
+
+ReplayHttp feeds a cassette back into services built through use_transport(),
+with the recorded latency of each call, scaled by time_scale (0 replays
+instantly). Calls are matched on method, path and query; repeated calls get
+the recorded responses in order, and start over once they run out.
+
+Cassettes are JSON, gzipped when the file name ends in .gz.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httplib2
+from django.conf import settings
+from django.utils import timezone
+from googleapiclient.http import build_http
+
+from .google_transport import current_transport_factory, use_transport
+from .sheet_rows import column_count
+
+CASSETTE_VERSION = 1
+SCRUBBED = '<scrubbed>'
+PSEUDONYM_DOMAIN = 'example.invalid'
+
+SECRET_FIELDS = {'access_token', 'refresh_token', 'id_token', 'client_secret', 'code', 'token'}
+SECRET_QUERY_PARAMS = {'access_token', 'oauth_token', 'key'}
+RESPONSE_HEADERS = {'content-type', 'location', 'range'}
+TEXT_CONTENT_TYPES = ('application/json', 'text/', 'multipart/', 'application/x-www-form-urlencoded')
+
+# Columns kept unmasked, by header (any header containing 'email' too)
+IDENTIFIER_HEADERS = {'client_id', 'client id', 'clientid', 'file_id', 'drive_file_id'}
+UNMASKED_SHEETS = {'VR'}
+HEADER_ROWS = 2  # rows searched for the header row (LTP: degrees, then headers)
+
+A1_RANGE_RE = re.compile(r"^(?:'((?:[^']|'')*)'|([^!]*))!\$?([A-Za-z]+)\$?(\d*)")
+EMAIL_RE = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}')
+SECRET_JSON_RE = re.compile(r'"(%s)"\s*:\s*"[^"]*"' % '|'.join(sorted(SECRET_FIELDS)))
+BATCH_ID_RE = re.compile(r'Content-ID: <(?:response-)?([^+>]+)\+', re.IGNORECASE)
+
+
+class CassetteError(Exception):
+    """A replayed request that the cassette has no recording for"""
+
+
+def _is_identifier(header):
+    header = str(header).strip().lower()
+    return header in IDENTIFIER_HEADERS or 'email' in header
+
+
+class Scrubber:
+    """
+    Remove credentials and personal data from recorded traffic.
+
+    Args:
+        patterns: Extra regexes whose matches are masked (letters -> x, digits -> 9)
+    """
+
+    def __init__(self, patterns=()):
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.key = settings.SECRET_KEY.encode('utf-8')
+        self.sheet_layouts = {}  # tab -> (header row number, indexes of the identifier columns)
+
+    def pseudonym(self, email):
+        """Stable stand-in for an email address (the same address always maps to the same pseudonym)"""
+        if email.lower().endswith('@' + PSEUDONYM_DOMAIN):
+            return email
+        digest = hmac.new(self.key, email.strip().lower().encode('utf-8'), hashlib.sha256).hexdigest()
+        return f"user-{digest[:12]}@{PSEUDONYM_DOMAIN}"
+
+    def text(self, value):
+        value = EMAIL_RE.sub(lambda match: self.pseudonym(match.group(0)), value)
+        for pattern in self.patterns:
+            value = pattern.sub(lambda match: _mask(match.group(0)), value)
+        return value
+
+    def cell(self, value):
+        return _mask(str(value))
+
+    def value_range(self, value_range):
+        """Mask a ValueRange's cells in place, except header rows and identifier columns"""
+        rows = value_range.get('values')
+        match = A1_RANGE_RE.match(value_range.get('range', ''))
+        if not rows:
+            return
+        if not match or value_range.get('majorDimension', 'ROWS') != 'ROWS':
+            value_range['values'] = [[self.cell(value) for value in row] for row in rows]
+            return
+        sheet = match.group(1).replace("''", "'") if match.group(1) is not None else match.group(2)
+        if sheet in UNMASKED_SHEETS:
+            return
+        first_column = column_count(match.group(3)) - 1
+        first_row = int(match.group(4) or 1)
+
+        if first_row == 1:
+            for offset, row in enumerate(rows[:HEADER_ROWS]):
+                columns = {first_column + index for index, header in enumerate(row) if _is_identifier(header)}
+                if columns:
+                    _, known = self.sheet_layouts.get(sheet, (None, set()))
+                    self.sheet_layouts[sheet] = (offset + 1, known | columns)
+                    break
+
+        header_row, identifier_columns = self.sheet_layouts.get(sheet, (0, set()))
+        value_range['values'] = [
+            row if first_row + offset <= header_row else
+            [value if first_column + index in identifier_columns else self.cell(value)
+             for index, value in enumerate(row)]
+            for offset, row in enumerate(rows)
+        ]
+
+    def sheet_values(self, text):
+        """JSON body with its sheet cells masked, or None if it holds no sheet values"""
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or not ('values' in data or 'valueRanges' in data):
+            return None
+        for value_range in [data] + list(data.get('valueRanges') or []):
+            self.value_range(value_range)
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+    def uri(self, uri):
+        """Path and query of a request, without credentials"""
+        parts = urlsplit(uri)
+        query = [(key, SCRUBBED if key in SECRET_QUERY_PARAMS else self.text(value))
+                 for key, value in parse_qsl(parts.query, keep_blank_values=True)]
+        return parts.path + (f"?{urlencode(query)}" if query else '')
+
+    def body(self, content, content_type):
+        """
+        Scrubbed body for the cassette.
+
+        Returns:
+            {'text': ...} for JSON/text bodies, {'size': n} for file contents
+        """
+        if not content:
+            return {'text': ''}
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        if not content_type.startswith(TEXT_CONTENT_TYPES):
+            return {'size': len(content)}
+        try:
+            text = content.decode('utf-8')
+        except UnicodeDecodeError:
+            return {'size': len(content)}
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            fields = [(key, SCRUBBED if key in SECRET_FIELDS else self.text(value))
+                      for key, value in parse_qsl(text, keep_blank_values=True)]
+            return {'text': urlencode(fields)}
+        # JSON, and batch responses (multipart text with a JSON body per part), are
+        # scrubbed in place so the recorded bodies keep Google's formatting and size
+        text = SECRET_JSON_RE.sub(rf'"\1": "{SCRUBBED}"', text)
+        if content_type.startswith('application/json'):
+            text = self.sheet_values(text) or text
+        return {'text': self.text(text)}
+
+
+def _mask(value):
+    return re.sub(r'[0-9]', '9', re.sub(r'[A-Za-z]', 'x', value))
+
+
+def request_key(method, uri):
+    """What a replayed call is matched on: method, path and sorted query"""
+    parts = urlsplit(uri)
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in SECRET_QUERY_PARAMS)
+    return f"{method.upper()} {parts.path}?{urlencode(query)}"
+
+
+class Cassette:
+    """Recorded Google calls plus metadata about the session they came from"""
+
+    def __init__(self, interactions=None, metadata=None):
+        self.interactions = interactions or []
+        self.metadata = metadata or {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self._by_key = None
+        self._positions = defaultdict(int)
+
+    @classmethod
+    def load(cls, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as cassette_file:
+            data = json.load(cassette_file)
+        if data.get('version') != CASSETTE_VERSION:
+            raise CassetteError(f"{path}: unsupported cassette version {data.get('version')}")
+        return cls(data['interactions'], data.get('metadata'))
+
+    def save(self, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as cassette_file:
+            json.dump({'version': CASSETTE_VERSION, 'metadata': self.metadata,
+                       'interactions': self.interactions}, cassette_file, ensure_ascii=False)
+
+    def record(self, interaction):
+        with self.lock:
+            interaction['offset'] = round(time.perf_counter() - self.started, 4)
+            self.interactions.append(interaction)
+
+    def play(self, method, uri):
+        """The next recorded interaction for a request, cycling through the recordings for the same call"""
+        key = request_key(method, uri)
+        with self.lock:
+            if self._by_key is None:
+                self._by_key = defaultdict(list)
+                for interaction in self.interactions:
+                    self._by_key[request_key(interaction['method'], interaction['uri'])].append(interaction)
+            recorded = self._by_key.get(key)
+            if not recorded:
+                raise CassetteError(f"No recorded response for {key}")
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            return recorded[position % len(recorded)]
+
+
+class RecordingHttp:
+    """httplib2-compatible wrapper that records every call made through it into a cassette"""
+
+    def __init__(self, http, cassette, scrubber):
+        self.http = http
+        self.cassette = cassette
+        self.scrubber = scrubber
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        start = time.perf_counter()
+        response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        size = len(body) if isinstance(body, (bytes, str)) else None
+        self.cassette.record({
+            'method': method.upper(),
+            'uri': self.scrubber.uri(uri),
+            'request': {'content_type': headers.get('content-type', ''), 'size': size},
+            'status': response.status,
+            'headers': {key: self.scrubber.text(value) for key, value in response.items() if key in RESPONSE_HEADERS},
+            'body': self.scrubber.body(content, response.get('content-type', '')),
+            'elapsed': round(elapsed, 4),
+        })
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+class ReplayHttp:
+    """httplib2-compatible transport that answers requests from a cassette"""
+
+    def __init__(self, cassette, time_scale=1.0):
+        self.cassette = cassette
+        self.time_scale = time_scale
+        self.timeout = None
+        self.redirect_codes = frozenset()
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        interaction = self.cassette.play(method, uri)
+        if self.time_scale and interaction.get('elapsed'):
+            time.sleep(interaction['elapsed'] * self.time_scale)
+
+        recorded = interaction['body']
+        if 'size' in recorded:
+            content = b'\0' * recorded['size']
+        else:
+            content = recorded['text']
+            if urlsplit(uri).path.startswith('/batch/'):
+                content = self._rebase_batch(content, body)
+            content = content.encode('utf-8')
+
+        response = httplib2.Response({'status': str(interaction['status']), **interaction['headers']})
+        return response, content
+
+    @staticmethod
+    def _rebase_batch(content, body):
+        # Batch parts are matched by Content-ID, which embeds a random id per batch
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        new_id = BATCH_ID_RE.search(body or '')
+        old_id = BATCH_ID_RE.search(content)
+        if new_id and old_id:
+            content = content.replace(f"response-{old_id.group(1)}+", f"response-{new_id.group(1)}+")
+        return content
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def record_cassette(path, scrubber=None, metadata=None):
+    """
+    Record the Google calls of services built inside the block and write them to path.
+
+    Yields:
+        The Cassette, whose metadata can be filled in before it is saved
+    """
+    cassette = Cassette(metadata={'recorded_at': timezone.now().isoformat(), **(metadata or {})})
+    scrubber = scrubber or Scrubber()
+    base_factory = current_transport_factory() or build_http
+    with use_transport(lambda: RecordingHttp(base_factory(), cassette, scrubber)):
+        yield cassette
+    cassette.save(path)
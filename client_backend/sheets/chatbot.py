@@ -2,6 +2,8 @@
 Chatbot service for handling client service-related queries.
 Only responds to questions about service charges, property, lease, and related topics.
 """
+from django.conf import settings
+from .faq import match_faq
 
 # Keywords related to client service/website topics
 RELEVANT_KEYWORDS = [
@@ -56,7 +58,118 @@ def is_relevant_message(message):
     
     # Check for relevant keywords
     lower_message = message.lower()
-    return any(keyword in lower_message for keyword in RELEVANT_KEYWORDS)
+    if any(keyword in lower_message for keyword in RELEVANT_KEYWORDS):
+        return True
+    
+    # Accept questions that closely match a known FAQ
+    return match_faq(message) is not None
+
+
+# Intents whose answers are personalised from the client's sheet row
+CLIENT_DATA_INTENTS = {
+    "service_charge", "property_size", "lease", "landlord", "location", "score"
+}
+
+# Default values used when no client data is available
+DEFAULT_CLIENT_FACTS = {
+    "service_charge": "£2,551",
+    "property_size": "710 Sq2",
+    "bedrooms": "2",
+    "location": "Wandsworth, SW18 1UZ",
+    "landlord": "Star Building Ltd.",
+    "managing_agent": "London Building Ltd.",
+    "lease_term": "90 years remaining",
+    "score": "HIGH",
+}
+
+
+def detect_intent(user_message):
+    """
+    Work out which topic a message is about.
+
+    Returns the intent name, or None for relevant but unclear questions.
+    """
+    lower_message = user_message.lower().strip()
+
+    if is_greeting(user_message):
+        return "greeting"
+
+    if "service charge" in lower_message or ("charge" in lower_message and "service" in lower_message):
+        return "service_charge"
+
+    if "property size" in lower_message or ("size" in lower_message and "property" in lower_message) or "bedroom" in lower_message:
+        return "property_size"
+
+    if "lease" in lower_message or "leaseholder" in lower_message:
+        return "lease"
+
+    if "landlord" in lower_message or "managing agent" in lower_message:
+        return "landlord"
+
+    if "document" in lower_message or "doc" in lower_message or "report" in lower_message or "pdf" in lower_message:
+        return "documents"
+
+    if "payment" in lower_message or ("when" in lower_message and "due" in lower_message) or "due date" in lower_message:
+        return "payment"
+
+    if "location" in lower_message or ("where" in lower_message and "property" in lower_message) or "wandsworth" in lower_message or "sw18" in lower_message:
+        return "location"
+
+    if "score" in lower_message or "rating" in lower_message or ("high" in lower_message and "charge" in lower_message) or ("low" in lower_message and "charge" in lower_message):
+        return "score"
+
+    if "amenities" in lower_message or "concierge" in lower_message or ("services" in lower_message and "property" in lower_message):
+        return "amenities"
+
+    if "help" in lower_message or "assist" in lower_message or "what can" in lower_message:
+        return "help"
+
+    return None
+
+
+def find_faq_answer(user_message, intent=None):
+    """
+    Find the FAQ that should answer a message, if any.
+    
+    FAQs answer messages the keyword intents don't cover; they only take over
+    from a keyword intent when the match is confident.
+    
+    Returns:
+        FAQMatch or None
+    """
+    if intent == "greeting":
+        return None
+    faq_match = match_faq(user_message)
+    if not faq_match:
+        return None
+    if intent in (None, "help") or faq_match.score >= settings.CHATBOT_FAQ_OVERRIDE_SCORE:
+        return faq_match
+    return None
+
+
+def needs_client_data(user_message):
+    """Check if answering the message requires the client's data from Google Sheets"""
+    intent = detect_intent(user_message)
+    faq_match = find_faq_answer(user_message, intent)
+    if faq_match:
+        return faq_match.entry.uses_client_data
+    return intent in CLIENT_DATA_INTENTS
+
+
+def build_client_facts(client_data):
+    """
+    Reduce a client's sheet row to the facts the chatbot templates use.
+
+    Args:
+        client_data: Dictionary returned by the client data lookup (or None)
+
+    Returns:
+        Dictionary of the chatbot fact fields present in the row; blank cells are
+        kept, so the reply shows them blank rather than the default value
+    """
+    if not client_data:
+        return {}
+    return {key: client_data[key] for key in DEFAULT_CLIENT_FACTS if key in client_data}
 
 
 def generate_response(user_message, client_data=None):
@@ -70,66 +183,90 @@ def generate_response(user_message, client_data=None):
     Returns:
         Response string
     """
-    lower_message = user_message.lower().strip()
+    intent = detect_intent(user_message)
     
     # Handle greetings
-    if is_greeting(user_message):
+    if intent == "greeting":
         return "Hello! I'm here to help you,How can I assist you today?"
     
     # Use client data if available, otherwise use default values
-    service_charge = client_data.get('service_charge', '£2,551') if client_data else '£2,551'
-    property_size = client_data.get('property_size', '710 Sq2') if client_data else '710 Sq2'
-    bedrooms = client_data.get('bedrooms', '2') if client_data else '2'
-    location = client_data.get('location', 'Wandsworth, SW18 1UZ') if client_data else 'Wandsworth, SW18 1UZ'
-    landlord = client_data.get('landlord', 'Star Building Ltd.') if client_data else 'Star Building Ltd.'
-    managing_agent = client_data.get('managing_agent', 'London Building Ltd.') if client_data else 'London Building Ltd.'
-    lease_term = client_data.get('lease_term', '90 years remaining') if client_data else '90 years remaining'
-    score = client_data.get('score', 'HIGH') if client_data else 'HIGH'
+    facts = dict(DEFAULT_CLIENT_FACTS)
+    if client_data:
+        facts.update({key: client_data[key] for key in DEFAULT_CLIENT_FACTS if key in client_data})
+    service_charge = facts['service_charge']
+    property_size = facts['property_size']
+    bedrooms = facts['bedrooms']
+    location = facts['location']
+    landlord = facts['landlord']
+    managing_agent = facts['managing_agent']
+    lease_term = facts['lease_term']
+    score = facts['score']
+    
+    # Answer from the FAQ corpus when a question matches closely
+    faq_match = find_faq_answer(user_message, intent)
+    if faq_match:
+        return faq_match.entry.render(facts)
     
     # Service charge related
-    if "service charge" in lower_message or ("charge" in lower_message and "service" in lower_message):
+    if intent == "service_charge":
         return f"Your service charge is {service_charge} per year, payable in two installments on 1st January and 30th June. The service charge covers maintenance, amenities, and building management services."
     
     # Property size
-    if "property size" in lower_message or ("size" in lower_message and "property" in lower_message) or "bedroom" in lower_message:
+    if intent == "property_size":
         return f"Your property is {property_size} with {bedrooms} bedrooms, located in {location}."
     
     # Lease related
-    if "lease" in lower_message or "leaseholder" in lower_message:
+    if intent == "lease":
         return f"You are the leaseholder with {lease_term} on your lease. The lease term ends on 31st December each year for service charge purposes."
     
     # Landlord/Managing Agent
-    if "landlord" in lower_message or "managing agent" in lower_message:
+    if intent == "landlord":
         return f"Your landlord is {landlord} and the managing agent is {managing_agent}. You can contact them through the documents section or your account dashboard."
     
     # Documents
-    if "document" in lower_message or "doc" in lower_message or "report" in lower_message or "pdf" in lower_message:
+    if intent == "documents":
         return "You can find your documents in the 'Docs' section above. Available documents include Budget Report, Monthly Report, and Service Charge Invoice. Click on any document to view or download."
     
     # Payment dates
-    if "payment" in lower_message or ("when" in lower_message and "due" in lower_message) or "due date" in lower_message:
+    if intent == "payment":
         return "Service charge payments are due on 1st January and 30th June each year. The service charge year ends on 31st December."
     
     # Location
-    if "location" in lower_message or ("where" in lower_message and "property" in lower_message) or "wandsworth" in lower_message or "sw18" in lower_message:
+    if intent == "location":
         return f"Your property is located in {location}. You can view the location on the map above."
     
     # Score/Rating
-    if "score" in lower_message or "rating" in lower_message or ("high" in lower_message and "charge" in lower_message) or ("low" in lower_message and "charge" in lower_message):
+    if intent == "score":
         return f"Your service charge score is currently {score} compared to similar properties. This means your service charge is {'higher' if score == 'HIGH' else 'lower'} than average for properties of similar size and location."
     
     # Amenities
-    if "amenities" in lower_message or "concierge" in lower_message or ("services" in lower_message and "property" in lower_message):
+    if intent == "amenities":
         return "Your property includes concierge services. The service charge covers maintenance, building management, and all amenities provided by the managing agent."
     
     # General help
-    if "help" in lower_message or "assist" in lower_message or "what can" in lower_message:
+    if intent == "help":
         return "I can help you with questions about your service charge, property details, lease information, payment dates, documents, location, and property management. What would you like to know?"
     
     # Default response for relevant but unclear questions
     return "I can help you with information about your service charge, property details, lease, payments, documents, and property management. Could you please be more specific about what you'd like to know?"
 
 
+# Holding replies sent while the client's data is still being looked up
+ACKNOWLEDGEMENTS = {
+    "service_charge": "Let me look up your service charge details...",
+    "property_size": "Let me look up your property details...",
+    "lease": "Let me look up your lease details...",
+    "landlord": "Let me look up your landlord and managing agent...",
+    "location": "Let me look up your property's location...",
+    "score": "Let me look up your service charge score...",
+}
+
+
+def get_acknowledgement(user_message):
+    """Get an immediate holding reply for a message that needs client data"""
+    return ACKNOWLEDGEMENTS.get(detect_intent(user_message), "Let me look up your account details...")
+
+
 def get_denial_message():
     """Get the standard denial message for off-topic questions"""
     return "I apologize, but I can only assist you with questions related to client services, service charges, property management, lease information, and related topics. Thank you for your understanding."
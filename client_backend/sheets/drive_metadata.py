@@ -0,0 +1,123 @@
+"""
+Cached metadata of the Drive files listed in the Documents sheet.
+
+client_documents shows each document's Drive name, links and times. The
+metadata is kept in the Django cache (shared by the workers) for
+DRIVE_METADATA_TTL seconds per file. For DRIVE_METADATA_STALE_GRACE seconds
+after that it is still served while the expired files are fetched again in the
+background, so the documents page only waits for Drive for files it hasn't
+seen recently. Errors are not cached.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from monitoring.metrics import record_cache_lookup
+from monitoring.telemetry import note_data_age
+
+from .oauth_utils import get_admin_drive_service
+from .single_flight import refresh_in_background
+
+logger = logging.getLogger(__name__)
+
+DRIVE_FILE_FIELDS = 'id, name, mimeType, webViewLink, webContentLink, createdTime, modifiedTime'
+
+
+def drive_metadata_cache_key(file_id):
+    return f"drive_file:{file_id}"
+
+
+def fetch_drive_files(file_ids):
+    """
+    Metadata of Drive files, read with the admin's credentials in one batch request.
+
+    Returns:
+        Dict of file id -> metadata, or {"error": message} for files that could not be read
+    """
+    files = {}
+    if not file_ids:
+        return files
+    try:
+        drive_service = get_admin_drive_service()
+        # Use batch requests for better performance (Google Drive API supports up to 100 requests per batch)
+        if len(file_ids) > 1:
+            batch = drive_service.new_batch_http_request()
+
+            def callback(request_id, response, exception):
+                if exception:
+                    if settings.DEBUG:
+                        logger.warning(f"Could not fetch Drive file {request_id}: {str(exception)}")
+                    files[request_id] = {"error": str(exception)}
+                else:
+                    files[request_id] = response
+
+            for file_id in file_ids:
+                batch.add(
+                    drive_service.files().get(fileId=file_id, fields=DRIVE_FILE_FIELDS),
+                    callback=callback,
+                    request_id=file_id
+                )
+            batch.execute()
+        else:
+            # Single file - direct call is fine
+            file_id = file_ids[0]
+            try:
+                files[file_id] = drive_service.files().get(fileId=file_id, fields=DRIVE_FILE_FIELDS).execute()
+            except Exception as e:
+                if settings.DEBUG:
+                    logger.warning(f"Could not fetch Drive file {file_id}: {str(e)}")
+                files[file_id] = {"error": str(e)}
+    except Exception as e:
+        # If Drive service fails entirely, log but continue
+        if settings.DEBUG:
+            logger.warning(f"Could not initialize Drive service: {str(e)}")
+    return files
+
+
+def _fetch_and_cache(file_ids):
+    files = fetch_drive_files(file_ids)
+    now = time.time()
+    cache.set_many(
+        {drive_metadata_cache_key(file_id): (now, metadata)
+         for file_id, metadata in files.items() if "error" not in metadata},
+        settings.DRIVE_METADATA_TTL + settings.DRIVE_METADATA_STALE_GRACE,
+    )
+    return files
+
+
+def drive_file_metadata(file_ids):
+    """
+    Metadata of Drive files, from the cache where possible.
+
+    Returns:
+        Dict of file id -> metadata, or {"error": message}, like fetch_drive_files()
+    """
+    keys = {drive_metadata_cache_key(file_id): file_id for file_id in file_ids}
+    cached = cache.get_many(list(keys))
+    files = {}
+    stale = []
+    now = time.time()
+    for key, file_id in keys.items():
+        entry = cached.get(key)
+        if entry is None:
+            record_cache_lookup('drive_metadata', False)
+            continue
+        fetched_at, metadata = entry
+        expired = now - fetched_at >= settings.DRIVE_METADATA_TTL
+        record_cache_lookup('drive_metadata', not expired, expired)
+        if expired:
+            stale.append(file_id)
+        files[file_id] = metadata
+        note_data_age(now - fetched_at)
+
+    if stale:
+        stale_ids = tuple(sorted(stale))
+        refresh_in_background(('drive_metadata',) + stale_ids, lambda: _fetch_and_cache(list(stale_ids)),
+                              source='drive_metadata')
+    missing = [file_id for file_id in file_ids if file_id not in files]
+    if missing:
+        files.update(_fetch_and_cache(missing))
+        note_data_age(0)
+    return files
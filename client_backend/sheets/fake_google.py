@@ -0,0 +1,762 @@
+"""
+Local stand-in for the Google APIs the portal calls, for offline testing and
+benchmarking.
+
+FakeGoogle keeps spreadsheets and Drive files in memory and answers the subset
+of the APIs the backend uses:
+    Sheets v4:  spreadsheets.get/batchUpdate, values.get/batchGet/update/append
+    Drive v3:   files.list/get/create (metadata, media, multipart and resumable
+                uploads), alt=media downloads and batch requests
+    OAuth2:     the token endpoint and userinfo.get
+
+Requests keep their real paths (/v4/spreadsheets/..., /drive/v3/...,
+/upload/drive/v3/..., /batch/drive/v3, /token), so pointing the backend at it
+only means swapping the scheme and host: run the run_fake_google command and
+set GOOGLE_API_BASE_URL and GOOGLE_OAUTH_TOKEN_URI to its address. FakeGoogleHttp
+serves the same backend in-process, without sockets.
+
+Latency and errors can be injected into every call to measure how the portal
+behaves with a slow or flaky Google.
+"""
+import email.parser
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import httplib2
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+TOKEN_PATH = '/token'
+
+# Calls that error injection applies to by default: the APIs, not the token endpoint
+DEFAULT_ERROR_PATHS = r'^/(v4|drive|upload|batch|oauth2)/'
+
+# Default grid size reported by spreadsheets.get for small sheets
+DEFAULT_ROW_COUNT = 1000
+DEFAULT_COLUMN_COUNT = 26
+
+ERROR_STATUSES = {
+    400: ('INVALID_ARGUMENT', 'badRequest'),
+    401: ('UNAUTHENTICATED', 'authError'),
+    403: ('PERMISSION_DENIED', 'forbidden'),
+    404: ('NOT_FOUND', 'notFound'),
+    429: ('RESOURCE_EXHAUSTED', 'rateLimitExceeded'),
+    500: ('INTERNAL', 'backendError'),
+    503: ('UNAVAILABLE', 'backendError'),
+}
+
+HTTP_REASONS = {
+    200: 'OK', 308: 'Resume Incomplete', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden',
+    404: 'Not Found', 405: 'Method Not Allowed', 429: 'Too Many Requests', 500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+_CELL_RE = re.compile(r'^([A-Za-z]*)(\d*)$')
+_QUERY_CLAUSE_RE = re.compile(
+    r"""^(?:(?P<field>name|mimeType)\s*(?P<op>=|!=|contains)\s*'(?P<value>(?:[^'\\]|\\.)*)'"""
+    r"""|trashed\s*=\s*(?P<trashed>true|false)"""
+    r"""|'(?P<parent>[^']+)'\s+in\s+parents)$"""
+)
+
+
+class GoogleApiError(Exception):
+    """An error response in the Google JSON error format"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+    def body(self):
+        status_name, reason = ERROR_STATUSES.get(self.status, ('UNKNOWN', 'unknown'))
+        return {'error': {
+            'code': self.status,
+            'message': self.message,
+            'status': status_name,
+            'errors': [{'message': self.message, 'domain': 'global', 'reason': reason}],
+        }}
+
+
+def column_index(letters):
+    """'A' -> 0, 'Z' -> 25, 'AA' -> 26"""
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+
+def column_letters(index):
+    """0 -> 'A', 26 -> 'AA'"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def quote_sheet_title(title):
+    if re.fullmatch(r'[A-Za-z0-9_]+', title):
+        return title
+    return "'" + title.replace("'", "''") + "'"
+
+
+def parse_a1_range(a1_range):
+    """
+    Split an A1 range into its sheet title and 0-based bounds.
+
+    Returns:
+        (title, row_start, row_end, col_start, col_end); ends are exclusive and
+        None where the range is open ('A:Z' has no row bounds, '1:2' no column bounds)
+    """
+    title, separator, cells = a1_range.rpartition('!')
+    if not separator:
+        title, cells = a1_range, ''
+    if len(title) >= 2 and title[0] == title[-1] == "'":
+        title = title[1:-1].replace("''", "'")
+    if not title:
+        raise GoogleApiError(400, f"Unable to parse range: {a1_range}")
+    if not cells:
+        return title, 0, None, 0, None
+
+    start, _, end = cells.partition(':')
+    start_match = _CELL_RE.match(start)
+    end_match = _CELL_RE.match(end or start)
+    if not start_match or not end_match or not (start or end):
+        raise GoogleApiError(400, f"Unable to parse range: {a1_range}")
+    start_col, start_row = start_match.groups()
+    end_col, end_row = end_match.groups()
+    if not (start_col or start_row) or not (end_col or end_row):
+        raise GoogleApiError(400, f"Unable to parse range: {a1_range}")
+
+    row_start = int(start_row) - 1 if start_row else 0
+    row_end = int(end_row) if end_row else None
+    col_start = column_index(start_col) if start_col else 0
+    col_end = column_index(end_col) + 1 if end_col else None
+    return title, row_start, row_end, col_start, col_end
+
+
+def select_fields(resource, fields):
+    """Apply a partial-response 'fields' selector such as 'id, name' or 'files(id, name)'"""
+    if not fields:
+        return resource
+    selected = {}
+    for item in _split_fields(fields):
+        name, _, nested = item.partition('(')
+        name = name.strip()
+        if name not in resource:
+            continue
+        value = resource[name]
+        if nested:
+            nested = nested.rstrip(')')
+            if isinstance(value, list):
+                value = [select_fields(entry, nested) for entry in value]
+            elif isinstance(value, dict):
+                value = select_fields(value, nested)
+        selected[name] = value
+    return selected
+
+
+def _split_fields(fields):
+    items, depth, current = [], 0, ''
+    for char in fields:
+        if char == ',' and depth == 0:
+            items.append(current.strip())
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+    if current.strip():
+        items.append(current.strip())
+    return items
+
+
+def _trim_values(rows):
+    """Drop trailing empty cells and rows, as the Sheets API does"""
+    trimmed = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] == '':
+            row.pop()
+        trimmed.append(row)
+    while trimmed and not trimmed[-1]:
+        trimmed.pop()
+    return trimmed
+
+
+def _cell(value):
+    # Values come back formatted as strings, whatever was written
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    return str(value)
+
+
+class FakeGoogle:
+    """
+    In-memory Sheets/Drive/OAuth backend.
+
+    Args:
+        latency: Seconds added to every call
+        jitter: Extra random latency of up to this many seconds
+        error_rate: Probability (0-1) that a call fails with error_status
+        error_status: HTTP status of injected errors (429, 500, 503, ...)
+        error_paths: Regex of request paths that errors are injected into
+        account_email: Email reported by userinfo.get
+        seed: Seed for the latency jitter and error injection
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 error_paths=DEFAULT_ERROR_PATHS, account_email='admin@example.com', seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.error_paths = re.compile(error_paths) if error_paths else None
+        self.account_email = account_email
+        self.random = random.Random(seed)
+
+        self.spreadsheets = {}  # id -> {'title': str, 'sheets': [{'properties': {...}, 'rows': [[str]]}]}
+        self.files = {}  # id -> Drive file resource
+        self.contents = {}  # file id -> bytes
+        self.uploads = {}  # resumable upload id -> {'metadata', 'content_type', 'data'}
+        self.call_counts = Counter()  # 'METHOD /route' -> calls
+        self.lock = threading.Lock()
+
+    # Fixture data
+
+    def load_fixture(self, data):
+        """
+        Load spreadsheets and Drive files.
+
+        Format:
+            {"spreadsheets": {"<id>": {"title": "...", "sheets": {"LTP": [[...], ...]}}},
+             "files": [{"id": "...", "name": "...", "mimeType": "...", "parents": [...], "content": "..."}],
+             "account_email": "..."}
+        """
+        for spreadsheet_id, spreadsheet in data.get('spreadsheets', {}).items():
+            self.add_spreadsheet(spreadsheet_id, spreadsheet.get('sheets', {}), title=spreadsheet.get('title'))
+        for file_data in data.get('files', []):
+            file_data = dict(file_data)
+            content = file_data.pop('content', '')
+            self.add_file(content.encode('utf-8') if isinstance(content, str) else content, **file_data)
+        if data.get('account_email'):
+            self.account_email = data['account_email']
+
+    def add_spreadsheet(self, spreadsheet_id, sheets, title=None):
+        """Add a spreadsheet from {sheet title: rows}"""
+        self.spreadsheets[spreadsheet_id] = {'title': title or spreadsheet_id, 'sheets': []}
+        for sheet_title, rows in sheets.items():
+            self._add_sheet(spreadsheet_id, sheet_title, rows)
+
+    def add_file(self, content=b'', **metadata):
+        """Add a Drive file; returns its resource"""
+        file_id = metadata.pop('id', None) or uuid.uuid4().hex
+        now = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+        resource = {
+            'kind': 'drive#file',
+            'id': file_id,
+            'name': metadata.pop('name', 'Untitled'),
+            'mimeType': metadata.pop('mimeType', 'application/octet-stream'),
+            'parents': metadata.pop('parents', []),
+            'trashed': False,
+            'createdTime': now,
+            'modifiedTime': now,
+            'webViewLink': f"https://drive.google.com/file/d/{file_id}/view",
+        }
+        if resource['mimeType'] != FOLDER_MIME_TYPE:
+            resource['webContentLink'] = f"https://drive.google.com/uc?id={file_id}&export=download"
+            resource['size'] = str(len(content))
+        resource.update(metadata)
+        self.files[file_id] = resource
+        self.contents[file_id] = content
+        return resource
+
+    def _add_sheet(self, spreadsheet_id, title, rows=()):
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+        sheet_id = max((sheet['properties']['sheetId'] for sheet in spreadsheet['sheets']), default=-1) + 1
+        sheet = {
+            'properties': {'sheetId': sheet_id, 'title': title, 'index': len(spreadsheet['sheets']),
+                           'sheetType': 'GRID'},
+            'rows': [[_cell(value) for value in row] for row in rows],
+        }
+        spreadsheet['sheets'].append(sheet)
+        return sheet
+
+    # Request handling
+
+    def handle(self, method, uri, headers=None, body=b'', base_url='http://fake-google'):
+        """
+        Answer one HTTP request.
+
+        Args:
+            uri: Path and query, or a full URL (the host is ignored)
+            base_url: Scheme and host the fake is reached on, for upload session URLs
+
+        Returns:
+            (status, headers dict, body bytes)
+        """
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        parts = urlsplit(uri)
+        path = parts.path
+        query = {key: values if key == 'ranges' else values[-1]
+                 for key, values in parse_qs(parts.query, keep_blank_values=True).items()}
+        if hasattr(body, 'read'):
+            # Upload chunks can arrive as file-like slices of the media
+            body = body.read()
+        body = body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        try:
+            if (self.error_rate and (self.error_paths is None or self.error_paths.search(path))
+                    and self.random.random() < self.error_rate):
+                raise GoogleApiError(self.error_status, "Injected error from the fake Google server")
+            with self.lock:
+                return self._dispatch(method.upper(), path, query, headers, body, base_url.rstrip('/'))
+        except GoogleApiError as error:
+            return self._json(error.status, error.body())
+
+    def _dispatch(self, method, path, query, headers, body, base_url):
+        if path == TOKEN_PATH and method == 'POST':
+            self._count(method, path)
+            return self._json(200, self.token_response(body))
+        if path == '/oauth2/v2/userinfo' and method == 'GET':
+            self._count(method, path)
+            return self._json(200, {'id': '100000000000000000000', 'email': self.account_email,
+                                    'verified_email': True})
+        if path.startswith('/batch/'):
+            self._count(method, '/batch')
+            return self.batch(headers, body, base_url)
+        if path.startswith('/v4/spreadsheets/'):
+            return self.sheets_request(method, path[len('/v4/spreadsheets/'):], query, body)
+        if path == '/upload/drive/v3/files':
+            return self.upload_request(method, query, headers, body, base_url)
+        if path.startswith('/drive/v3/files'):
+            return self.drive_request(method, path[len('/drive/v3/files'):], query, body)
+        raise GoogleApiError(404, f"The fake Google server does not implement {method} {path}")
+
+    def _count(self, method, route):
+        self.call_counts[f"{method} {route}"] += 1
+
+    @staticmethod
+    def _json(status, data, extra_headers=None):
+        headers = {'content-type': 'application/json; charset=UTF-8'}
+        headers.update(extra_headers or {})
+        return status, headers, json.dumps(data).encode('utf-8')
+
+    @staticmethod
+    def _json_body(body):
+        if not body:
+            return {}
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise GoogleApiError(400, "Invalid JSON payload received.")
+
+    # OAuth
+
+    def token_response(self, body):
+        form = {key: values[-1] for key, values in parse_qs(body.decode('utf-8')).items()}
+        grant_type = form.get('grant_type')
+        if grant_type not in ('refresh_token', 'authorization_code'):
+            raise GoogleApiError(400, "Unsupported grant type")
+        response = {
+            'access_token': f"fake-access-{uuid.uuid4().hex}",
+            'expires_in': 3599,
+            'token_type': 'Bearer',
+            'scope': form.get('scope', ''),
+        }
+        if grant_type == 'authorization_code':
+            response['refresh_token'] = f"fake-refresh-{uuid.uuid4().hex}"
+        return response
+
+    # Sheets
+
+    def sheets_request(self, method, rest, query, body):
+        spreadsheet_id, _, rest = rest.partition('/')
+        spreadsheet_id, _, action = spreadsheet_id.partition(':')
+
+        if not rest and method == 'GET' and not action:
+            self._count(method, '/v4/spreadsheets/{id}')
+            return self._json(200, self.spreadsheet_resource(self._spreadsheet(spreadsheet_id)))
+        if not rest and method == 'POST' and action == 'batchUpdate':
+            self._count(method, '/v4/spreadsheets/{id}:batchUpdate')
+            return self._json(200, self.batch_update(spreadsheet_id, self._json_body(body)))
+        if rest == 'values:batchGet' and method == 'GET':
+            self._count(method, '/v4/spreadsheets/{id}/values:batchGet')
+            spreadsheet = self._spreadsheet(spreadsheet_id)
+            ranges = query.get('ranges', [])
+            return self._json(200, {
+                'spreadsheetId': spreadsheet_id,
+                'valueRanges': [self.get_values(spreadsheet, a1_range) for a1_range in ranges],
+            })
+        if rest.startswith('values/'):
+            a1_range, _, values_action = unquote(rest[len('values/'):]).rpartition(':')
+            if values_action != 'append':
+                a1_range, values_action = unquote(rest[len('values/'):]), ''
+            spreadsheet = self._spreadsheet(spreadsheet_id)
+            if method == 'GET' and not values_action:
+                self._count(method, '/v4/spreadsheets/{id}/values/{range}')
+                return self._json(200, self.get_values(spreadsheet, a1_range))
+            if method == 'PUT' and not values_action:
+                self._count(method, '/v4/spreadsheets/{id}/values/{range}')
+                values = self._json_body(body).get('values', [])
+                return self._json(200, {'spreadsheetId': spreadsheet_id,
+                                        **self.update_values(spreadsheet, a1_range, values)})
+            if method == 'POST' and values_action == 'append':
+                self._count(method, '/v4/spreadsheets/{id}/values/{range}:append')
+                values = self._json_body(body).get('values', [])
+                return self._json(200, self.append_values(spreadsheet_id, spreadsheet, a1_range, values))
+        raise GoogleApiError(404, f"The fake Google server does not implement {method} /v4/spreadsheets/{spreadsheet_id}/{rest}")
+
+    def _spreadsheet(self, spreadsheet_id):
+        spreadsheet = self.spreadsheets.get(spreadsheet_id)
+        if spreadsheet is None:
+            raise GoogleApiError(404, "Requested entity was not found.")
+        return spreadsheet
+
+    def _sheet(self, spreadsheet, a1_range):
+        title, *bounds = parse_a1_range(a1_range)
+        for sheet in spreadsheet['sheets']:
+            if sheet['properties']['title'] == title:
+                return sheet, bounds
+        raise GoogleApiError(400, f"Unable to parse range: {a1_range}")
+
+    def spreadsheet_resource(self, spreadsheet):
+        sheets = []
+        for sheet in spreadsheet['sheets']:
+            rows = sheet['rows']
+            sheets.append({'properties': {**sheet['properties'], 'gridProperties': {
+                'rowCount': max(DEFAULT_ROW_COUNT, len(rows)),
+                'columnCount': max([DEFAULT_COLUMN_COUNT] + [len(row) for row in rows]),
+            }}})
+        return {
+            'spreadsheetId': next(key for key, value in self.spreadsheets.items() if value is spreadsheet),
+            'properties': {'title': spreadsheet['title'], 'locale': 'en_GB', 'timeZone': 'Europe/London'},
+            'sheets': sheets,
+        }
+
+    def batch_update(self, spreadsheet_id, body):
+        spreadsheet = self._spreadsheet(spreadsheet_id)
+        replies = []
+        for request in body.get('requests', []):
+            if 'addSheet' in request:
+                title = request['addSheet'].get('properties', {}).get('title') or f"Sheet{len(spreadsheet['sheets']) + 1}"
+                if any(sheet['properties']['title'] == title for sheet in spreadsheet['sheets']):
+                    raise GoogleApiError(
+                        400, f'Invalid requests[{len(replies)}].addSheet: A sheet with the name "{title}" already exists. '
+                             f'Please enter another name.'
+                    )
+                sheet = self._add_sheet(spreadsheet_id, title)
+                replies.append({'addSheet': {'properties': sheet['properties']}})
+            elif 'deleteSheet' in request:
+                sheet_id = request['deleteSheet'].get('sheetId')
+                remaining = [sheet for sheet in spreadsheet['sheets'] if sheet['properties']['sheetId'] != sheet_id]
+                if len(remaining) == len(spreadsheet['sheets']):
+                    raise GoogleApiError(400, f"No grid with id: {sheet_id}")
+                spreadsheet['sheets'] = remaining
+                replies.append({})
+            else:
+                raise GoogleApiError(400, f"The fake Google server does not implement {', '.join(request)}")
+        return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    def get_values(self, spreadsheet, a1_range):
+        sheet, (row_start, row_end, col_start, col_end) = self._sheet(spreadsheet, a1_range)
+        rows = sheet['rows'][row_start:row_end]
+        values = _trim_values([row[col_start:col_end] for row in rows])
+
+        title = quote_sheet_title(sheet['properties']['title'])
+        last_row = row_end if row_end is not None else max(len(sheet['rows']), 1)
+        last_col = col_end if col_end is not None else max([DEFAULT_COLUMN_COUNT] + [len(row) for row in sheet['rows']])
+        result = {
+            'range': f"{title}!{column_letters(col_start)}{row_start + 1}:{column_letters(last_col - 1)}{last_row}",
+            'majorDimension': 'ROWS',
+        }
+        if values:
+            result['values'] = values
+        return result
+
+    def _write(self, sheet, row_start, col_start, values):
+        rows = sheet['rows']
+        for offset, row_values in enumerate(values):
+            row_index = row_start + offset
+            while len(rows) <= row_index:
+                rows.append([])
+            row = rows[row_index]
+            end = col_start + len(row_values)
+            if len(row) < end:
+                row.extend([''] * (end - len(row)))
+            row[col_start:end] = [_cell(value) for value in row_values]
+
+        width = max((len(row_values) for row_values in values), default=0)
+        title = quote_sheet_title(sheet['properties']['title'])
+        return {
+            'updatedRange': (f"{title}!{column_letters(col_start)}{row_start + 1}:"
+                             f"{column_letters(col_start + max(width, 1) - 1)}{row_start + max(len(values), 1)}"),
+            'updatedRows': len(values),
+            'updatedColumns': width,
+            'updatedCells': sum(len(row_values) for row_values in values),
+        }
+
+    def update_values(self, spreadsheet, a1_range, values):
+        sheet, (row_start, _, col_start, _) = self._sheet(spreadsheet, a1_range)
+        return self._write(sheet, row_start, col_start, values)
+
+    def append_values(self, spreadsheet_id, spreadsheet, a1_range, values):
+        # Append below the last row that has data in the range's columns
+        sheet, (row_start, _, col_start, col_end) = self._sheet(spreadsheet, a1_range)
+        last = row_start - 1
+        for index in range(len(sheet['rows']) - 1, row_start - 1, -1):
+            if any(cell != '' for cell in sheet['rows'][index][col_start:col_end]):
+                last = index
+                break
+        title = quote_sheet_title(sheet['properties']['title'])
+        updates = self._write(sheet, last + 1, col_start, values)
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'tableRange': f"{title}!{column_letters(col_start)}{row_start + 1}:{column_letters(col_start)}{last + 1}"
+            if last >= row_start else None,
+            'updates': {'spreadsheetId': spreadsheet_id, **updates},
+        }
+
+    # Drive
+
+    def drive_request(self, method, rest, query, body):
+        file_id = unquote(rest.lstrip('/'))
+        if not file_id:
+            if method == 'GET':
+                self._count(method, '/drive/v3/files')
+                return self._json(200, self.list_files(query))
+            if method == 'POST':
+                self._count(method, '/drive/v3/files')
+                resource = self.add_file(b'', **self._json_body(body))
+                return self._json(200, select_fields(resource, query.get('fields') or 'kind, id, name, mimeType'))
+        elif method == 'GET':
+            resource = self.files.get(file_id)
+            if resource is None or resource['trashed']:
+                raise GoogleApiError(404, f"File not found: {file_id}.")
+            if query.get('alt') == 'media':
+                self._count(method, '/drive/v3/files/{id}?alt=media')
+                if resource['mimeType'] == FOLDER_MIME_TYPE:
+                    raise GoogleApiError(403, "Only files with binary content can be downloaded.")
+                return 200, {'content-type': resource['mimeType']}, self.contents.get(file_id, b'')
+            self._count(method, '/drive/v3/files/{id}')
+            return self._json(200, select_fields(resource, query.get('fields') or 'kind, id, name, mimeType'))
+        raise GoogleApiError(404, f"The fake Google server does not implement {method} /drive/v3/files{rest}")
+
+    def list_files(self, query):
+        clauses = [clause.strip() for clause in re.split(r'\s+and\s+', query.get('q', '')) if clause.strip()]
+        filters = []
+        for clause in clauses:
+            match = _QUERY_CLAUSE_RE.match(clause)
+            if not match:
+                raise GoogleApiError(400, f"Invalid Value: the fake Google server can't evaluate '{clause}'")
+            filters.append(match.groupdict())
+
+        def matches(resource):
+            for clause in filters:
+                if clause['trashed'] is not None:
+                    if resource['trashed'] != (clause['trashed'] == 'true'):
+                        return False
+                elif clause['parent'] is not None:
+                    if clause['parent'] not in resource['parents']:
+                        return False
+                else:
+                    value = clause['value'].replace("\\'", "'")
+                    actual = resource[clause['field']]
+                    if clause['op'] == '=' and actual != value:
+                        return False
+                    if clause['op'] == '!=' and actual == value:
+                        return False
+                    if clause['op'] == 'contains' and value.lower() not in actual.lower():
+                        return False
+            return True
+
+        found = [resource for resource in self.files.values() if matches(resource)]
+        if not any(clause['trashed'] for clause in filters):
+            found = [resource for resource in found if not resource['trashed']]
+
+        start = int(query.get('pageToken') or 0)
+        page_size = int(query.get('pageSize') or 100)
+        result = {'kind': 'drive#fileList', 'files': found[start:start + page_size]}
+        if start + page_size < len(found):
+            result['nextPageToken'] = str(start + page_size)
+        fields = query.get('fields') or 'nextPageToken, files(kind, id, name, mimeType)'
+        return select_fields(result, fields)
+
+    def upload_request(self, method, query, headers, body, base_url):
+        upload_type = query.get('uploadType', 'media')
+        fields = query.get('fields') or 'kind, id, name, mimeType'
+
+        if upload_type == 'resumable' and 'upload_id' in query:
+            self._count(method, '/upload/drive/v3/files?uploadType=resumable (chunk)')
+            return self.resumable_chunk(query['upload_id'], headers, body, fields)
+        if method != 'POST':
+            raise GoogleApiError(405, f"Method {method} not allowed for uploads")
+
+        self._count(method, f'/upload/drive/v3/files?uploadType={upload_type}')
+        if upload_type == 'resumable':
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {
+                'metadata': self._json_body(body),
+                'content_type': headers.get('x-upload-content-type', 'application/octet-stream'),
+                'data': bytearray(),
+            }
+            location = f"{base_url}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            if query.get('fields'):
+                location += f"&fields={quote(query['fields'])}"
+            return 200, {'location': location, 'content-length': '0'}, b''
+        if upload_type == 'multipart':
+            metadata, content, content_type = self._parse_multipart(headers, body)
+            metadata.setdefault('mimeType', content_type)
+            return self._json(200, select_fields(self.add_file(content, **metadata), fields))
+        if upload_type == 'media':
+            resource = self.add_file(body, mimeType=headers.get('content-type', 'application/octet-stream'))
+            return self._json(200, select_fields(resource, fields))
+        raise GoogleApiError(400, f"Invalid uploadType: {upload_type}")
+
+    def resumable_chunk(self, upload_id, headers, body, fields):
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            raise GoogleApiError(404, "Upload session not found or expired.")
+        # Content-Range is 'bytes 0-99/1000', or 'bytes */1000' to ask for progress
+        content_range = headers.get('content-range', '')
+        match = re.match(r'bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)', content_range)
+        total = match.group(3) if match else '*'
+        if body:
+            upload['data'].extend(body)
+        received = len(upload['data'])
+
+        if total != '*' and received >= int(total):
+            del self.uploads[upload_id]
+            metadata = dict(upload['metadata'])
+            metadata.setdefault('mimeType', upload['content_type'])
+            resource = self.add_file(bytes(upload['data']), **metadata)
+            return self._json(200, select_fields(resource, fields))
+        progress = {'range': f"bytes=0-{received - 1}"} if received else {}
+        return 308, {'content-length': '0', **progress}, b''
+
+    @staticmethod
+    def _parse_multipart(headers, body):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {headers.get('content-type', '')}\r\n\r\n".encode('utf-8') + body
+        )
+        parts = list(message.iter_parts())
+        if len(parts) != 2:
+            raise GoogleApiError(400, "Multipart upload needs a metadata part and a media part")
+        metadata = json.loads(parts[0].get_payload(decode=True) or b'{}')
+        return metadata, parts[1].get_payload(decode=True) or b'', parts[1].get_content_type()
+
+    # Batch
+
+    def batch(self, headers, body, base_url):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {headers.get('content-type', '')}\r\n\r\n".encode('utf-8') + body
+        )
+        if not message.is_multipart():
+            raise GoogleApiError(400, "Batch requests must be multipart/mixed")
+
+        boundary = f"batch_{uuid.uuid4().hex}"
+        chunks = []
+        for part in message.iter_parts():
+            status, part_headers, part_body = self._batch_part(part.get_payload(decode=True) or b'', base_url)
+            content_id = part.get('Content-ID', '')
+            if content_id.startswith('<'):
+                content_id = f"<response-{content_id[1:]}"
+            status_line = f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}"
+            header_lines = ''.join(f"{key}: {value}\r\n" for key, value in part_headers.items())
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"{status_line}\r\n{header_lines}Content-Length: {len(part_body)}\r\n\r\n".encode('utf-8')
+                + part_body + b"\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n".encode('utf-8'))
+        return 200, {'content-type': f"multipart/mixed; boundary={boundary}"}, b''.join(chunks)
+
+    def _batch_part(self, payload, base_url):
+        # Each part is a serialized HTTP request: request line, headers, blank line, body
+        head, _, part_body = payload.replace(b'\r\n', b'\n').partition(b'\n\n')
+        lines = head.decode('utf-8').split('\n')
+        method, uri = lines[0].split(' ')[:2]
+        part_headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            part_headers[key.strip().lower()] = value.strip()
+        path = urlsplit(uri).path
+        query = {key: values if key == 'ranges' else values[-1]
+                 for key, values in parse_qs(urlsplit(uri).query, keep_blank_values=True).items()}
+        try:
+            return self._dispatch(method.upper(), path, query, part_headers, part_body.rstrip(b'\n'), base_url)
+        except GoogleApiError as error:
+            return self._json(error.status, error.body())
+
+
+class FakeGoogleHttp:
+    """httplib2-compatible transport that answers requests from a FakeGoogle in-process"""
+
+    def __init__(self, backend, base_url='http://fake-google'):
+        self.backend = backend
+        self.base_url = base_url
+        self.timeout = None
+        self.redirect_codes = frozenset()
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=1, connection_type=None):
+        status, response_headers, content = self.backend.handle(
+            method, uri, headers=headers, body=body, base_url=self.base_url
+        )
+        response = httplib2.Response({'status': str(status), **response_headers})
+        response.reason = HTTP_REASONS.get(status, '')
+        return response, content
+
+    def close(self):
+        pass
+
+
+def sample_fixture(spreadsheet_id):
+    """A small portfolio: two LTP clients, an Input-only client, the VR mapping and a document"""
+    return {
+        'account_email': 'admin@example.com',
+        'spreadsheets': {spreadsheet_id: {
+            'title': 'Client Portal (fake)',
+            'sheets': {
+                'LTP': [
+                    ['', '', '', '1"01', '1"02', '1"03'],
+                    ['client_id', 'email', 'Name', 'Property Size', 'Service Charge', 'Lease Expiry'],
+                    ['1001', 'alice@example.com', 'Alice Adams', '2 bed', '£1,850', '2109'],
+                    ['1002', 'bob@example.com', 'Bob Brown', '1 bed', '£1,320', '2098'],
+                ],
+                'Input': [
+                    ['client_id', 'email', 'Name', 'Postcode', 'Service Charge'],
+                    ['2001', 'carol@example.com', 'Carol Clark', 'SW18 1AA', '£2,040'],
+                ],
+                'VR': [
+                    ['', '', 'Header', 'Unit'],
+                    ['', '', 'Property Size', '1"01'],
+                    ['', '', 'Service Charge', '1"02'],
+                    ['', '', 'Lease Expiry', '1"03'],
+                ],
+                'Documents': [
+                    ['client_id', 'name', 'type', 'property', 'date', 'uploaded_by', 'file_id', 'description'],
+                    ['1001', 'Budget 2026.pdf', 'budget', '', '01/04/2026', 'Admin', 'fake-doc-1', 'Annual budget'],
+                ],
+            },
+        }},
+        'files': [
+            {'id': 'fake-folder-1', 'name': 'Client Portal Documents', 'mimeType': FOLDER_MIME_TYPE},
+            {'id': 'fake-doc-1', 'name': 'Budget 2026.pdf', 'mimeType': 'application/pdf',
+             'parents': ['fake-folder-1'], 'content': '%PDF-1.4 fake budget'},
+        ],
+    }
@@ -0,0 +1,252 @@
+"""
+FAQ retrieval engine for the chatbot.
+Scores incoming messages against a TF-IDF matrix precomputed from the FAQ corpus,
+so answering stays fast as the number of FAQs grows.
+"""
+import json
+import math
+import re
+import string
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from monitoring.memory import deep_sizeof, register_memory_source
+
+# Number of hashed feature columns (must be a power of two)
+HASH_FEATURES = 1 << 18
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9£]+")
+
+# Common words that carry no meaning for matching
+STOP_WORDS = {
+    "a", "an", "the", "i", "me", "my", "we", "our", "you", "your", "is", "are", "am",
+    "was", "were", "be", "been", "do", "does", "did", "to", "of", "in", "on", "at",
+    "for", "with", "it", "its", "this", "that", "there", "can", "could", "would",
+    "should", "will", "please", "and", "or", "if", "about", "so", "any", "have", "has",
+    "what", "whats", "how", "who", "where", "when", "why", "which", "much", "many",
+    "long", "tell", "know", "get", "s", "im", "there", "they", "them", "from", "by",
+}
+
+
+def tokenize(text):
+    """Split text into hashed-feature terms: word unigrams plus bigrams"""
+    words = [w for w in TOKEN_PATTERN.findall(text.lower()) if w not in STOP_WORDS]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def feature_column(term):
+    """Map a term to its hashed feature column"""
+    return zlib.crc32(term.encode("utf-8")) & (HASH_FEATURES - 1)
+
+
+class FAQEntry:
+    """A single FAQ: its answer template and the fact fields it uses"""
+
+    __slots__ = ("faq_id", "answer", "fields")
+
+    def __init__(self, faq_id, answer, fields):
+        self.faq_id = faq_id
+        self.answer = answer
+        self.fields = fields
+
+    @property
+    def uses_client_data(self):
+        return bool(self.fields)
+
+    def render(self, facts):
+        """Fill the answer template with the client's facts"""
+        if not self.fields:
+            return self.answer
+        return self.answer.format_map(facts)
+
+
+class FAQMatch:
+    """Result of scoring a message against the FAQ index"""
+
+    __slots__ = ("entry", "score")
+
+    def __init__(self, entry, score):
+        self.entry = entry
+        self.score = score
+
+
+class FAQIndex:
+    """
+    TF-IDF index over the FAQ questions.
+
+    Each question variant is one row of the matrix; rows are L2-normalised so a
+    message is scored against every row with one sparse dot product. The matrix
+    is stored column-major (like CSC) so only the columns present in the message
+    are touched.
+    """
+
+    def __init__(self, entries, questions):
+        """
+        Args:
+            entries: List of FAQEntry objects
+            questions: List of (entry_index, question_text) pairs
+        """
+        self.entries = entries
+        self.row_entries = np.array([entry_idx for entry_idx, _ in questions], dtype=np.int32)
+        n_rows = len(questions)
+
+        # Term counts per question and document frequency per column
+        row_counts = []
+        doc_freq = {}
+        for _, question in questions:
+            counts = {}
+            for term in tokenize(question):
+                col = feature_column(term)
+                counts[col] = counts.get(col, 0) + 1
+            row_counts.append(counts)
+            for col in counts:
+                doc_freq[col] = doc_freq.get(col, 0) + 1
+
+        # Smoothed IDF; columns never seen in the corpus keep weight 0
+        self.idf = np.zeros(HASH_FEATURES, dtype=np.float32)
+        for col, df in doc_freq.items():
+            self.idf[col] = math.log((1 + n_rows) / (1 + df)) + 1.0
+
+        # Build normalised TF-IDF triplets, then sort by column
+        cols, rows, values = [], [], []
+        for row_idx, counts in enumerate(row_counts):
+            weights = {col: (1.0 + math.log(tf)) * float(self.idf[col]) for col, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for col, weight in weights.items():
+                cols.append(col)
+                rows.append(row_idx)
+                values.append(weight / norm)
+
+        order = np.argsort(np.array(cols, dtype=np.int64), kind="stable")
+        sorted_cols = np.array(cols, dtype=np.int64)[order]
+        self.row_index = np.array(rows, dtype=np.int32)[order]
+        self.values = np.array(values, dtype=np.float32)[order]
+        self.col_ptr = np.searchsorted(sorted_cols, np.arange(HASH_FEATURES + 1)).astype(np.int32)
+        self.n_rows = n_rows
+
+    @property
+    def nbytes(self):
+        """Memory held by the index arrays"""
+        return (
+            self.row_entries.nbytes + self.idf.nbytes + self.row_index.nbytes
+            + self.values.nbytes + self.col_ptr.nbytes
+        )
+
+    def score(self, message):
+        """
+        Score a message against every FAQ question.
+
+        Returns:
+            FAQMatch for the best question, or None if nothing overlaps
+        """
+        if not self.n_rows:
+            return None
+
+        counts = {}
+        for term in tokenize(message):
+            col = feature_column(term)
+            counts[col] = counts.get(col, 0) + 1
+        if not counts:
+            return None
+
+        query_cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        query_tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        query_weights = (1.0 + np.log(query_tf)) * self.idf[query_cols]
+        norm = float(np.sqrt(np.dot(query_weights, query_weights)))
+        if norm == 0.0:
+            return None
+        query_weights /= norm
+
+        starts = self.col_ptr[query_cols]
+        lengths = self.col_ptr[query_cols + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return None
+
+        # Gather the non-zeros of the touched columns and accumulate per row
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        weights = self.values[positions] * np.repeat(query_weights, lengths)
+        scores = np.bincount(self.row_index[positions], weights=weights, minlength=self.n_rows)
+
+        best_row = int(scores.argmax())
+        return FAQMatch(self.entries[self.row_entries[best_row]], float(scores[best_row]))
+
+
+def _template_fields(answer):
+    """Names of the placeholders used in an answer template"""
+    return tuple(field for _, field, _, _ in string.Formatter().parse(answer) if field)
+
+
+def load_faq_corpus(path, allowed_fields):
+    """
+    Load the FAQ corpus from a JSON file.
+
+    The file holds a list of {"id", "questions": [...], "answer"} objects. Answers
+    may use {placeholders} for the chatbot's client fact fields.
+
+    Returns:
+        Tuple of (entries, questions) for FAQIndex
+    """
+    with open(path, encoding="utf-8") as corpus_file:
+        raw_entries = json.load(corpus_file)
+
+    entries = []
+    questions = []
+    for raw in raw_entries:
+        answer = raw["answer"]
+        fields = _template_fields(answer)
+        unknown = set(fields) - set(allowed_fields)
+        if unknown:
+            raise ValueError(f"FAQ '{raw.get('id')}' uses unknown fields: {', '.join(sorted(unknown))}")
+        entry_idx = len(entries)
+        entries.append(FAQEntry(raw.get("id", str(entry_idx)), answer, fields))
+        for question in raw.get("questions", []):
+            questions.append((entry_idx, question))
+    return entries, questions
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_faq_index():
+    """Get the process-wide FAQ index, building it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from .chatbot import DEFAULT_CLIENT_FACTS
+                entries, questions = load_faq_corpus(settings.CHATBOT_FAQ_PATH, DEFAULT_CLIENT_FACTS)
+                _index = FAQIndex(entries, questions)
+    return _index
+
+
+@lru_cache(maxsize=512)
+def match_faq(message):
+    """
+    Find the FAQ that best answers a message.
+
+    Results are memoised per message text, since the relevance gate and the
+    response generator both ask about the same message.
+
+    Returns:
+        FAQMatch if the best score reaches CHATBOT_FAQ_MIN_SCORE, otherwise None
+    """
+    match = get_faq_index().score(message)
+    if match and match.score >= settings.CHATBOT_FAQ_MIN_SCORE:
+        return match
+    return None
+
+
+def _memory_stats():
+    return {
+        'index_bytes': deep_sizeof(_index) if _index is not None else 0,
+        'cached_matches': match_faq.cache_info().currsize,
+    }
+
+
+register_memory_source('faq', _memory_stats)
@@ -0,0 +1,211 @@
+"""
+Central construction of Google API clients.
+
+Every Sheets/Drive/OAuth2 service is built through build_service(), which routes
+its HTTP traffic through InstrumentedHttp so each Google call (including batch
+requests and upload chunks) is timed into the current request's telemetry and
+counted in the Prometheus metrics. With GOOGLE_API_BASE_URL set, the calls are
+sent to that server (e.g. the local fake from run_fake_google) instead of
+*.googleapis.com.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from django.conf import settings
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest, build_http
+
+from monitoring.metrics import observe_google_call
+from monitoring.telemetry import current_telemetry, record, timed
+
+# (api, method) of the API method being executed, e.g. ('sheets', 'values.get')
+_current_method = ContextVar('google_api_method', default=None)
+
+# Builds the httplib2-compatible transport under new services; see use_transport()
+_transport_factory = None
+
+
+def current_api_method():
+    """(api, method) of the API method being executed, or None outside one (batches)"""
+    return _current_method.get()
+
+
+def api_method_name(method_id, uri):
+    """
+    Short method name for an API method id.
+
+    'sheets.spreadsheets.values.get' -> ('sheets', 'values.get'); media downloads
+    ('drive.files.get' with alt=media) become 'files.get_media'.
+    """
+    segments = method_id.split('.')
+    method = '.'.join(segments[-2:])
+    if 'alt=media' in (uri or ''):
+        method += '_media'
+    return segments[0], method
+
+
+def classify_google_url(uri):
+    """
+    (api, method) for a request made outside an API method (batches, unknown calls).
+
+    Returns:
+        Tuple such as ('drive', 'batch') or ('sheets', 'values')
+    """
+    parts = urlsplit(uri)
+    host = parts.hostname or ''
+    segments = [segment for segment in parts.path.split('/') if segment]
+
+    if host.startswith('sheets.'):
+        api = 'sheets'
+    elif 'drive' in segments:
+        api = 'drive'
+    elif host.startswith('oauth2.') or 'oauth2' in segments:
+        api = 'oauth2'
+    else:
+        api = host.split('.')[0] or 'google'
+
+    if parts.path.startswith('/batch/'):
+        method = 'batch'
+    elif parts.path.startswith('/upload/'):
+        method = 'upload'
+    else:
+        method = segments[-1] if segments else 'request'
+    return api, method
+
+
+def google_call_target(uri):
+    """
+    What a Google call reads or writes, for request traces.
+
+    Returns:
+        The range(s) of a Sheets values call ("'LTP'!A:ZZ"), 'files/<id>' for a
+        Drive file, or None
+    """
+    parts = urlsplit(uri)
+    path = unquote(parts.path)
+    if '/values/' in path:
+        return path.split('/values/', 1)[1]
+    if path.endswith('values:batchGet'):
+        return ','.join(value for key, value in parse_qsl(parts.query) if key == 'ranges')
+    if '/files/' in path:
+        return 'files/' + path.split('/files/', 1)[1]
+    return None
+
+
+def record_google_call(api, method, status, seconds, phase='google', uri=None, size=None):
+    """Record one Google call in the request telemetry and the metrics"""
+    label = f"{api} {method}"
+    record(phase, seconds, label)
+    observe_google_call(api, method, status, seconds)
+    telemetry = current_telemetry()
+    if telemetry is not None:
+        telemetry.trace_google_call(label, google_call_target(uri) if uri else None, status, size, seconds)
+
+
+class InstrumentedHttpRequest(HttpRequest):
+    """HttpRequest that labels the HTTP calls it makes with its API method"""
+
+    def execute(self, http=None, num_retries=0):
+        label = api_method_name(self.methodId, self.uri) if self.methodId else None
+        token = _current_method.set(label)
+        try:
+            return super().execute(http=http, num_retries=num_retries)
+        finally:
+            _current_method.reset(token)
+
+
+class InstrumentedHttp:
+    """
+    httplib2-compatible wrapper that times every request made through it.
+
+    It sits below AuthorizedHttp, so the token refreshes AuthorizedHttp makes
+    (requests to token_uri) are timed on their own, as 'google_auth' calls.
+    """
+
+    def __init__(self, http, token_uri=None):
+        self.http = http
+        self.token_uri = token_uri
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        if self.token_uri and uri.split('?', 1)[0] == self.token_uri:
+            (api, api_method), phase = ('oauth2', 'token.refresh'), 'google_auth'
+        else:
+            (api, api_method), phase = _current_method.get() or classify_google_url(uri), 'google'
+        status = 'error'
+        size = None
+        start = time.perf_counter()
+        try:
+            response, content = self.http.request(uri, method, *args, **kwargs)
+            status = str(response.status)
+            size = len(content) if content is not None else None
+            return response, content
+        finally:
+            record_google_call(api, api_method, status, time.perf_counter() - start, phase=phase, uri=uri, size=size)
+
+    def __getattr__(self, name):
+        # timeout, close() etc. are used by googleapiclient through AuthorizedHttp
+        return getattr(self.http, name)
+
+
+class RedirectingHttp:
+    """httplib2-compatible wrapper that sends googleapis.com requests to another base URL"""
+
+    def __init__(self, http, base_url):
+        self.http = http
+        self.base_url = base_url.rstrip('/')
+
+    def rewrite(self, uri):
+        parts = urlsplit(uri)
+        if not (parts.hostname or '').endswith('googleapis.com'):
+            return uri
+        return self.base_url + uri[len(f"{parts.scheme}://{parts.netloc}"):]
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        return self.http.request(self.rewrite(uri), method, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+@contextmanager
+def google_token_request(method):
+    """Time an OAuth token request made outside the API clients (refresh, code exchange)"""
+    status = 'error'
+    start = time.perf_counter()
+    try:
+        yield
+        status = 'ok'
+    finally:
+        record_google_call('oauth2', method, status, time.perf_counter() - start, phase='google_auth')
+
+
+def current_transport_factory():
+    """The factory set by use_transport(), or None when services use the network"""
+    return _transport_factory
+
+
+@contextmanager
+def use_transport(factory):
+    """Build services on factory() instead of a network connection (benchmarks, offline runs)"""
+    global _transport_factory
+    previous, _transport_factory = _transport_factory, factory
+    try:
+        yield
+    finally:
+        _transport_factory = previous
+
+
+def build_service(service_name, version, credentials):
+    """Build a Google API client whose HTTP calls are instrumented"""
+    http = _transport_factory() if _transport_factory else build_http()
+    base_url = getattr(settings, 'GOOGLE_API_BASE_URL', '')
+    if base_url:
+        # Below AuthorizedHttp, so batch and upload URLs are redirected too
+        http = RedirectingHttp(http, base_url)
+    http = InstrumentedHttp(http, token_uri=getattr(credentials, 'token_uri', None))
+    http = AuthorizedHttp(credentials, http=http)
+    with timed('google_build'):
+        return build(service_name, version, http=http, requestBuilder=InstrumentedHttpRequest)
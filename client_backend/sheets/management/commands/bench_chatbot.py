@@ -0,0 +1,105 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sheets.benchmarks import calibration_rate, compare_metric, load_baseline, save_baseline
+from sheets.benchmarks.chatbot_corpus import (
+    ACCURACY_TOLERANCE,
+    BASELINE_PATH,
+    CORPUS_PATH,
+    load_corpus,
+    measure_accuracy,
+    write_corpus,
+)
+from sheets.chatbot import generate_response, is_relevant_message
+from sheets.faq import match_faq
+
+THROUGHPUT_METRICS = ('relevance', 'response', 'end_to_end')
+
+
+def measure_throughput(func, messages, repeat):
+    """Best messages-per-second over several passes of the corpus"""
+    best = 0.0
+    for _ in range(repeat):
+        # Start each pass cold so memoised FAQ matches don't inflate the numbers
+        match_faq.cache_clear()
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(messages) / elapsed if elapsed else 0.0)
+    return best
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark chatbot classification accuracy and throughput against a labeled corpus (no Google access "
+        "needed). Throughput is compared as a ratio to a calibration loop, so baselines carry across machines"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=CORPUS_PATH, help="Labeled corpus (JSON lines)")
+        parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline results (JSON)")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed passes per measurement")
+        parser.add_argument('--throughput-tolerance', type=float, default=0.25,
+                            help="Allowed relative drop in throughput (relative to the calibration loop)")
+        parser.add_argument('--accuracy-tolerance', type=float, default=ACCURACY_TOLERANCE,
+                            help="Allowed relative drop in accuracy")
+        parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline")
+        parser.add_argument('--write-corpus', action='store_true', help="Regenerate the corpus file first")
+        parser.add_argument('--show-errors', type=int, default=0, help="Print this many misclassified messages")
+
+    def handle(self, *args, **options):
+        if options['write_corpus']:
+            corpus = write_corpus(options['corpus'])
+            self.stdout.write(f"Wrote {len(corpus)} messages to {options['corpus']}")
+
+        corpus = load_corpus(options['corpus'])
+        messages = [item['text'] for item in corpus]
+
+        results, errors = measure_accuracy(corpus)
+
+        repeat = max(1, options['repeat'])
+        calibration = calibration_rate(repeat)
+        throughput = {
+            'relevance': measure_throughput(is_relevant_message, messages, repeat),
+            'response': measure_throughput(generate_response, messages, repeat),
+            'end_to_end': measure_throughput(
+                lambda m: generate_response(m) if is_relevant_message(m) else None, messages, repeat
+            ),
+        }
+        results['calibration_loops_per_second'] = calibration
+        for name, rate in throughput.items():
+            # Absolute rates are informational; the ratios are what the baseline is compared on
+            results[f'{name}_messages_per_second'] = rate
+            results[f'{name}_per_calibration_loop'] = rate / calibration
+
+        for key, value in results.items():
+            self.stdout.write(f"{key:32} {value:,.4f}" if isinstance(value, float) else f"{key:32} {value}")
+
+        for text, kind, expected, actual in errors[:options['show_errors']]:
+            self.stdout.write(f"  [{kind}] expected={expected!r} got={actual!r}: {text}")
+
+        if options['update_baseline']:
+            save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        baseline = load_baseline(options['baseline'])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING("No baseline found; run with --update-baseline to store one"))
+            return
+        if baseline.get('messages') != results['messages']:
+            self.stdout.write(self.style.WARNING("Corpus size differs from the baseline; accuracy is not comparable"))
+
+        regressions = [
+            compare_metric(key, results[key], baseline.get(key), options['accuracy_tolerance'])
+            for key in ('relevance_accuracy', 'intent_accuracy')
+        ] + [
+            compare_metric(key, results[key], baseline.get(key), options['throughput_tolerance'])
+            for key in (f'{name}_per_calibration_loop' for name in THROUGHPUT_METRICS)
+        ]
+        regressions = [r for r in regressions if r]
+        if regressions:
+            raise CommandError("Chatbot benchmark regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
@@ -0,0 +1,265 @@
+import gc
+import logging
+import math
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import AdminGoogleOAuthToken, UserProfile
+from sheets.benchmarks import DATA_DIR, compare_metric, load_baseline, save_baseline
+from sheets.benchmarks.endpoints import ENDPOINTS, endpoint_requests
+from sheets.benchmarks.portfolio import benchmark_client, generate_portfolio
+from sheets.cassettes import Cassette, CassetteError, ReplayHttp
+from sheets.fake_google import FakeGoogle, FakeGoogleHttp
+from sheets.google_transport import current_api_method, use_transport
+from sheets.oauth_utils import SCOPES
+from sheets.single_flight import wait_for_background_refreshes
+from sheets.snapshots import clear_sheet_snapshots
+
+BASELINE_PATH = os.path.join(DATA_DIR, 'endpoints_baseline.json')
+SIZES = [1000, 10000, 100000]
+
+BENCH_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'bench-endpoints-{alias}'}
+    for alias in ('default', 'profiles')
+}
+
+
+class CountingHttp:
+    """httplib2-compatible wrapper that adds each call and its response size to shared counters"""
+
+    def __init__(self, http, counters):
+        self.http = http
+        self.counters = counters
+
+    def request(self, uri, method='GET', *args, **kwargs):
+        response, content = self.http.request(uri, method, *args, **kwargs)
+        api, api_method = current_api_method() or ('google', 'batch')
+        self.counters['calls'] += 1
+        self.counters['bytes'] += len(content)
+        self.counters[f"route:{api} {api_method}"] += 1
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the sheet-backed endpoints against synthetic LTP/Input/VR/Documents sheets at several sizes, "
+        "measuring latency, peak allocations and Google calls per request (Google is served in-process, "
+        "no network access needed)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Sheet sizes (rows) to benchmark")
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+        parser.add_argument('--iterations', type=int, default=5, help="Timed requests per endpoint and size")
+        parser.add_argument('--google-latency-ms', type=float, default=0.0,
+                            help="Latency added to every fake Google call")
+        parser.add_argument('--cassette', help="Replay a recorded cassette (record_google_cassette) instead of "
+                                               "the synthetic sheets")
+        parser.add_argument('--time-scale', type=float, default=1.0,
+                            help="Multiplier for the recorded Google latency when replaying (0 = no delay)")
+        parser.add_argument('--cold', action='store_true',
+                            help="Drop the sheet snapshots before every request, to measure lookups that read "
+                                 "from Google; the snapshots they start building in the background are skipped "
+                                 "(results are labelled '<size> cold' in the baseline)")
+        parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline results (JSON)")
+        parser.add_argument('--latency-tolerance', type=float, default=0.25,
+                            help="Allowed relative increase in median latency")
+        parser.add_argument('--alloc-tolerance', type=float, default=0.2,
+                            help="Allowed relative increase in peak allocations")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Store these results as the baseline for the sizes that were run")
+
+    def handle(self, *args, **options):
+        # The request log lines (with REQUEST_LOG on) would drown the results
+        request_logger = logging.getLogger('monitoring.requests')
+        log_level = request_logger.level
+        request_logger.setLevel(logging.WARNING)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        # Shared snapshots go to a directory of their own, not the server's
+        snapshot_dir = tempfile.mkdtemp(prefix='bench-snapshots-')
+        try:
+            with override_settings(CACHES=BENCH_CACHES, SHEET_SNAPSHOT_DIR=snapshot_dir), \
+                    mock.patch.multiple('sheets.oauth_utils', CLIENT_ID='benchmark', CLIENT_SECRET='benchmark'):
+                results = self.run_benchmarks(options)
+        finally:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            request_logger.setLevel(log_level)
+
+        if options['update_baseline']:
+            baseline = load_baseline(options['baseline']) or {}
+            baseline.update(results)
+            save_baseline(options['baseline'], baseline)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+            return
+
+        baseline = load_baseline(options['baseline'])
+        if baseline is None:
+            self.stdout.write(self.style.WARNING("No baseline found; run with --update-baseline to store one"))
+            return
+
+        regressions = []
+        for size, endpoints in results.items():
+            for endpoint, current in endpoints.items():
+                previous = baseline.get(size, {}).get(endpoint)
+                if previous is None:
+                    continue
+                label = f"{size} {endpoint}"
+                regressions += [
+                    compare_metric(f"{label} latency_ms_p50", current['latency_ms_p50'],
+                                   previous.get('latency_ms_p50'), options['latency_tolerance'], higher_is_better=False),
+                    compare_metric(f"{label} peak_alloc_kib", current['peak_alloc_kib'],
+                                   previous.get('peak_alloc_kib'), options['alloc_tolerance'], higher_is_better=False),
+                    compare_metric(f"{label} google_calls", current['google_calls'],
+                                   previous.get('google_calls'), 0, higher_is_better=False),
+                ]
+        regressions = [r for r in regressions if r]
+        if regressions:
+            raise CommandError("Endpoint benchmark regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def run_benchmarks(self, options):
+        AdminGoogleOAuthToken.objects.create(
+            access_token='benchmark', refresh_token='benchmark',
+            token_expiry=timezone.now() + timedelta(days=1), scopes=' '.join(SCOPES),
+        )
+        results = {}
+        for number, (label, target, transport, endpoints) in enumerate(self.scenarios(options)):
+            if options['cold']:
+                label += ' cold'
+            # A user per scenario, since the cached JWT user would keep an old email
+            user = User.objects.create_user(f'bench{number}', email=target['email'], password='benchmark-pass')
+            UserProfile.objects.filter(user=user).update(client_id=target['client_id'], postcode=target['postcode'])
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+            requests = endpoint_requests(client, target['client_id'])
+
+            counters = Counter()
+            results[label] = {}
+            # A cold lookup's background snapshot build would be dropped before the next request anyway
+            skip_builds = mock.patch('sheets.snapshots.refresh_in_background', return_value=False) \
+                if options['cold'] else nullcontext()
+            with use_transport(lambda: CountingHttp(transport(), counters)), skip_builds:
+                for endpoint in options['endpoints']:
+                    if endpoint not in endpoints:
+                        continue
+                    measured = self.measure(requests[endpoint], counters, max(1, options['iterations']), options['cold'])
+                    results[label][endpoint] = measured
+                    self.stdout.write(
+                        f"{label:>12}  {endpoint:18} p50 {measured['latency_ms_p50']:9.1f} ms  "
+                        f"p95 {measured['latency_ms_p95']:9.1f} ms  {measured['google_calls']:3d} Google calls  "
+                        f"{measured['google_bytes'] / 1024:10.1f} KiB from Google  "
+                        f"peak {measured['peak_alloc_kib']:10.1f} KiB"
+                    )
+                    routes = measured.pop('google_routes')
+                    if options['verbosity'] > 1:
+                        for route, count in sorted(routes.items()):
+                            self.stdout.write(f"{'':34}{count:3d}  {route}")
+            # The synthetic scenarios share the benchmark client's email
+            user.delete()
+            clear_sheet_snapshots()
+            del transport
+            gc.collect()
+        return results
+
+    def scenarios(self, options):
+        """
+        (label, benchmark client, transport factory, endpoints) for each run: one per
+        synthetic sheet size, or the replayed cassette
+        """
+        if options['cassette']:
+            try:
+                cassette = Cassette.load(options['cassette'])
+            except (OSError, ValueError, CassetteError) as e:
+                raise CommandError(f"Could not load {options['cassette']}: {e}")
+            label = f"cassette:{os.path.basename(options['cassette']).split('.')[0]}"
+            yield (label, cassette.metadata['user'], lambda: ReplayHttp(cassette, options['time_scale']),
+                   cassette.metadata.get('endpoints', ENDPOINTS))
+            return
+
+        for rows in options['sizes']:
+            backend = FakeGoogle(latency=options['google_latency_ms'] / 1000)
+            backend.load_fixture(generate_portfolio(rows, settings.GOOGLE_SHEET_ID))
+            yield str(rows), benchmark_client(rows), lambda: FakeGoogleHttp(backend), ENDPOINTS
+            del backend
+
+    def measure(self, request, counters, iterations, cold=False):
+        def checked():
+            # App caches (profile, chatbot context) are cleared so each request does the full lookup;
+            # the sheet snapshots are kept unless measuring cold lookups
+            for backend in caches.all():
+                backend.clear()
+            if cold:
+                clear_sheet_snapshots()
+            response = request()
+            if response.status_code >= 400:
+                raise CommandError(f"Benchmark request failed with {response.status_code}: {response.content[:300]!r}")
+            return response
+
+        checked()  # warm-up
+        wait_for_background_refreshes()  # the snapshots the warm-up started reading
+
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            checked()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        before = Counter(counters)
+        checked()
+        calls = Counter(counters)
+        calls.subtract(before)
+
+        # The peak includes producing the fake or replayed responses, which is small next to decoding them
+        gc.collect()
+        tracemalloc.start()
+        try:
+            checked()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'latency_ms_p50': round(statistics.median(timings), 2),
+            'latency_ms_p95': round(percentile(timings, 0.95), 2),
+            'latency_ms_min': round(min(timings), 2),
+            'google_calls': calls['calls'],
+            'google_bytes': calls['bytes'],
+            'google_routes': {key[len('route:'):]: count for key, count in calls.items()
+                              if key.startswith('route:') and count},
+            'peak_alloc_kib': round(peak / 1024, 1),
+        }
@@ -0,0 +1,195 @@
+from itertools import islice
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.mail import send_mass_mail
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from accounts.invites import build_invite_message
+from accounts.models import UserProfile, normalize_email
+from sheets.oauth_utils import get_admin_sheets_service
+from sheets.sheet_rows import (
+    CLIENT_ID_HEADERS,
+    POSTCODE_HEADERS,
+    SHEET_LAYOUTS,
+    find_column,
+    iter_sheet_rows,
+    read_header_row,
+)
+
+
+def chunked(iterable, size):
+    """Yield lists of up to size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Create User and UserProfile rows for every client in the LTP/Input sheets, "
+        "pre-linked by client_id, email and postcode. Safe to re-run: existing accounts are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sheet', action='append', choices=sorted(SHEET_LAYOUTS),
+                            help="Sheet to read (repeatable; default LTP then Input)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows inserted per transaction")
+        parser.add_argument('--page-size', type=int, default=5000, help="Sheet rows fetched per API call")
+        parser.add_argument('--send-invites', action='store_true',
+                            help="Email each newly created account a link to set its password")
+        parser.add_argument('--resend-invites', action='store_true',
+                            help="Also invite existing provisioned accounts that were never activated")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be created without writing")
+
+    def handle(self, *args, **options):
+        self.options = options
+        # Ids of accounts invited this run, so a client listed on both sheets gets one email
+        self.invited_ids = set()
+        self.stats = {
+            'rows': 0, 'created': 0, 'existing': 0, 'invited': 0,
+            'missing_email': 0, 'invalid_email': 0, 'missing_client_id': 0, 'conflicts': 0,
+        }
+        service = get_admin_sheets_service()
+
+        for sheet_name in options['sheet'] or ['LTP', 'Input']:
+            layout = SHEET_LAYOUTS[sheet_name]
+            headers = read_header_row(service, sheet_name, layout)
+            columns = {
+                'email': find_column(headers, contains='email'),
+                'client_id': find_column(headers, CLIENT_ID_HEADERS),
+                'postcode': find_column(headers, POSTCODE_HEADERS),
+            }
+            if columns['email'] is None or columns['client_id'] is None:
+                self.stdout.write(self.style.WARNING(
+                    f"{sheet_name}: no email or client_id column in the header row, skipping"
+                ))
+                continue
+
+            rows = iter_sheet_rows(service, sheet_name, layout, page_size=options['page_size'])
+            for chunk in chunked(rows, max(1, options['chunk_size'])):
+                self.provision_chunk(sheet_name, chunk, columns)
+
+        for key, value in self.stats.items():
+            self.stdout.write(f"{key:18} {value}")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Dry run: nothing was written"))
+
+    def parse_row(self, sheet_name, row_number, row, columns):
+        """Extract (email, client_id, postcode) from a sheet row, or None if it can't be provisioned"""
+        def cell(column):
+            idx = columns[column]
+            return str(row[idx]).strip() if idx is not None and idx < len(row) else ''
+
+        email = normalize_email(cell('email'))
+        client_id = cell('client_id')
+        if not email:
+            self.stats['missing_email'] += 1
+            return None
+        try:
+            validate_email(email)
+        except ValidationError:
+            self.stats['invalid_email'] += 1
+            self.stdout.write(f"  {sheet_name} row {row_number}: invalid email {email!r}")
+            return None
+        if not client_id:
+            self.stats['missing_client_id'] += 1
+            return None
+        return email, client_id, cell('postcode')
+
+    def provision_chunk(self, sheet_name, chunk, columns):
+        """Create the accounts for one chunk of sheet rows that don't exist yet"""
+        self.stats['rows'] += len(chunk)
+
+        # Keep the first row per email within the chunk
+        candidates = {}
+        for row_number, row in chunk:
+            parsed = self.parse_row(sheet_name, row_number, row, columns)
+            if parsed and parsed[0] not in candidates:
+                candidates[parsed[0]] = (row_number, *parsed)
+        if not candidates:
+            return
+
+        # One query each for accounts that already exist (lower(email) index,
+        # client_id and username unique indexes)
+        existing_emails = set(
+            User.objects.filter(email__gt='').annotate(email_lower=Lower('email'))
+            .filter(email_lower__in=candidates).values_list('email_lower', flat=True)
+        )
+        existing_client_ids = set(
+            UserProfile.objects.filter(client_id__in=[c[2] for c in candidates.values()])
+            .values_list('client_id', flat=True)
+        )
+        existing_usernames = set(
+            User.objects.filter(username__in=[email[:150] for email in candidates])
+            .values_list('username', flat=True)
+        )
+
+        new_rows = []
+        seen_client_ids = set()
+        for email, (row_number, _, client_id, postcode) in candidates.items():
+            if email in existing_emails:
+                self.stats['existing'] += 1
+                continue
+            if client_id in existing_client_ids or client_id in seen_client_ids or email[:150] in existing_usernames:
+                self.stats['conflicts'] += 1
+                self.stdout.write(
+                    f"  {sheet_name} row {row_number}: client_id {client_id!r} or username {email[:150]!r} "
+                    f"already belongs to another account"
+                )
+                continue
+            seen_client_ids.add(client_id)
+            new_rows.append((email, client_id, postcode))
+
+        if self.options['resend_invites'] and existing_emails and not self.options['dry_run']:
+            # Accounts still on their unusable provisioning password have never set one
+            pending = list(
+                User.objects.filter(email__gt='', last_login__isnull=True,
+                                    password__startswith=UNUSABLE_PASSWORD_PREFIX)
+                .annotate(email_lower=Lower('email')).filter(email_lower__in=existing_emails)
+            )
+            self.send_invites(pending)
+
+        if not new_rows:
+            return
+        if self.options['dry_run']:
+            self.stats['created'] += len(new_rows)
+            return
+
+        # Provisioned accounts have no usable password until the invite is accepted
+        unusable_password = make_password(None)
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=email[:150], email=email, password=unusable_password)
+                for email, _, _ in new_rows
+            ])
+            UserProfile.objects.bulk_create([
+                UserProfile(user=user, client_id=client_id, postcode=postcode or None)
+                for user, (_, client_id, postcode) in zip(users, new_rows)
+            ])
+        self.stats['created'] += len(users)
+
+        if self.options['send_invites']:
+            self.send_invites(users)
+
+    def send_invites(self, users):
+        """Email invite links to a list of users over one mail connection"""
+        users = [user for user in users if user.id not in self.invited_ids]
+        if not users:
+            return
+        try:
+            sent = send_mass_mail([build_invite_message(user) for user in users], fail_silently=False)
+        except Exception as e:
+            raise CommandError(
+                f"Sending invites failed: {e}. Re-run with --resend-invites to invite "
+                f"accounts that have not been activated yet."
+            )
+        self.invited_ids.update(user.id for user in users)
+        self.stats['invited'] += sent
@@ -0,0 +1,194 @@
+import json
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import UserProfile, normalize_email
+from accounts.profile_cache import invalidate_profile_cache
+from sheets.oauth_utils import get_admin_sheets_service
+from sheets.sheet_rows import (
+    CLIENT_ID_HEADERS,
+    POSTCODE_HEADERS,
+    SHEET_LAYOUTS,
+    column_count,
+    find_column,
+    iter_sheet_rows,
+    read_header_row,
+)
+
+# Sheets in the order get_client_data_multi_step's email lookup tries them,
+# each with the header layouts tried in turn. LTP is also tried with its
+# headers on row 1, like the view's fallback.
+LOOKUP_ORDER = [
+    ('LTP', [SHEET_LAYOUTS['LTP'], {'header_row': 1, 'last_column': 'Z'}]),
+    ('Input', [SHEET_LAYOUTS['Input']]),
+]
+
+
+def has_default_client_id(profile):
+    """Same test as get_client_data_multi_step: the client_X id assigned at signup"""
+    return bool(profile.client_id) and profile.client_id.startswith(f"client_{profile.user_id}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace the default client_X ids on user profiles with the client_id the LTP/Input sheets "
+        "list for their email, reading each sheet once and writing with bulk_update"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=5000, help="Sheet rows fetched per API call")
+        parser.add_argument('--batch-size', type=int, default=500, help="Profiles per bulk_update statement")
+        parser.add_argument('--report', help="Write the full JSON report to this file")
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without saving them")
+
+    def handle(self, *args, **options):
+        sheet_rows = self.load_email_map(options['page_size'])
+
+        updates = []
+        unmatched = []
+        conflicts = []
+
+        profiles = (
+            UserProfile.objects.filter(client_id__startswith='client_')
+            .select_related('user').only('id', 'client_id', 'postcode', 'user__id', 'user__email')
+        )
+        for profile in profiles.iterator(chunk_size=2000):
+            if not has_default_client_id(profile):
+                continue
+            email = normalize_email(profile.user.email)
+            entry = {'user_id': profile.user_id, 'email': profile.user.email, 'client_id': profile.client_id}
+
+            match = self.match_profile(profile, sheet_rows.get(email, []))
+            if match is None:
+                unmatched.append(entry)
+                continue
+            if 'reason' in match:
+                conflicts.append({**entry, **match})
+                continue
+            updates.append((profile, {**entry, **match}))
+
+        # A client_id two profiles match can't tell which one it belongs to: neither gets it
+        claims = Counter(change['client_id'] for _, change in updates)
+        conflicts.extend(
+            {**change, 'reason': 'client_id matched by another profile in this run'}
+            for _, change in updates if claims[change['client_id']] > 1
+        )
+        updates = [(profile, change) for profile, change in updates if claims[change['client_id']] == 1]
+
+        # Sheet ids already held by profiles outside this run can't be reused (client_id is unique)
+        taken = set()
+        new_ids = [change['client_id'] for _, change in updates]
+        for start in range(0, len(new_ids), options['batch_size']):
+            taken.update(
+                UserProfile.objects.filter(client_id__in=new_ids[start:start + options['batch_size']])
+                .values_list('client_id', flat=True)
+            )
+        applied = []
+        for profile, change in updates:
+            if change['client_id'] in taken:
+                conflicts.append({**change, 'reason': 'client_id already belongs to another profile'})
+                continue
+            change['old_client_id'] = profile.client_id
+            profile.client_id = change['client_id']
+            applied.append((profile, change))
+
+        if applied and not options['dry_run']:
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(
+                    [profile for profile, _ in applied], ['client_id'], batch_size=options['batch_size']
+                )
+            # bulk_update skips post_save, so drop the cached profiles here
+            invalidate_profile_cache(*[profile.user_id for profile, _ in applied])
+
+        report = {
+            'dry_run': options['dry_run'],
+            'updated': [change for _, change in applied],
+            'unmatched': unmatched,
+            'conflicts': conflicts,
+        }
+        if options['report']:
+            with open(options['report'], 'w', encoding='utf-8') as report_file:
+                json.dump(report, report_file, indent=2)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        for item in conflicts:
+            self.stdout.write(f"  conflict: {item['email']} -> {item.get('client_id')}: {item['reason']}")
+        self.stdout.write(
+            f"{'Would update' if options['dry_run'] else 'Updated'} {len(applied)} profiles; "
+            f"{len(unmatched)} unmatched, {len(conflicts)} conflicts"
+        )
+
+    def load_email_map(self, page_size):
+        """
+        Read the client sheets once and map each email to the rows listing it.
+
+        Returns:
+            {email: [{'client_id', 'postcode', 'sheet', 'row'}, ...]} in lookup order
+        """
+        service = get_admin_sheets_service()
+        email_map = {}
+        for sheet_name, layouts in LOOKUP_ORDER:
+            columns = []  # (header_row, email, client_id, postcode column) per usable layout
+            for layout in layouts:
+                headers = read_header_row(service, sheet_name, layout)
+                email_col = find_column(headers, contains='email')
+                client_id_col = find_column(headers, CLIENT_ID_HEADERS)
+                postcode_col = find_column(headers, POSTCODE_HEADERS)
+                if email_col is not None and client_id_col is not None:
+                    columns.append((layout['header_row'], email_col, client_id_col, postcode_col))
+            if not columns:
+                continue
+
+            # Page through the sheet once, wide and low enough for every layout
+            read_layout = {
+                'header_row': min(layout['header_row'] for layout in layouts),
+                'last_column': max((layout['last_column'] for layout in layouts), key=column_count),
+            }
+            found = [[] for _ in columns]  # kept per layout, so the map stays in lookup order
+            for row_number, row in iter_sheet_rows(service, sheet_name, read_layout, page_size=page_size):
+                for (header_row, email_col, client_id_col, postcode_col), rows in zip(columns, found):
+                    if row_number <= header_row:
+                        continue
+                    email = normalize_email(row[email_col]) if email_col < len(row) else ''
+                    client_id = str(row[client_id_col]).strip() if client_id_col < len(row) else ''
+                    if not email or not client_id:
+                        continue
+                    postcode = str(row[postcode_col]).strip() if postcode_col is not None and postcode_col < len(row) else ''
+                    rows.append((email, {
+                        'client_id': client_id, 'postcode': postcode, 'sheet': sheet_name, 'row': row_number,
+                    }))
+            for rows in found:
+                for email, entry in rows:
+                    email_map.setdefault(email, []).append(entry)
+        return email_map
+
+    def match_profile(self, profile, rows):
+        """
+        Pick the sheet row for a profile the way the dashboard's email lookup would.
+
+        Returns:
+            Row dict, a dict with a 'reason' for conflicts, or None if nothing matches
+        """
+        candidates = []
+        for row in rows:
+            # The Input sheet only counts when its postcode agrees with the profile's
+            if row['sheet'] == 'Input' and profile.postcode and row['postcode']:
+                if row['postcode'].upper() != profile.postcode.strip().upper():
+                    continue
+            candidates.append(row)
+        if not candidates:
+            return None
+
+        # The first sheet with a match decides; several client_ids there is ambiguous
+        first_sheet = [row for row in candidates if row['sheet'] == candidates[0]['sheet']]
+        client_ids = sorted({row['client_id'] for row in first_sheet})
+        if len(client_ids) > 1:
+            return {
+                'client_id': client_ids, 'sheet': candidates[0]['sheet'],
+                'rows': [row['row'] for row in first_sheet],
+                'reason': 'email listed with different client_ids',
+            }
+        match = candidates[0]
+        return {'client_id': match['client_id'], 'sheet': match['sheet'], 'row': match['row']}
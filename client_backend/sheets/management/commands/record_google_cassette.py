@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import UserProfile, users_with_email
+from sheets.benchmarks.endpoints import READ_ENDPOINTS, endpoint_requests
+from sheets.cassettes import Scrubber, record_cassette
+from sheets.single_flight import wait_for_background_refreshes
+from sheets.snapshots import clear_sheet_snapshots
+
+RECORD_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'record-cassette-{alias}'}
+    for alias in ('default', 'profiles')
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the portal's read requests as one client against the live Google APIs and record the "
+        "Google traffic into a cassette for offline replay (bench_endpoints --cassette). Credentials are "
+        "removed, emails pseudonymised and sheet cells masked except header rows and identifier columns; "
+        "Drive file names and other text are only masked where --mask patterns match"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help="Email of the portal user to make the requests as")
+        parser.add_argument('output', help="Cassette file to write (.json, or .json.gz to compress)")
+        parser.add_argument('--endpoint', action='append', choices=READ_ENDPOINTS,
+                            help="Endpoint to request (repeatable; default all read endpoints)")
+        parser.add_argument('--mask', action='append', default=[],
+                            help="Regex of other personal data to mask in the recording (repeatable)")
+
+    def handle(self, *args, **options):
+        user = users_with_email(options['email']).first()
+        if user is None:
+            raise CommandError(f"No user with email {options['email']}")
+        try:
+            profile = UserProfile.objects.get(user=user)
+        except UserProfile.DoesNotExist:
+            raise CommandError(f"{options['email']} has no profile")
+
+        endpoints = options['endpoint'] or READ_ENDPOINTS
+        scrubber = Scrubber(options['mask'])
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        requests = endpoint_requests(client, profile.client_id)
+
+        # APIClient requests come from 'testserver'; the local cache and snapshot directory keep
+        # the server's cached profiles, chatbot facts and sheet snapshots from skipping the Google reads
+        snapshot_dir = tempfile.mkdtemp(prefix='record-snapshots-')
+        try:
+            with override_settings(CACHES=RECORD_CACHES, SHEET_SNAPSHOT_DIR=snapshot_dir,
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                    record_cassette(options['output'], scrubber=scrubber) as cassette:
+                self.record(endpoints, requests, cassette)
+                # Replays run as a user with the same (scrubbed) identifiers
+                cassette.metadata['user'] = {
+                    'email': scrubber.pseudonym(user.email),
+                    'client_id': scrubber.text(profile.client_id or ''),
+                    'postcode': scrubber.cell(profile.postcode or ''),
+                }
+                cassette.metadata['endpoints'] = endpoints
+        finally:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+        statuses = sorted({call['status'] for call in cassette.interactions})
+        self.stdout.write(self.style.SUCCESS(
+            f"Recorded {len(cassette.interactions)} Google calls (statuses {statuses}) to {options['output']}"
+        ))
+
+    def record(self, endpoints, requests, cassette):
+        for endpoint in endpoints:
+            for backend in caches.all():
+                backend.clear()
+            # Each endpoint reads its tabs itself; reads its lookups start in the background are
+            # finished first, so they are recorded with the endpoint that made them
+            clear_sheet_snapshots()
+            first_call = len(cassette.interactions)
+            response = requests[endpoint]()
+            wait_for_background_refreshes()
+            calls = cassette.interactions[first_call:]
+            self.stdout.write(
+                f"{endpoint:18} {response.status_code}  {len(calls)} Google calls  "
+                f"{sum(call['elapsed'] for call in calls) * 1000:.0f} ms in Google"
+            )
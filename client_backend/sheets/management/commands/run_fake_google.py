@@ -0,0 +1,120 @@
+import json
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import AdminGoogleOAuthToken
+from sheets.benchmarks.portfolio import generate_portfolio
+from sheets.fake_google import DEFAULT_ERROR_PATHS, HTTP_REASONS, FakeGoogle, sample_fixture
+from sheets.oauth_utils import SCOPES
+
+
+class FakeGoogleHandler(BaseHTTPRequestHandler):
+    """Pass every request to the server's FakeGoogle backend"""
+    protocol_version = 'HTTP/1.1'
+
+    def handle_one(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        host = self.headers.get('Host') or f"{self.server.server_address[0]}:{self.server.server_address[1]}"
+        status, headers, content = self.server.backend.handle(
+            self.command, self.path, headers=dict(self.headers.items()), body=body, base_url=f"http://{host}"
+        )
+        self.send_response(status, HTTP_REASONS.get(status))
+        for key, value in headers.items():
+            if key.lower() != 'content-length':
+                self.send_header(key, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_one
+
+    def log_message(self, format, *args):
+        if self.server.verbosity > 1:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local fake of the Google Sheets/Drive/OAuth APIs the portal uses, with optional latency and "
+        "error injection. Point the backend at it with GOOGLE_API_BASE_URL=http://<host>:<port> and "
+        "GOOGLE_OAUTH_TOKEN_URI=http://<host>:<port>/token."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8900)
+        parser.add_argument('--data', help="JSON fixture with the spreadsheets and Drive files to serve "
+                                           "(default: a small sample portfolio)")
+        parser.add_argument('--rows', type=int,
+                            help="Serve a synthetic portfolio of this many clients (as used by bench_endpoints)")
+        parser.add_argument('--spreadsheet-id', default=settings.GOOGLE_SHEET_ID,
+                            help="Spreadsheet id for the sample or synthetic portfolio")
+        parser.add_argument('--latency-ms', type=float, default=0.0, help="Latency added to every call")
+        parser.add_argument('--jitter-ms', type=float, default=0.0, help="Extra random latency of up to this much")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of calls (0-1) that fail")
+        parser.add_argument('--error-status', type=int, default=503, help="HTTP status of injected errors")
+        parser.add_argument('--error-paths', default=DEFAULT_ERROR_PATHS,
+                            help="Regex of request paths errors are injected into")
+        parser.add_argument('--seed', type=int, help="Seed for jitter and error injection")
+        parser.add_argument('--connect-admin', action='store_true',
+                            help="Store an admin Google token in the database, so the backend can call the fake "
+                                 "without going through the OAuth flow")
+
+    def handle(self, *args, **options):
+        if not 0 <= options['error_rate'] <= 1:
+            raise CommandError("--error-rate must be between 0 and 1")
+
+        backend = FakeGoogle(
+            latency=options['latency_ms'] / 1000,
+            jitter=options['jitter_ms'] / 1000,
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            error_paths=options['error_paths'],
+            seed=options['seed'],
+        )
+        if options['data']:
+            try:
+                with open(options['data'], encoding='utf-8') as data_file:
+                    backend.load_fixture(json.load(data_file))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not load {options['data']}: {e}")
+        elif options['rows']:
+            backend.load_fixture(generate_portfolio(options['rows'], options['spreadsheet_id']))
+        else:
+            backend.load_fixture(sample_fixture(options['spreadsheet_id']))
+
+        if options['connect_admin']:
+            AdminGoogleOAuthToken.objects.all().delete()
+            AdminGoogleOAuthToken.objects.create(
+                access_token='fake-access-token',
+                refresh_token='fake-refresh-token',
+                token_expiry=timezone.now() + timedelta(days=365),
+                scopes=' '.join(SCOPES),
+            )
+            self.stdout.write("Stored a fake admin Google token")
+
+        server = ThreadingHTTPServer((options['host'], options['port']), FakeGoogleHandler)
+        server.daemon_threads = True
+        server.backend = backend
+        server.verbosity = options['verbosity']
+
+        base_url = f"http://{options['host']}:{server.server_address[1]}"
+        for spreadsheet_id, spreadsheet in backend.spreadsheets.items():
+            tabs = ', '.join(f"{sheet['properties']['title']} ({len(sheet['rows'])} rows)" for sheet in spreadsheet['sheets'])
+            self.stdout.write(f"Spreadsheet {spreadsheet_id}: {tabs}")
+        self.stdout.write(f"{len(backend.files)} Drive files")
+        self.stdout.write(f"Fake Google APIs on {base_url}")
+        self.stdout.write(f"  GOOGLE_API_BASE_URL={base_url} GOOGLE_OAUTH_TOKEN_URI={base_url}/token")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            for route, count in sorted(backend.call_counts.items()):
+                self.stdout.write(f"  {count:6d}  {route}")
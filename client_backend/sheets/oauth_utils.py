@@ -3,7 +3,7 @@ from django.conf import settings
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from .google_transport import build_service, google_token_request
 from googleapiclient.errors import HttpError
 from accounts.models import GoogleOAuthToken
 from django.utils import timezone
@@ -22,6 +22,7 @@ SCOPES = [
 CLIENT_ID = getattr(settings, 'GOOGLE_OAUTH_CLIENT_ID', None)
 CLIENT_SECRET = getattr(settings, 'GOOGLE_OAUTH_CLIENT_SECRET', None)
 REDIRECT_URI = getattr(settings, 'GOOGLE_OAUTH_REDIRECT_URI', 'http://localhost:8000/api/sheets/oauth/callback/')
+TOKEN_URI = getattr(settings, 'GOOGLE_OAUTH_TOKEN_URI', 'https://oauth2.googleapis.com/token')
 
 def get_oauth_flow():
     """Create OAuth flow for user authentication"""
@@ -34,7 +35,7 @@ def get_oauth_flow():
                 "client_id": CLIENT_ID,
                 "client_secret": CLIENT_SECRET,
                 "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
+                "token_uri": TOKEN_URI,
                 "redirect_uris": [REDIRECT_URI]
             }
         },
@@ -64,7 +65,7 @@ def exchange_code_for_tokens(user, authorization_code):
     # We'll use requests directly to fetch the token, bypassing oauthlib's scope validation
     
     # Exchange authorization code for tokens using direct HTTP request
-    token_url = 'https://oauth2.googleapis.com/token'
+    token_url = TOKEN_URI
     token_data = {
         'code': authorization_code,
         'client_id': CLIENT_ID,
@@ -74,7 +75,8 @@ def exchange_code_for_tokens(user, authorization_code):
     }
     
     try:
-        response = requests.post(token_url, data=token_data)
+        with google_token_request('token.exchange'):
+            response = requests.post(token_url, data=token_data)
         response.raise_for_status()
         token_response = response.json()
         
@@ -97,7 +99,7 @@ def exchange_code_for_tokens(user, authorization_code):
         credentials = Credentials(
             token=access_token,
             refresh_token=refresh_token,
-            token_uri="https://oauth2.googleapis.com/token",
+            token_uri=TOKEN_URI,
             client_id=CLIENT_ID,
             client_secret=CLIENT_SECRET,
             scopes=scopes_list  # Use the scopes Google actually granted
@@ -149,7 +151,7 @@ def get_user_credentials(user):
     credentials = Credentials(
         token=token_obj.access_token,
         refresh_token=token_obj.refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
+        token_uri=TOKEN_URI,
         client_id=CLIENT_ID,
         client_secret=CLIENT_SECRET,
         scopes=SCOPES  # Use current required scopes
@@ -159,7 +161,8 @@ def get_user_credentials(user):
     if token_obj.is_expired() and token_obj.refresh_token:
         try:
             # Refresh the token
-            credentials.refresh(Request())
+            with google_token_request('token.refresh'):
+                credentials.refresh(Request())
             
             # Update stored token
             expiry_time = None
@@ -188,7 +191,7 @@ def get_sheets_service(user):
     """Get Google Sheets API service using user's OAuth credentials"""
     try:
         credentials = get_user_credentials(user)
-        return build('sheets', 'v4', credentials=credentials)
+        return build_service('sheets', 'v4', credentials)
     except GoogleOAuthToken.DoesNotExist:
         # Re-raise OAuth connection errors so views can handle them properly
         raise
@@ -199,7 +202,7 @@ def get_drive_service(user):
     """Get Google Drive API service using user's OAuth credentials"""
     try:
         credentials = get_user_credentials(user)
-        return build('drive', 'v3', credentials=credentials)
+        return build_service('drive', 'v3', credentials)
     except GoogleOAuthToken.DoesNotExist:
         # Re-raise OAuth connection errors so views can handle them properly
         raise
@@ -212,7 +215,7 @@ def get_connected_google_email(user):
     try:
         credentials = get_user_credentials(user)
         # Use OAuth2 service to get user info
-        service = build('oauth2', 'v2', credentials=credentials)
+        service = build_service('oauth2', 'v2', credentials)
         user_info = service.userinfo().get().execute()
         return user_info.get('email', 'Unknown')
     except Exception as e:
@@ -237,7 +240,7 @@ def get_admin_credentials():
     credentials = Credentials(
         token=token_obj.access_token,
         refresh_token=token_obj.refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
+        token_uri=TOKEN_URI,
         client_id=CLIENT_ID,
         client_secret=CLIENT_SECRET,
         scopes=SCOPES
@@ -246,7 +249,8 @@ def get_admin_credentials():
     # Refresh if expired
     if token_obj.is_expired() and token_obj.refresh_token:
         try:
-            credentials.refresh(Request())
+            with google_token_request('token.refresh'):
+                credentials.refresh(Request())
             token_obj.access_token = credentials.token
             if credentials.expiry:
                 token_obj.token_expiry = credentials.expiry
@@ -260,7 +264,7 @@ def get_admin_sheets_service():
     """Get Google Sheets service using admin's credentials"""
     try:
         credentials = get_admin_credentials()
-        return build('sheets', 'v4', credentials=credentials)
+        return build_service('sheets', 'v4', credentials)
     except Exception as e:
         raise Exception(f"Error initializing admin Google Sheets service: {str(e)}")
 
@@ -268,7 +272,7 @@ def get_admin_drive_service():
     """Get Google Drive service using admin's credentials"""
     try:
         credentials = get_admin_credentials()
-        return build('drive', 'v3', credentials=credentials)
+        return build_service('drive', 'v3', credentials)
     except Exception as e:
         raise Exception(f"Error initializing admin Google Drive service: {str(e)}")
 
@@ -317,7 +321,7 @@ def exchange_code_for_tokens_admin(authorization_code):
     from accounts.models import AdminGoogleOAuthToken
     import requests
     
-    token_url = 'https://oauth2.googleapis.com/token'
+    token_url = TOKEN_URI
     token_data = {
         'code': authorization_code,
         'client_id': CLIENT_ID,
@@ -326,7 +330,8 @@ def exchange_code_for_tokens_admin(authorization_code):
         'grant_type': 'authorization_code'
     }
     
-    response = requests.post(token_url, data=token_data)
+    with google_token_request('token.exchange'):
+        response = requests.post(token_url, data=token_data)
     response.raise_for_status()
     token_response = response.json()
     
@@ -0,0 +1,199 @@
+"""
+Reading client sheets without fetching whole grids.
+
+Management commands that walk every row use iter_sheet_rows(), which reads a
+sheet in fixed-size row ranges, so memory stays constant however many clients
+the sheet holds.
+
+The request handlers in views.py look up a single client. In the 'targeted'
+SHEET_READ_MODE they use targeted_rows(), which reads the header rows (cached),
+then only the identifier column, then only the matching row, instead of the
+whole sheet.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from monitoring.metrics import record_cache_lookup
+
+# Header layout of the client sheets: the row holding the column headers and
+# the last column read (matching the ranges used in views.py)
+SHEET_LAYOUTS = {
+    'LTP': {'header_row': 2, 'last_column': 'ZZ'},  # Row 1 degrees, row 2 headers
+    'Input': {'header_row': 1, 'last_column': 'Z'},
+}
+
+# Rows and columns cached by read_sheet_head(): LTP's degree and header rows, full width
+HEAD_ROWS = 2
+HEAD_LAST_COLUMN = 'ZZ'
+
+CLIENT_ID_HEADERS = ('client_id', 'client id', 'clientid')
+POSTCODE_HEADERS = ('postcode', 'postal_code', 'postal code')
+
+
+def find_column(headers, names=(), contains=None):
+    """
+    Find a column index by header name.
+
+    Args:
+        headers: Header row
+        names: Accepted header names (compared case-insensitively)
+        contains: Alternatively, a substring the header must contain
+
+    Returns:
+        Column index, or None if no header matches
+    """
+    for idx, header in enumerate(headers):
+        header_lower = str(header).strip().lower()
+        if header_lower in names or (contains and contains in header_lower):
+            return idx
+    return None
+
+
+def column_letter(index):
+    """Column letters for a 0-based column index (0 -> 'A', 26 -> 'AA')"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def column_count(letters):
+    """Number of columns up to and including a column ('Z' -> 26)"""
+    count = 0
+    for letter in letters.upper():
+        count = count * 26 + ord(letter) - ord('A') + 1
+    return count
+
+
+def sheet_head_cache_key(sheet_name):
+    return f"sheet_head:{settings.GOOGLE_SHEET_ID}:{sheet_name}"
+
+
+def read_sheet_head(values, sheet_name, refresh=False):
+    """
+    The first HEAD_ROWS rows of a sheet, cached for SHEET_HEAD_CACHE_TTL seconds.
+
+    Args:
+        values: The spreadsheets().values() resource
+        refresh: Read the sheet even if the rows are cached
+    """
+    key = sheet_head_cache_key(sheet_name)
+    head = None if refresh else cache.get(key)
+    record_cache_lookup('sheet_head', head is not None)
+    if head is None:
+        result = values.get(
+            spreadsheetId=settings.GOOGLE_SHEET_ID,
+            range=f"'{sheet_name}'!A1:{HEAD_LAST_COLUMN}{HEAD_ROWS}"
+        ).execute()
+        head = result.get('values', [])
+        cache.set(key, head, settings.SHEET_HEAD_CACHE_TTL)
+    return head
+
+
+def targeted_rows(values, sheet_name, header_row, last_column, column_for, matches):
+    """
+    Find one client's row by reading the identifier column, then only that row.
+
+    The identifier column is read from row 1, so its header cell can be checked
+    against the cached headers; if the columns were rearranged the headers are
+    read again.
+
+    Args:
+        values: The spreadsheets().values() resource, used for all the reads
+            (building a resource generates the docs of its methods, which is slow)
+        header_row: Row holding the column headers (1 or 2); data starts below it
+        last_column: Last column of the row to read ('Z', 'ZZ')
+        column_for: Callable returning the identifier column index for a header row, or None
+        matches: Callable telling whether an identifier cell is the one looked for
+
+    Returns:
+        (rows 1..header_row, [(row number, row)] or [] when nothing matches), or
+        None if the sheet changed between the reads and the caller should read
+        the whole sheet instead
+    """
+    width = column_count(last_column)
+    for refresh in (False, True):
+        head = [row[:width] for row in read_sheet_head(values, sheet_name, refresh)[:header_row]]
+        headers = head[header_row - 1] if len(head) >= header_row else []
+        column = column_for(headers) if headers else None
+        if column is None:
+            return head, []
+
+        letter = column_letter(column)
+        result = values.get(
+            spreadsheetId=settings.GOOGLE_SHEET_ID,
+            range=f"'{sheet_name}'!{letter}1:{letter}"
+        ).execute()
+        cells = [row[0] if row else '' for row in result.get('values', [])]
+        if len(cells) < header_row or cells[header_row - 1] != headers[column]:
+            continue  # headers moved since they were cached
+
+        row_number = next((number for number, value in enumerate(cells[header_row:], start=header_row + 1)
+                           if matches(value)), None)
+        if row_number is None:
+            return head, []
+
+        result = values.get(
+            spreadsheetId=settings.GOOGLE_SHEET_ID,
+            range=f"'{sheet_name}'!A{row_number}:{last_column}{row_number}"
+        ).execute()
+        rows = result.get('values', [])
+        row = rows[0] if rows else []
+        if len(row) > column and matches(row[column]):
+            return head, [(row_number, row)]
+    return None
+
+
+def read_header_row(service, sheet_name, layout):
+    """Read the header row of a sheet"""
+    header_row = layout['header_row']
+    result = service.spreadsheets().values().get(
+        spreadsheetId=settings.GOOGLE_SHEET_ID,
+        range=f"'{sheet_name}'!A{header_row}:{layout['last_column']}{header_row}"
+    ).execute()
+    rows = result.get('values', [])
+    return rows[0] if rows else []
+
+
+def sheet_row_count(service, sheet_name):
+    """Number of rows in a sheet's grid (gridProperties.rowCount), or None if the sheet is missing"""
+    spreadsheet = service.spreadsheets().get(
+        spreadsheetId=settings.GOOGLE_SHEET_ID,
+        fields='sheets.properties(title,gridProperties.rowCount)'
+    ).execute()
+    for sheet in spreadsheet.get('sheets', []):
+        properties = sheet.get('properties', {})
+        if properties.get('title') == sheet_name:
+            return properties.get('gridProperties', {}).get('rowCount')
+    return None
+
+
+def iter_sheet_rows(service, sheet_name, layout, page_size=5000):
+    """
+    Yield the data rows below the header row, one page of rows at a time.
+
+    Pages are read up to the sheet's row count, so a run of blank rows longer
+    than a page does not end the walk early; blank rows are skipped.
+
+    Yields:
+        Tuple of (row_number, row values)
+    """
+    row_count = sheet_row_count(service, sheet_name)
+    start = layout['header_row'] + 1
+    while row_count is None or start <= row_count:
+        end = start + page_size - 1
+        if row_count is not None:
+            end = min(end, row_count)
+        result = service.spreadsheets().values().get(
+            spreadsheetId=settings.GOOGLE_SHEET_ID,
+            range=f"'{sheet_name}'!A{start}:{layout['last_column']}{end}"
+        ).execute()
+        rows = result.get('values', [])
+        if row_count is None and not rows:
+            return  # Without a row count, stop where the Sheets API trims trailing empty rows
+        for offset, row in enumerate(rows):
+            if row:
+                yield start + offset, row
+        start = end + 1
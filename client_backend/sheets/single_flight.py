@@ -0,0 +1,141 @@
+"""
+Single-flight fetches.
+
+When a cached sheet expires under load, every request that notices it would
+otherwise make its own identical read from Google. single_flight() runs one
+fetch per key at a time in the process: the first caller fetches, callers
+arriving meanwhile wait and get its result (or its exception). file_lock()
+does the same across workers, for caches the workers share on disk: the
+caller holding the lock refreshes, the others wait and then find the fresh copy;
+if the holder is stuck they give up (LockTimeout) instead of refreshing beside it.
+
+refresh_in_background() runs a single-flight fetch in a thread, for caches that
+keep serving an expired entry while it is refreshed.
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+
+from monitoring.metrics import record_coalesced_fetch
+
+logger = logging.getLogger(__name__)
+
+
+class LockTimeout(TimeoutError):
+    """file_lock() gave up waiting for another process to release the lock"""
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+_background = {}  # key -> thread refreshing it in the background
+
+
+def single_flight(key, fetch, source='google'):
+    """
+    fetch(), unless a call with the same key is already running in this
+    process, in which case wait for it and return its result.
+
+    Args:
+        key: Identifies the fetch, e.g. (spreadsheet id, range)
+        source: Label for the coalesced_fetches_total metric
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        record_coalesced_fetch(source, 'process')
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = fetch()
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def refresh_in_background(key, fetch, source='google'):
+    """
+    Run single_flight(key, fetch) in a daemon thread, unless one is already
+    running for key. Errors are logged; the caller keeps its stale data.
+
+    Returns:
+        True if a refresh was started
+    """
+    def run():
+        try:
+            single_flight(key, fetch, source)
+        except Exception:
+            logger.exception("Background refresh of %s failed", key)
+        finally:
+            with _flights_lock:
+                _background.pop(key, None)
+            # The thread's own database connections (the admin's OAuth token lookup)
+            connections.close_all()
+
+    with _flights_lock:
+        if key in _background:
+            return False
+        thread = _background[key] = threading.Thread(target=run, name=f"refresh-{source}", daemon=True)
+    thread.start()
+    return True
+
+
+def wait_for_background_refreshes(timeout=None):
+    """Wait for the background refreshes running now to finish (benchmarks, tests)"""
+    with _flights_lock:
+        threads = list(_background.values())
+    for thread in threads:
+        thread.join(timeout)
+
+
+@contextmanager
+def file_lock(path, timeout):
+    """
+    Exclusive lock on path (created if needed) shared by all processes on the host.
+
+    Raises:
+        LockTimeout: If the lock is still held by another process after timeout
+            seconds; the caller must not do the work the lock guards
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"{path} still locked after {timeout}s")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -0,0 +1,544 @@
+"""
+Snapshots of the client sheets, shared by the workers.
+
+Client lookups read the same tabs (LTP, Input, VR, Documents) on every request.
+get_sheet_snapshot() keeps each tab for SHEET_SNAPSHOT_TTL seconds in a
+compact, column-oriented form:
+    - each column is its cells' UTF-8 bytes back to back, plus an array of
+      offsets into them, instead of a str object (~50 bytes before its
+      characters) and a list slot per cell
+    - the header rows (LTP's degrees and headers) are kept once, as tuples of
+      interned strings
+    - RowView reads a row in place; a list of its cells is only built when
+      asked for
+
+The snapshot is one file in SHEET_SNAPSHOT_DIR, written atomically (to a
+temporary file, then renamed) by whichever worker reads the tab from Google,
+and memory-mapped by every worker. Its fetch time is in the file, so one read
+from Google serves all the workers until it expires, and the cell data sits in
+the page cache once rather than in each worker's heap. Workers notice a new
+or removed file on their next lookup. With SHEET_SNAPSHOT_DIR empty the same
+layout is kept in each worker's memory instead.
+
+Lookups by identifier use per-column indexes, built the first time a column is
+searched: an array of row indexes sorted by the normalized cell value (4 bytes
+a row), binary-searched. They are written next to the snapshot and mapped the
+same way. Anything else worth keeping per snapshot (the VR unit mapping) is
+stored per worker with derived() and goes away with the snapshot.
+
+An expired tab is read from Google once, however many requests notice it:
+threads of a worker wait for the one already reading it (single_flight), and
+workers take a lock on the tab's file, so those that wait for it find the
+snapshot the first one wrote. A snapshot is only served if its read started
+after the tab was last invalidated (by an upload appending to it), so a
+refresh already running during the upload can't put the old rows back.
+For SHEET_SNAPSHOT_STALE_GRACE seconds after it
+expires, a snapshot is still served while a background thread reads the tab
+again, so requests only wait for Google when there is no snapshot at all or it
+has gone unused for longer than that. Each request reports the age of the
+snapshots it used (X-Data-Age).
+"""
+import glob
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from django.conf import settings
+
+from monitoring.memory import deep_sizeof, register_memory_source
+from monitoring.metrics import record_cache_lookup, record_coalesced_fetch, set_snapshot_age
+from monitoring.telemetry import note_data_age
+
+from .sheet_rows import column_count
+from .single_flight import LockTimeout, file_lock, refresh_in_background, single_flight
+
+# Rows kept as the snapshot's head (LTP: degrees and headers)
+HEAD_ROWS = 2
+SNAPSHOT_COLUMNS = {'VR': 'C:D', 'Documents': 'A:Z'}  # columns read per tab, A:ZZ by default
+DEFAULT_COLUMNS = 'A:ZZ'
+
+MAGIC = b'PSNAP001'
+_prefix = struct.Struct('<8sI')  # magic, length of the JSON header
+
+_snapshots = {}  # (spreadsheet id, tab) -> SheetSnapshot
+_snapshots_lock = threading.Lock()
+_invalidations = {}  # (spreadsheet id, tab) -> (marker file version or None, time of the last invalidation)
+
+# Times a refresh reads the tab again when it was invalidated during the read
+READ_ATTEMPTS = 3
+
+
+def normalize_id(value):
+    """Client id as the lookups compare it: without '#', trimmed, lower case"""
+    return str(value).replace('#', '').strip().lower()
+
+
+def normalize_email(value):
+    return str(value).strip().lower()
+
+
+def normalize_document_client_id(value):
+    """Client id as the Documents tab is matched (case-sensitive)"""
+    return str(value).strip().replace('#', '')
+
+
+def _aligned(length):
+    return -length % 8
+
+
+def encode_snapshot(sheet_name, rows, fetched_at=None):
+    """A tab's rows in the snapshot layout: a JSON header, then the row lengths and each column's offsets and bytes"""
+    width = max((len(row) for row in rows), default=0)
+    sections = [array('H', (len(row) for row in rows)).tobytes()]
+    for column in range(width):
+        cells = [str(row[column]).encode('utf-8') if column < len(row) else b'' for row in rows]
+        sections.append(array('I', accumulate(map(len, cells), initial=0)).tobytes())
+        sections.append(b''.join(cells))
+    header = {
+        'sheet_name': sheet_name,
+        'fetched_at': time.time() if fetched_at is None else fetched_at,
+        'generation': uuid.uuid4().hex,
+        'row_count': len(rows),
+        'width': width,
+        'head': [[str(cell) for cell in row] for row in rows[:HEAD_ROWS]],
+        'sections': [len(section) for section in sections],
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    parts = [_prefix.pack(MAGIC, len(header_bytes)), header_bytes]
+    offset = _prefix.size + len(header_bytes)
+    for section in sections:
+        parts.append(bytes(_aligned(offset)))
+        offset += _aligned(offset)
+        parts.append(section)
+        offset += len(section)
+    return b''.join(parts)
+
+
+class SheetSnapshot:
+    """A tab's values, stored column by column in a bytes-like buffer (bytes, or a memory-mapped file)"""
+    __slots__ = (
+        'sheet_name', 'fetched_at', 'generation', 'head', 'row_count', 'width', 'path', 'file_id',
+        '_buffer', '_columns', '_offsets', '_lengths', '_indexes', '_derived', '_lock',
+    )
+
+    def __init__(self, buffer, path=None, file_id=None):
+        view = memoryview(buffer)
+        magic, header_length = _prefix.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"Not a sheet snapshot: {path or 'buffer'}")
+        header = json.loads(bytes(view[_prefix.size:_prefix.size + header_length]))
+        self.sheet_name = header['sheet_name']
+        self.fetched_at = header['fetched_at']
+        self.generation = header['generation']
+        self.head = tuple(tuple(sys.intern(cell) for cell in row) for row in header['head'])
+        self.row_count = header['row_count']
+        self.width = header['width']
+        self.path = path
+        self.file_id = file_id
+        self._buffer = buffer
+
+        sections = []
+        offset = _prefix.size + header_length
+        for length in header['sections']:
+            offset += _aligned(offset)
+            sections.append(view[offset:offset + length])
+            offset += length
+        self._lengths = sections[0].cast('H')
+        self._offsets = [section.cast('I') for section in sections[1::2]]
+        self._columns = sections[2::2]
+        self._indexes = {}
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def cell(self, row_index, column):
+        if column >= self.width:
+            return ''
+        offsets = self._offsets[column]
+        return str(self._columns[column][offsets[row_index]:offsets[row_index + 1]], 'utf-8')
+
+    def row(self, row_index):
+        return RowView(self, row_index)
+
+    def rows(self, start=0):
+        """The rows from start on, as lists of cells"""
+        return [RowView(self, row_index).values() for row_index in range(start, self.row_count)]
+
+    def find(self, column, normalize, key, first_row):
+        """Index of the first row (from first_row on) whose cell in column normalizes to key, or None"""
+        return next(iter(self.find_all(column, normalize, key, first_row)), None)
+
+    def find_all(self, column, normalize, key, first_row):
+        """
+        Indexes of all rows (from first_row on) whose cell in column normalizes to key, in sheet order.
+
+        normalize must be a module-level function: its name is part of the shared index's file name.
+        """
+        index = self._index(column, normalize, first_row)
+
+        def value(row_index):
+            return normalize(self.cell(row_index, column))
+
+        matches = []
+        position = bisect_left(index, key, key=value)
+        while position < len(index) and value(index[position]) == key:
+            matches.append(index[position])
+            position += 1
+        return matches
+
+    def _index(self, column, normalize, first_row):
+        index_key = (column, normalize, first_row)
+        index = self._indexes.get(index_key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(index_key)
+                if index is None:
+                    index_path = self._index_path(column, normalize, first_row)
+                    index = _map_index(index_path) if index_path else None
+                    if index is None:
+                        # The sort is stable, so rows with the same value stay in sheet order
+                        index = array('I', sorted(range(first_row, self.row_count),
+                                                  key=lambda row_index: normalize(self.cell(row_index, column))))
+                        if index_path:
+                            index = _write_index(index_path, index)
+                    self._indexes[index_key] = index
+        return index
+
+    def _index_path(self, column, normalize, first_row):
+        if self.path is None:
+            return None
+        return f"{self.path}.{self.generation}.{column}-{normalize.__name__}-{first_row}.idx"
+
+    def derived(self, name, build):
+        """A value computed from this snapshot, built on first use (per worker)"""
+        if name not in self._derived:
+            with self._lock:
+                if name not in self._derived:
+                    self._derived[name] = build()
+        return self._derived[name]
+
+    def nbytes(self):
+        """Bytes held by the cell data (not the indexes)"""
+        return len(self._buffer) + deep_sizeof(self.head)
+
+    def stats(self):
+        return {
+            'rows': self.row_count,
+            'columns': self.width,
+            'bytes': self.nbytes(),
+            'shared': self.path is not None,
+            'indexes': len(self._indexes),
+            'index_bytes': sum(index.nbytes if isinstance(index, memoryview) else sys.getsizeof(index)
+                               for index in self._indexes.values()),
+            'derived_bytes': deep_sizeof(list(self._derived.values())),
+            'age_seconds': round(self.age(), 1),
+        }
+
+
+class RowView:
+    """One row of a snapshot, read in place"""
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+
+    @property
+    def number(self):
+        """Row number in the sheet (1-based)"""
+        return self.index + 1
+
+    def __len__(self):
+        return self.snapshot._lengths[self.index]
+
+    def __getitem__(self, column):
+        return self.snapshot.cell(self.index, column)
+
+    def values(self, width=None):
+        """The row's cells as a list, like a row of a values().get() response"""
+        length = len(self) if width is None else min(len(self), width)
+        return [self.snapshot.cell(self.index, column) for column in range(length)]
+
+    def as_dict(self, headers):
+        """The row keyed by header (cells past the end of the row are '')"""
+        return {header: self[column] for column, header in enumerate(headers)}
+
+
+def snapshot_range(sheet_name):
+    return f"'{sheet_name}'!{SNAPSHOT_COLUMNS.get(sheet_name, DEFAULT_COLUMNS)}"
+
+
+def _snapshot_path(key):
+    """File of a tab's shared snapshot: the tab name, readable, and a hash of the spreadsheet and tab"""
+    spreadsheet_id, sheet_name = key
+    digest = hashlib.sha1(f"{spreadsheet_id}\0{sheet_name}".encode('utf-8')).hexdigest()[:12]
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', sheet_name).strip('_') or 'sheet'
+    return os.path.join(settings.SHEET_SNAPSHOT_DIR, f"{slug}-{digest}.snap")
+
+
+def _map_file(file):
+    """Read-only mapping of an open file, and the (inode, mtime) identifying that version of it"""
+    stat = os.fstat(file.fileno())
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), (stat.st_ino, stat.st_mtime_ns)
+
+
+def _open_shared(key, path, current):
+    """
+    The snapshot in path: current if the file hasn't changed since it was
+    mapped, a new mapping if it has, None if there is no file
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if current is not None and current.file_id == (stat.st_ino, stat.st_mtime_ns):
+        return current
+    try:
+        with open(path, 'rb') as file:
+            buffer, file_id = _map_file(file)
+        snapshot = SheetSnapshot(buffer, path, file_id)
+    except (OSError, ValueError, struct.error):
+        return None  # removed meanwhile, or not a snapshot: read the tab again
+    with _snapshots_lock:
+        _snapshots[key] = snapshot
+    return snapshot
+
+
+def _store(key, data):
+    """Snapshot of encoded tab data: written to the shared file when SHEET_SNAPSHOT_DIR is set, else in memory"""
+    if not settings.SHEET_SNAPSHOT_DIR:
+        return SheetSnapshot(data)
+    path = _snapshot_path(key)
+    temporary = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temporary, 'w+b') as file:
+        file.write(data)
+        file.flush()
+        buffer, file_id = _map_file(file)
+    os.replace(temporary, path)
+    snapshot = SheetSnapshot(buffer, path, file_id)
+    _remove_indexes(path, keep=snapshot.generation)
+    return snapshot
+
+
+def _map_index(path):
+    """A shared index written by a worker, or None"""
+    try:
+        with open(path, 'rb') as file:
+            if not os.fstat(file.fileno()).st_size:
+                return array('I')
+            buffer, _ = _map_file(file)
+    except FileNotFoundError:
+        return None
+    return memoryview(buffer).cast('I')
+
+
+def _write_index(path, index):
+    """Write an index next to its snapshot for the other workers; returns it as mapped from the file"""
+    temporary = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, 'wb') as file:
+            index.tofile(file)
+        os.replace(temporary, path)
+    except OSError:
+        return index  # the snapshot directory is gone (cleared); keep it in memory
+    return _map_index(path) or index
+
+
+def _remove_indexes(path, keep=None):
+    for index_path in glob.glob(glob.escape(path) + '.*.idx'):
+        if keep is None or not index_path.startswith(f"{path}.{keep}."):
+            try:
+                os.remove(index_path)
+            except FileNotFoundError:
+                pass
+
+
+def get_sheet_snapshot(values, sheet_name, wait=True):
+    """
+    Snapshot of a tab, read from Google when there is none or it is older than
+    SHEET_SNAPSHOT_TTL. Within SHEET_SNAPSHOT_STALE_GRACE after that the old
+    snapshot is returned and the tab is read in the background.
+
+    Args:
+        values: Callable returning the spreadsheets().values() resource to read with;
+            only called when the tab is read, since building a service is slow
+        wait: False to read the tab in the background and return None when there
+            is no snapshot to serve, for callers that can answer with a narrower read
+    """
+    key = (settings.GOOGLE_SHEET_ID, sheet_name)
+    snapshot = _snapshots.get(key)
+    if settings.SHEET_SNAPSHOT_DIR:
+        snapshot = _open_shared(key, _snapshot_path(key), snapshot)
+    if snapshot is not None and snapshot.fetched_at <= _invalidated_at(key):
+        snapshot = None
+    hit = _fresh(snapshot)
+    stale = not hit and snapshot is not None and (
+        snapshot.age() < settings.SHEET_SNAPSHOT_TTL + settings.SHEET_SNAPSHOT_STALE_GRACE)
+    record_cache_lookup('sheet_snapshot', hit, stale)
+    flight_key = (key[0], snapshot_range(sheet_name))
+    if stale:
+        refresh_in_background(flight_key, lambda: _refresh(values, key), source='sheet_snapshot')
+    elif not hit:
+        if not wait:
+            refresh_in_background(flight_key, lambda: _refresh(values, key), source='sheet_snapshot')
+            return None
+        snapshot = single_flight(flight_key, lambda: _refresh(values, key), source='sheet_snapshot')
+    set_snapshot_age(sheet_name, snapshot.age())
+    note_data_age(snapshot.age())
+    return snapshot
+
+
+def _fresh(snapshot):
+    return snapshot is not None and snapshot.age() < settings.SHEET_SNAPSHOT_TTL
+
+
+def _refresh(values, key):
+    """
+    Read a tab from Google into a new snapshot; with shared snapshots, one worker at a time.
+
+    A worker that can't get the tab's lock within SHEET_SNAPSHOT_LOCK_TIMEOUT
+    serves the snapshot it has, however old, rather than read the tab beside the
+    worker holding the lock; without one it raises LockTimeout.
+    """
+    if not settings.SHEET_SNAPSHOT_DIR:
+        return _read(values, key)
+    path = _snapshot_path(key)
+    os.makedirs(settings.SHEET_SNAPSHOT_DIR, exist_ok=True)
+    try:
+        with file_lock(path[:-len('.snap')] + '.lock', settings.SHEET_SNAPSHOT_LOCK_TIMEOUT):
+            # Another worker may have read the tab while this one waited for the lock
+            snapshot = _open_shared(key, path, _snapshots.get(key))
+            if _fresh(snapshot) and snapshot.fetched_at > _invalidated_at(key):
+                record_coalesced_fetch('sheet_snapshot', 'workers')
+                return snapshot
+            return _read(values, key)
+    except LockTimeout:
+        snapshot = _open_shared(key, path, _snapshots.get(key))
+        if snapshot is None or snapshot.fetched_at <= _invalidated_at(key):
+            raise
+        return snapshot
+
+
+def _read(values, key):
+    """Read a tab into a new snapshot, timed from when the read started"""
+    sheet_name = key[1]
+    for _ in range(READ_ATTEMPTS):
+        started = time.time()
+        result = values().get(spreadsheetId=key[0], range=snapshot_range(sheet_name)).execute()
+        if _invalidated_at(key) < started:
+            break
+        # Invalidated during the read, which may not include the write: read again
+    snapshot = _store(key, encode_snapshot(sheet_name, result.get('values', []), fetched_at=started))
+    with _snapshots_lock:
+        _snapshots[key] = snapshot
+    return snapshot
+
+
+def _invalidated_at(key):
+    """When the tab's snapshot was last invalidated (in any worker), or 0"""
+    if not settings.SHEET_SNAPSHOT_DIR:
+        return _invalidations.get(key, (None, 0))[1]
+    marker = _snapshot_path(key) + '.invalidated'
+    try:
+        stat = os.stat(marker)
+    except FileNotFoundError:
+        return 0
+    version = (stat.st_ino, stat.st_mtime_ns)
+    cached = _invalidations.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    try:
+        with open(marker, encoding='utf-8') as marker_file:
+            invalidated_at = float(marker_file.read())
+    except (OSError, ValueError):
+        invalidated_at = stat.st_mtime
+    _invalidations[key] = (version, invalidated_at)
+    return invalidated_at
+
+
+def invalidate_sheet_snapshot(sheet_name):
+    """
+    Drop a tab's snapshot (in every worker) after writing to it, so the next
+    read sees the change. Refreshes whose read started before this are not served.
+    """
+    key = (settings.GOOGLE_SHEET_ID, sheet_name)
+    now = time.time()
+    with _snapshots_lock:
+        _snapshots.pop(key, None)
+        if not settings.SHEET_SNAPSHOT_DIR:
+            _invalidations[key] = (None, now)
+    if settings.SHEET_SNAPSHOT_DIR:
+        path = _snapshot_path(key)
+        os.makedirs(settings.SHEET_SNAPSHOT_DIR, exist_ok=True)
+        temporary = f"{path}.invalidated.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as marker_file:
+            marker_file.write(repr(now))
+        os.replace(temporary, path + '.invalidated')
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        _remove_indexes(path)
+
+
+def clear_sheet_snapshots():
+    """Drop all snapshots, including the shared files"""
+    with _snapshots_lock:
+        _snapshots.clear()
+        _invalidations.clear()
+    if settings.SHEET_SNAPSHOT_DIR:
+        for path in glob.glob(os.path.join(glob.escape(settings.SHEET_SNAPSHOT_DIR), '*.snap*')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def snapshot_rows(values, sheet_name, header_row, last_column, column_for, normalize, search):
+    """
+    Find one client's row in the tab's snapshot.
+
+    Same arguments and result as sheet_rows.targeted_rows(), except that values
+    is a callable as for get_sheet_snapshot() and rows are matched through an
+    index on normalize(cell) == normalize(search). A lookup never waits for the
+    whole tab to be read: without a snapshot to serve, the tab is read in the
+    background and None returned, so the caller reads the row another way.
+
+    Returns:
+        (rows 1..header_row, [(row number, row)] or []), or None
+    """
+    snapshot = get_sheet_snapshot(values, sheet_name, wait=False)
+    if snapshot is None:
+        return None
+    width = column_count(last_column)
+    head = [list(row[:width]) for row in snapshot.head[:header_row]]
+    headers = head[header_row - 1] if len(head) >= header_row else []
+    column = column_for(headers) if headers else None
+    if column is None:
+        return head, []
+    row_index = snapshot.find(column, normalize, normalize(search), header_row)
+    if row_index is None:
+        return head, []
+    return head, [(row_index + 1, snapshot.row(row_index).values(width))]
+
+
+def _memory_stats():
+    with _snapshots_lock:
+        snapshots = dict(_snapshots)
+    return {f"{spreadsheet_id}:{sheet_name}": snapshot.stats()
+            for (spreadsheet_id, sheet_name), snapshot in snapshots.items()}
+
+
+register_memory_source('sheet_snapshots', _memory_stats)
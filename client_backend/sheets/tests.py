@@ -1,3 +1,337 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from google.oauth2.credentials import Credentials
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import AdminGoogleOAuthToken, UserProfile
+from monitoring.telemetry import RequestTelemetry, collecting
+
+from .benchmarks import compare_metric, load_baseline
+from .benchmarks.chatbot_corpus import ACCURACY_TOLERANCE, BASELINE_PATH, load_corpus, measure_accuracy
+from .chatbot import build_client_facts, generate_response
+from .fake_google import FakeGoogle, FakeGoogleHttp, sample_fixture
+from .google_transport import build_service, use_transport
+from .oauth_utils import SCOPES
+from .single_flight import LockTimeout, file_lock, single_flight, wait_for_background_refreshes
+from .snapshots import _snapshot_path, clear_sheet_snapshots, get_sheet_snapshot, invalidate_sheet_snapshot
+
+# Kept out of the development cache and snapshot directory
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}'}
+    for alias in ('default', 'profiles')
+}
+
+
+def parse_events(content):
+    """(event, data) pairs of a text/event-stream body"""
+    events = []
+    for block in content.decode('utf-8').strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@override_settings(CACHES=TEST_CACHES, SHEET_SNAPSHOT_DIR='')
+class PortalTestCase(TestCase):
+    """A client user of the sample portfolio, with the fake Google answering in-process"""
+
+    def setUp(self):
+        for backend in caches.all():
+            backend.clear()
+        clear_sheet_snapshots()
+        self.google = FakeGoogle()
+        self.google.load_fixture(sample_fixture(settings.GOOGLE_SHEET_ID))
+        # Snapshots are built inline: other threads can't use the test's database transaction
+        build_inline = mock.patch('sheets.snapshots.refresh_in_background',
+                                  side_effect=lambda key, fetch, source: single_flight(key, fetch, source) and False)
+        self.enterContext(build_inline)
+        self.enterContext(use_transport(lambda: FakeGoogleHttp(self.google)))
+        self.enterContext(mock.patch.multiple('sheets.oauth_utils', CLIENT_ID='test', CLIENT_SECRET='test'))
+        self.addCleanup(clear_sheet_snapshots)
+
+        AdminGoogleOAuthToken.objects.create(
+            access_token='test', refresh_token='test',
+            token_expiry=timezone.now() + timedelta(days=1), scopes=' '.join(SCOPES),
+        )
+        self.user = User.objects.create_user('alice', email='alice@example.com', password='test-pass-123')
+        UserProfile.objects.filter(user=self.user).update(client_id='1001')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+
+class ChatbotStreamTests(PortalTestCase):
+    url = '/api/sheets/chatbot/stream/'
+
+    def test_streams_events_for_event_stream_clients(self):
+        response = self.client.post(self.url, {'message': 'what is my service charge'}, format='json',
+                                    HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = parse_events(b''.join(response.streaming_content))
+        self.assertEqual([event for event, _ in events], ['ack', 'message', 'done'])
+        self.assertTrue(events[1][1]['success'])
+
+    @override_settings(REQUEST_LOG=True)
+    def test_lookup_while_streaming_is_part_of_the_request(self):
+        with self.assertLogs('monitoring.requests', 'INFO') as logs:
+            response = self.client.post(self.url, {'message': 'what is my service charge'}, format='json',
+                                        HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(logs.output, [])  # reported once the stream ends
+            b''.join(response.streaming_content)
+            response.close()
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry['path'], self.url)
+        self.assertTrue(any(call.startswith('sheets ') for call in entry['google_calls']), entry)
+
+    def test_rejects_non_string_message(self):
+        response = self.client.post(self.url, {'message': ['not', 'text']}, format='json',
+                                    HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+        self.assertEqual(parse_events(response.content)[0][0], 'error')
+
+    def test_failure_sends_generic_error_then_done(self):
+        with mock.patch('sheets.views.get_chatbot_client_facts', side_effect=RuntimeError('secret detail')), \
+                self.assertLogs('sheets.views', 'ERROR'):
+            response = self.client.post(self.url, {'message': 'what is my service charge'}, format='json',
+                                        HTTP_ACCEPT='text/event-stream')
+            content = b''.join(response.streaming_content)
+        events = parse_events(content)
+        self.assertEqual([event for event, _ in events], ['ack', 'error', 'done'])
+        self.assertNotIn(b'secret detail', content)
+
+
+class GoogleTransportTests(TestCase):
+    def test_token_refresh_is_timed_as_google_auth(self):
+        google = FakeGoogle()
+        google.load_fixture(sample_fixture(settings.GOOGLE_SHEET_ID))
+        # No access token yet: AuthorizedHttp refreshes before the first call
+        credentials = Credentials(token=None, refresh_token='test', token_uri=settings.GOOGLE_OAUTH_TOKEN_URI,
+                                  client_id='test', client_secret='test')
+        telemetry = RequestTelemetry()
+        with use_transport(lambda: FakeGoogleHttp(google)), collecting(telemetry):
+            service = build_service('sheets', 'v4', credentials)
+            service.spreadsheets().values().get(spreadsheetId=settings.GOOGLE_SHEET_ID, range="'LTP'!A1:B2").execute()
+        self.assertEqual(telemetry.phases['google_auth'][1], 1)
+        self.assertEqual(telemetry.phases['google'][1], 1)
+        self.assertEqual([call['call'] for call in telemetry.google_trace], ['oauth2 token.refresh', 'sheets values.get'])
+
+
+class ChatbotFactsTests(TestCase):
+    def test_blank_cells_stay_blank(self):
+        facts = build_client_facts({'service_charge': '', 'landlord': 'Star Building Ltd.', 'unrelated': 'x'})
+        self.assertEqual(facts, {'service_charge': '', 'landlord': 'Star Building Ltd.'})
+        self.assertTrue(generate_response('what is my service charge', facts).startswith('Your service charge is  per year'))
+
+
+class ChatbotAccuracyTests(TestCase):
+    """
+    Classification accuracy on the labeled corpus in sheets/benchmarks. Throughput
+    depends on the machine, so it is measured by manage.py bench_chatbot instead.
+    """
+
+    def test_accuracy_does_not_drop_below_baseline(self):
+        results, _ = measure_accuracy(load_corpus())
+        baseline = load_baseline(BASELINE_PATH)
+        for key in ('relevance_accuracy', 'intent_accuracy'):
+            self.assertIsNone(compare_metric(key, results[key], baseline[key], ACCURACY_TOLERANCE))
+
+
+class SingleFlightTests(TestCase):
+    def test_waiters_get_the_leaders_exception(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        error = ValueError('read failed')
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            raise error
+
+        raised = []
+
+        def call():
+            try:
+                single_flight('key', fetch)
+            except ValueError as e:
+                raised.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        waiter = threading.Thread(target=call)
+        waiter.start()
+        time.sleep(0.1)  # let the waiter join the running fetch
+        release.set()
+        leader.join(5)
+        waiter.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(raised, [error, error])
+
+
+class SnapshotInvalidationTests(PortalTestCase):
+    def document_names(self):
+        response = self.client.get('/api/sheets/documents/')
+        self.assertEqual(response.status_code, 200)
+        return [document['name'] for document in response.json()['documents']]
+
+    def test_upload_shows_in_documents(self):
+        self.assertEqual(self.document_names(), ['Budget 2026.pdf'])
+        response = self.client.post('/api/sheets/documents/upload/', {
+            'file': SimpleUploadedFile('report.pdf', b'%PDF-1.4 report', content_type='application/pdf'),
+            'name': 'Report',
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.document_names(), ['Budget 2026.pdf', 'Report'])
+
+
+@override_settings(SHEET_SNAPSHOT_DIR='')
+class SnapshotRefreshTests(TestCase):
+    def setUp(self):
+        clear_sheet_snapshots()
+        self.addCleanup(clear_sheet_snapshots)
+
+    def test_documents_are_read_up_to_column_z(self):
+        ranges = []
+
+        class Values:
+            def get(self, spreadsheetId, range):
+                ranges.append(range)
+                return self
+
+            def execute(self):
+                return {'values': []}
+
+        get_sheet_snapshot(Values, 'Documents')
+        self.assertEqual(ranges, ["'Documents'!A:Z"])
+
+    def test_refresh_started_before_invalidation_is_not_served(self):
+        rows = [['client_id', 'name'], ['1001', 'Budget 2026.pdf']]
+        reading = threading.Event()
+        finish_read = threading.Event()
+
+        class Values:
+            """Reads see the rows as they were when the request was built, and wait for finish_read"""
+
+            def get(self, spreadsheetId, range):
+                self.rows = [list(row) for row in rows]
+                return self
+
+            def execute(self):
+                reading.set()
+                finish_read.wait(5)
+                return {'values': self.rows}
+
+        finish_read.set()
+        get_sheet_snapshot(Values, 'Documents')
+        reading.clear()
+        finish_read.clear()
+        with override_settings(SHEET_SNAPSHOT_TTL=0):
+            # Expired: served while the tab is read again in the background
+            get_sheet_snapshot(Values, 'Documents')
+            reading.wait(5)
+            rows.append(['1001', 'Report'])  # an upload lands during that read
+            invalidate_sheet_snapshot('Documents')
+            finish_read.set()
+            wait_for_background_refreshes()
+
+        self.assertEqual(get_sheet_snapshot(Values, 'Documents').row_count, 3)
+
+
+class ProvisionClientsTests(PortalTestCase):
+    def provision(self, *args):
+        call_command('provision_clients', *args, stdout=StringIO())
+        return dict(UserProfile.objects.values_list('user__email', 'client_id'))
+
+    def test_creates_and_invites_new_clients_only(self):
+        accounts = self.provision('--send-invites')
+        self.assertEqual(accounts, {'alice@example.com': '1001', 'bob@example.com': '1002', 'carol@example.com': '2001'})
+        self.assertEqual(UserProfile.objects.get(client_id='2001').postcode, 'SW18 1AA')
+        self.assertFalse(User.objects.get(email='bob@example.com').has_usable_password())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['bob@example.com', 'carol@example.com'])
+        self.assertIn(f'{settings.FRONTEND_URL}/accept-invite?uid=', mail.outbox[0].body)
+
+    def test_rerun_skips_existing_accounts(self):
+        self.provision()
+        self.assertEqual(self.provision('--send-invites'), {
+            'alice@example.com': '1001', 'bob@example.com': '1002', 'carol@example.com': '2001',
+        })
+        self.assertEqual(mail.outbox, [])
+
+    def test_dry_run_creates_nothing(self):
+        self.assertEqual(self.provision('--dry-run', '--send-invites'), {'alice@example.com': '1001'})
+        self.assertEqual(mail.outbox, [])
+
+
+class ReconcileClientIdsTests(PortalTestCase):
+    def test_client_id_matched_by_two_profiles_goes_to_neither(self):
+        sheets = sample_fixture(settings.GOOGLE_SHEET_ID)['spreadsheets'][settings.GOOGLE_SHEET_ID]['sheets']
+        sheets['LTP'].append(['1002', 'dan@example.com', 'Dan Day', '1 bed', '£1,320', '2098'])
+        self.google.add_spreadsheet(settings.GOOGLE_SHEET_ID, sheets)
+        for username in ('bob', 'dan', 'carol'):
+            User.objects.create_user(username, email=f'{username}@example.com')
+
+        call_command('reconcile_client_ids', stdout=StringIO())
+
+        client_ids = dict(UserProfile.objects.values_list('user__username', 'client_id'))
+        self.assertTrue(client_ids['bob'].startswith('client_'))
+        self.assertTrue(client_ids['dan'].startswith('client_'))
+        self.assertEqual(client_ids['carol'], '2001')
+
+
+class SharedSnapshotLockTests(TestCase):
+    """Another worker holds a tab's lock and doesn't let go"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='test-snapshots-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # Every lookup reads the tab again, and gives up on the lock at once
+        self.enterContext(override_settings(SHEET_SNAPSHOT_DIR=directory, SHEET_SNAPSHOT_LOCK_TIMEOUT=0,
+                                            SHEET_SNAPSHOT_TTL=0, SHEET_SNAPSHOT_STALE_GRACE=0))
+        clear_sheet_snapshots()
+        self.addCleanup(clear_sheet_snapshots)
+        reads = self.reads = []
+
+        class Values:
+            def get(self, spreadsheetId, range):
+                return self
+
+            def execute(self):
+                reads.append(1)
+                return {'values': [['client_id', 'name'], ['1001', 'Budget 2026.pdf']]}
+
+        self.values = Values
+
+    def held_lock(self):
+        path = _snapshot_path((settings.GOOGLE_SHEET_ID, 'Documents'))
+        return file_lock(path[:-len('.snap')] + '.lock', 0)
+
+    def test_serves_the_old_snapshot_instead_of_reading_beside_the_holder(self):
+        get_sheet_snapshot(self.values, 'Documents')
+        with self.held_lock():
+            self.assertEqual(get_sheet_snapshot(self.values, 'Documents').row_count, 2)
+        self.assertEqual(len(self.reads), 1)
+
+    def test_raises_without_a_snapshot(self):
+        with self.held_lock(), self.assertRaises(LockTimeout):
+            get_sheet_snapshot(self.values, 'Documents')
+        self.assertEqual(self.reads, [])
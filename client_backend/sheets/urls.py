@@ -7,6 +7,7 @@ from .views import (
     test_google_sheets_connection,
     test_google_drive_connection,
     chatbot_message,
+    chatbot_message_stream,
     oauth_callback,
     test_client_data,
     admin_oauth_status,
@@ -36,6 +37,7 @@ urlpatterns = [
     path('test-sheets/', test_google_sheets_connection, name='test_sheets'),
     path('test-drive/', test_google_drive_connection, name='test_drive'),
     path('chatbot/', chatbot_message, name='chatbot_message'),
+    path('chatbot/stream/', chatbot_message_stream, name='chatbot_message_stream'),
     
     # Test endpoint for client ID
     path('test-client/<str:client_id>/', test_client_data, name='test_client_data'),
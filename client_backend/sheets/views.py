@@ -1,8 +1,24 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
 from accounts.models import UserProfile, GoogleOAuthToken, AdminGoogleOAuthToken
+from accounts.profile_cache import get_cached_profile
+from monitoring.metrics import record_cache_lookup
+from monitoring.telemetry import annotate
+from .drive_metadata import drive_file_metadata
+from .renderers import EventStreamRenderer
+from .sheet_rows import targeted_rows
+from .single_flight import LockTimeout
+from .snapshots import (
+    get_sheet_snapshot,
+    invalidate_sheet_snapshot,
+    normalize_document_client_id,
+    normalize_email,
+    normalize_id,
+    snapshot_rows,
+)
 from .oauth_utils import (
     get_authorization_url,
     exchange_code_for_tokens,
@@ -18,13 +34,18 @@ from .oauth_utils import (
 from .chatbot import (
     is_relevant_message,
     generate_response,
-    get_denial_message
+    get_denial_message,
+    get_acknowledgement,
+    needs_client_data,
+    build_client_facts
 )
 from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import redirect
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from googleapiclient.errors import HttpError
+import json
 import logging
 import traceback
 
@@ -88,16 +109,43 @@ def oauth_callback(request):
 # Note: get_client_row_oauth removed - now using get_input_sheet_data and get_ltp_data_with_mapped_headers
 # for consistent data lookup across all endpoints
 
+def admin_sheet_values():
+    """The spreadsheets().values() resource of the admin's Sheets service"""
+    return get_admin_sheets_service().spreadsheets().values()
+
+
+def _client_documents(snapshot, client_id):
+    """One client's rows of a Documents sheet snapshot, as dicts keyed by header"""
+    headers = snapshot.head[0] if snapshot.row_count else ()
+    if not headers:
+        return []
+    search_client_id = normalize_document_client_id(client_id)
+    # Rows are matched on their dict's 'client_id', i.e. the last column with that header
+    columns = [idx for idx, header in enumerate(headers) if header == 'client_id']
+    if columns:
+        row_indexes = snapshot.find_all(columns[-1], normalize_document_client_id, search_client_id, 1)
+    else:
+        # Without the column every row's client_id is ''
+        row_indexes = range(1, snapshot.row_count) if not search_client_id else []
+    return [snapshot.row(row_index).as_dict(headers) for row_index in row_indexes]
+
+
 def get_clients_documents_oauth(user, client_id, sheet_name='Documents'):
     """Get all documents for a specific client from Google Sheets using admin OAuth"""
     try:
+        if settings.SHEET_SNAPSHOT_TTL:
+            try:
+                return _client_documents(get_sheet_snapshot(admin_sheet_values, sheet_name), client_id)
+            except LockTimeout:
+                pass  # Another worker is stuck reading the tab: read it directly
+
         service = get_admin_sheets_service()
         result = service.spreadsheets().values().get(
             spreadsheetId=settings.GOOGLE_SHEET_ID,
             range=f'{sheet_name}!A:Z'
         ).execute()
-
         rows = result.get('values', [])
+
         if not rows:
             # Return empty list if sheet is empty (no headers or data)
             return []
@@ -262,7 +310,7 @@ def test_google_sheets_connection(request):
 def client_dashboard(request):
     """Get client data from Google Sheets - supports LTP/VR/Input structure with auto-sync"""
     try:
-        profile = UserProfile.objects.get(user=request.user)
+        profile = get_cached_profile(request.user)
         
         # Use shared multi-step lookup function
         data = get_client_data_multi_step(request.user, profile, auto_sync_client_id=True)
@@ -530,7 +578,7 @@ def upload_document(request):
     to admin's Drive in "Client Portal Documents" folder.
     """
     try:
-        profile = UserProfile.objects.get(user=request.user)
+        profile = get_cached_profile(request.user)
         
         # Get file, name, and description from request
         if 'file' not in request.FILES:
@@ -682,6 +730,7 @@ def upload_document(request):
                 insertDataOption='INSERT_ROWS',
                 body={'values': [row_data]}
             ).execute()
+            invalidate_sheet_snapshot('Documents')
             
             sheets_metadata_saved = True
         except HttpError as e:
@@ -796,7 +845,7 @@ def download_document(request, file_id):
 def client_documents(request):
     """Get client documents from Google Sheets and Google Drive"""
     try:
-        profile = UserProfile.objects.get(user=request.user)
+        profile = get_cached_profile(request.user)
         
         # Skip for new users (default client_id) to avoid 500 errors
         if not profile.client_id or profile.client_id.startswith(f"client_{request.user.id}"):
@@ -816,53 +865,8 @@ def client_documents(request):
             if file_id and file_id not in file_ids_to_fetch:  # Avoid duplicates
                 file_ids_to_fetch.append(file_id)
         
-        # Batch fetch Drive file metadata (if any file_ids exist)
-        # Optimized: Use batch requests for better performance when multiple files
-        drive_files_cache = {}
-        if file_ids_to_fetch:
-            try:
-                drive_service = get_admin_drive_service()
-                # Use batch requests for better performance (Google Drive API supports up to 100 requests per batch)
-                # For small numbers, sequential is fine, but batch is more efficient
-                if len(file_ids_to_fetch) > 1:
-                    # Use batch requests for multiple files (more efficient than sequential)
-                    batch = drive_service.new_batch_http_request()
-                    
-                    def callback(request_id, response, exception):
-                        if exception:
-                            if settings.DEBUG:
-                                logger.warning(f"Could not fetch Drive file {request_id}: {str(exception)}")
-                            drive_files_cache[request_id] = {"error": str(exception)}
-                        else:
-                            drive_files_cache[request_id] = response
-                    
-                    for file_id in file_ids_to_fetch:
-                        batch.add(
-                            drive_service.files().get(
-                                fileId=file_id,
-                                fields='id, name, mimeType, webViewLink, webContentLink, createdTime, modifiedTime'
-                            ),
-                            callback=callback,
-                            request_id=file_id
-                        )
-                    batch.execute()
-                else:
-                    # Single file - direct call is fine
-                    file_id = file_ids_to_fetch[0]
-                    try:
-                        file_metadata = drive_service.files().get(
-                            fileId=file_id,
-                            fields='id, name, mimeType, webViewLink, webContentLink, createdTime, modifiedTime'
-                        ).execute()
-                        drive_files_cache[file_id] = file_metadata
-                    except Exception as e:
-                        if settings.DEBUG:
-                            logger.warning(f"Could not fetch Drive file {file_id}: {str(e)}")
-                        drive_files_cache[file_id] = {"error": str(e)}
-            except Exception as e:
-                # If Drive service fails entirely, log but continue
-                if settings.DEBUG:
-                    logger.warning(f"Could not initialize Drive service: {str(e)}")
+        # Drive file metadata, cached and batch-fetched (drive_metadata.py)
+        drive_files_cache = drive_file_metadata(file_ids_to_fetch)
         
         # Second pass: build response with cached Drive data
         for doc in docs:
@@ -964,6 +968,39 @@ def test_google_drive_connection(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def get_chatbot_client_facts(user):
+    """Get the chatbot fact sheet for a user from the conversation context cache
+    
+    The fact sheet is filled lazily from the multi-step client data lookup and
+    kept for CHATBOT_CONTEXT_TTL seconds, so follow-up messages skip the Google
+    Sheets reads.
+    
+    Returns:
+        Dictionary of chatbot facts (empty if no client data was found)
+    """
+    cache_key = f"chatbot_context:{user.id}"
+    facts = cache.get(cache_key)
+    record_cache_lookup('chatbot_context', facts is not None)
+    if facts is not None:
+        return facts
+    
+    try:
+        user_profile = get_cached_profile(user)
+        # Use shared multi-step lookup (without auto-sync for chatbot to avoid unnecessary DB writes)
+        client_data = get_client_data_multi_step(user, user_profile, auto_sync_client_id=False)
+    except (AdminGoogleOAuthToken.DoesNotExist, UserProfile.DoesNotExist):
+        return {}
+    except Exception as e:
+        # Don't cache failed lookups so the next message retries
+        if settings.DEBUG:
+            logger.warning(f"Chatbot client data lookup failed: {str(e)}")
+        return {}
+    
+    facts = build_client_facts(client_data)
+    cache.set(cache_key, facts, settings.CHATBOT_CONTEXT_TTL)
+    return facts
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def chatbot_message(request):
@@ -980,17 +1017,6 @@ def chatbot_message(request):
                 "error": "Message is required"
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get client data if available - use shared lookup function
-        client_data = None
-        try:
-            user_profile = UserProfile.objects.get(user=request.user)
-            # Use shared multi-step lookup (without auto-sync for chatbot to avoid unnecessary DB writes)
-            client_data = get_client_data_multi_step(request.user, user_profile, auto_sync_client_id=False)
-        except (AdminGoogleOAuthToken.DoesNotExist, UserProfile.DoesNotExist):
-            pass
-        except Exception:
-            pass
-        
         # Check if message is relevant
         if not is_relevant_message(message):
             return Response({
@@ -999,6 +1025,11 @@ def chatbot_message(request):
                 "is_relevant": False
             }, status=status.HTTP_200_OK)
         
+        # Only look up client data for intents that are personalised
+        client_data = None
+        if needs_client_data(message):
+            client_data = get_chatbot_client_facts(request.user)
+        
         # Generate response
         response_text = generate_response(message, client_data)
         
@@ -1016,6 +1047,82 @@ def chatbot_message(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def sse_event(event, data):
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def chatbot_message_stream(request):
+    """
+    Streaming variant of the chatbot endpoint (text/event-stream).
+    
+    Events:
+        ack: immediate holding reply while client data is looked up
+        message: the final reply (same fields as the chatbot endpoint)
+        error: the lookup or response generation failed
+        done: end of the stream
+    """
+    message = request.data.get('message', '')
+    if not isinstance(message, str):
+        return Response({
+            "success": False,
+            "error": "Message must be a string"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    message = message.strip()
+    
+    if not message:
+        return Response({
+            "success": False,
+            "error": "Message is required"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    user = request.user
+    
+    def reply_events():
+        if not is_relevant_message(message):
+            yield sse_event('message', {
+                "success": True,
+                "message": get_denial_message(),
+                "is_relevant": False
+            })
+            return
+        
+        client_data = None
+        if needs_client_data(message):
+            # Send the holding reply before the (possibly slow) Sheets lookup
+            yield sse_event('ack', {"message": get_acknowledgement(message)})
+            client_data = get_chatbot_client_facts(user)
+        
+        yield sse_event('message', {
+            "success": True,
+            "message": generate_response(message, client_data),
+            "is_relevant": True
+        })
+    
+    def event_stream():
+        # A client disconnecting raises GeneratorExit at a yield; that is not caught
+        # here, so nothing is yielded after it
+        try:
+            yield from reply_events()
+        except Exception:
+            logger.exception("Chatbot stream failed")
+            yield sse_event('error', {
+                "success": False,
+                "error": "Internal error",
+                "message": "An error occurred while processing your message. Please try again."
+            })
+        yield sse_event('done', {})
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ==================== ADMIN OAUTH ENDPOINTS ====================
 
 @api_view(['GET'])
@@ -1293,14 +1400,19 @@ def get_client_data_multi_step(user, profile, auto_sync_client_id=True):
                 logger.warning(f"Lookup failed for {func.__name__}: {str(e)}")
             return None
 
+    # Record which step found the row (slow request journal, request log)
+    def matched(step, d):
+        annotate('lookup_step', step)
+        return d
+
     def lookup_by_email():
         # 1. Try LTP sheet (LTP format - Row 1 degrees, Row 2 headers)
         d = try_lookup(get_ltp_data_with_mapped_headers, user, user.email, identifier_column='email', sheet_name='LTP')
-        if d: return d
+        if d: return matched('email:LTP', d)
         
         # 2. Try LTP sheet (Input format - Row 1 headers) - Fallback if user put headers on Row 1
         d = try_lookup(get_input_sheet_data, user, user.email, identifier_column='email', sheet_name='LTP')
-        if d: return d
+        if d: return matched('email:LTP(input format)', d)
         
         # 3. Try Input sheet
         d = try_lookup(get_input_sheet_data, user, user.email, identifier_column='email', sheet_name='Input')
@@ -1312,8 +1424,9 @@ def get_client_data_multi_step(user, profile, auto_sync_client_id=True):
                     d.get('postal_code') or d.get('Postal Code')
                 )
                 if sheet_postcode and str(sheet_postcode).strip().upper() != str(profile.postcode).strip().upper():
+                    annotate('lookup_postcode_mismatch', True)
                     return None
-            return d
+            return matched('email:Input', d)
         return None
 
     def lookup_by_client_id(cid):
@@ -1321,15 +1434,15 @@ def get_client_data_multi_step(user, profile, auto_sync_client_id=True):
         
         # 1. Try LTP sheet (LTP format)
         d = try_lookup(get_ltp_data_with_mapped_headers, user, cid, identifier_column='client_id', sheet_name='LTP')
-        if d: return d
+        if d: return matched('client_id:LTP', d)
         
         # 2. Try LTP sheet (Input format)
         d = try_lookup(get_input_sheet_data, user, cid, identifier_column='client_id', sheet_name='LTP')
-        if d: return d
+        if d: return matched('client_id:LTP(input format)', d)
         
         # 3. Try Input sheet
         d = try_lookup(get_input_sheet_data, user, cid, identifier_column='client_id', sheet_name='Input')
-        if d: return d
+        if d: return matched('client_id:Input', d)
         
         return None
 
@@ -1347,6 +1460,8 @@ def get_client_data_multi_step(user, profile, auto_sync_client_id=True):
         # Fallback to email
         if not data:
             data = lookup_by_email()
+    if not data:
+        annotate('lookup_step', 'not_found')
     
     # STEP 4: Auto-sync client_id from Google Sheet if found (always sync for new users)
     if data and auto_sync_client_id:
@@ -1364,7 +1479,7 @@ def get_client_data_multi_step(user, profile, auto_sync_client_id=True):
             # Always update for new users, or if different for existing users
             if has_default_client_id or profile.client_id != sheet_client_id:
                 profile.client_id = sheet_client_id
-                profile.save()
+                profile.save(update_fields=['client_id'])
     
     # Remove internal row number before returning
     if data and '_row_number' in data:
@@ -1395,6 +1510,29 @@ def get_first_sheet_name(user):
         return 'SCUK Connect'
 
 
+def _vr_unit_mapping(rows):
+    """{unit_code: header_name} from the VR sheet's columns C (header names) and D (unit codes)"""
+    if not rows:
+        return {}
+    
+    # Skip header row if present, build mapping
+    mapping = {}
+    start_idx = 1 if rows and len(rows) > 1 and rows[0] else 0
+    
+    for row in rows[start_idx:]:
+        # Ensure row has at least 2 columns
+        while len(row) < 2:
+            row.append('')
+        
+        header_name = str(row[0]).strip() if row[0] else ''
+        unit_code = str(row[1]).strip() if len(row) > 1 and row[1] else ''
+        
+        if unit_code and header_name:
+            mapping[unit_code] = header_name
+    
+    return mapping
+
+
 def get_vr_unit_mapping(user):
     """Get the mapping of unit codes to header names from VR sheet
     
@@ -1402,6 +1540,14 @@ def get_vr_unit_mapping(user):
     Example: {"1"01": "Property Size", "1"02": "Service Charge"}
     """
     try:
+        if settings.SHEET_SNAPSHOT_TTL:
+            try:
+                # Built once per snapshot of the VR sheet
+                snapshot = get_sheet_snapshot(admin_sheet_values, 'VR')
+                return dict(snapshot.derived('vr_unit_mapping', lambda: _vr_unit_mapping(snapshot.rows())))
+            except LockTimeout:
+                pass  # Another worker is stuck reading the tab: read it directly
+
         service = get_admin_sheets_service()
         sheet = service.spreadsheets()
         
@@ -1411,33 +1557,32 @@ def get_vr_unit_mapping(user):
             range='VR!C:D'
         ).execute()
         
-        rows = result.get('values', [])
-        if not rows:
-            return {}
-        
-        # Skip header row if present, build mapping
-        mapping = {}
-        start_idx = 1 if rows and len(rows) > 1 and rows[0] else 0
-        
-        for row in rows[start_idx:]:
-            # Ensure row has at least 2 columns
-            while len(row) < 2:
-                row.append('')
-            
-            header_name = str(row[0]).strip() if row[0] else ''
-            unit_code = str(row[1]).strip() if len(row) > 1 and row[1] else ''
-            
-            if unit_code and header_name:
-                mapping[unit_code] = header_name
-        
-        return mapping
+        return _vr_unit_mapping(result.get('values', []))
     except Exception as e:
         # VR mapping failed - return empty dict
         return {}
 
 
+def _ltp_identifier_index(headers, identifier_column):
+    """Index of the LTP column holding client ids or emails, or None"""
+    for idx, header in enumerate(headers):
+        header_lower = str(header).strip().lower()
+        if identifier_column.lower() == 'client_id':
+            if header_lower in ['client_id', 'client id', 'clientid']:
+                return idx
+        elif identifier_column.lower() in ['email', 'email']:
+            if header_lower in ['email', 'e-mail', 'e_mail', 'e mail'] or 'email' in header_lower:
+                return idx
+    return None
+
+
 def get_ltp_data_with_mapped_headers(user, row_identifier, identifier_column='client_id', sheet_name='LTP'):
     """Get data from LTP sheet - uses row 1 as degrees and row 2 as headers
+
+    The row is looked up in the sheet snapshot (snapshots.py) unless
+    SHEET_SNAPSHOT_TTL is 0. Without snapshots, SHEET_READ_MODE 'targeted' reads
+    only the header rows, the identifier column and the matching row (see
+    sheet_rows.targeted_rows); 'full' reads the whole sheet.
     
     Args:
         user: Django User object
@@ -1449,92 +1594,87 @@ def get_ltp_data_with_mapped_headers(user, row_identifier, identifier_column='cl
         Dictionary with header names and their values
     """
     try:
-        service = get_admin_sheets_service()
-        sheet = service.spreadsheets()
-        
-        # Read entire sheet to get all rows
-        result = sheet.values().get(
-            spreadsheetId=settings.GOOGLE_SHEET_ID,
-            range=f"'{sheet_name}'!A:ZZ"  # Read more columns to be safe
-        ).execute()
-        
-        rows = result.get('values', [])
-        if not rows or len(rows) < 2:
+        # Normalize the search identifier
+        if identifier_column.lower() == 'email':
+            search_id = str(row_identifier).strip().lower()
+        else:
+            search_id = str(row_identifier).replace('#', '').strip().lower()
+
+        def matches(value):
+            row_identifier_value = str(value).strip()
+            if identifier_column.lower() == 'email':
+                return row_identifier_value.lower() == search_id
+            row_id_clean = row_identifier_value.replace('#', '').strip().lower()
+            return (row_id_clean == search_id or
+                    row_identifier_value.lower() == str(row_identifier).strip().lower())
+
+        def identifier_index(headers):
+            return _ltp_identifier_index(headers, identifier_column)
+
+        found = None
+        if settings.SHEET_SNAPSHOT_TTL:
+            # None while the snapshot is being read in the background
+            normalize = normalize_email if identifier_column.lower() == 'email' else normalize_id
+            found = snapshot_rows(admin_sheet_values, sheet_name, 2, 'ZZ', identifier_index,
+                                  normalize, row_identifier)
+        if found is None:
+            values = admin_sheet_values()
+            if settings.SHEET_READ_MODE == 'targeted':
+                found = targeted_rows(values, sheet_name, 2, 'ZZ', identifier_index, matches)
+            if found is None:
+                # Read entire sheet to get all rows
+                result = values.get(
+                    spreadsheetId=settings.GOOGLE_SHEET_ID,
+                    range=f"'{sheet_name}'!A:ZZ"  # Read more columns to be safe
+                ).execute()
+                rows = result.get('values', [])
+                found = rows[:2], enumerate(rows[2:], start=3)
+        head, data_rows = found
+        if len(head) < 2:
             return None
         
         # Row 1 (index 0) contains degrees, Row 2 (index 1) contains headers
-        degrees = rows[0]
-        headers = rows[1]
+        degrees = head[0]
+        headers = head[1]
         
         if not headers:
             return None
         
         # Find the column index for identifier (client_id or email)
-        identifier_col_index = None
-        
-        for idx, header in enumerate(headers):
-            header_lower = str(header).strip().lower()
-            if identifier_column.lower() == 'client_id':
-                if header_lower in ['client_id', 'client id', 'clientid']:
-                    identifier_col_index = idx
-                    break
-            elif identifier_column.lower() in ['email', 'email']:
-                if header_lower in ['email', 'e-mail', 'e_mail', 'e mail'] or 'email' in header_lower:
-                    identifier_col_index = idx
-                    break
-        
+        identifier_col_index = _ltp_identifier_index(headers, identifier_column)
         if identifier_col_index is None:
             return None
         
-        # Normalize the search identifier
-        if identifier_column.lower() == 'email':
-            search_id = str(row_identifier).strip().lower()
-        else:
-            search_id = str(row_identifier).replace('#', '').strip().lower()
-        
-        # Find matching row - start from row 3 (index 2)
-        for idx, row in enumerate(rows[2:], start=3):
+        # Find matching row - data starts at row 3
+        for idx, row in data_rows:
             # Pad row with empty strings if it's shorter than headers
             while len(row) < len(headers):
                 row.append('')
             
-            if len(row) > identifier_col_index:
-                row_identifier_value = str(row[identifier_col_index]).strip()
-                
-                match_found = False
-                if identifier_column.lower() == 'email':
-                    if row_identifier_value.lower() == search_id:
-                        match_found = True
-                else:
-                    row_id_clean = row_identifier_value.replace('#', '').strip().lower()
-                    if (row_id_clean == search_id or 
-                        row_identifier_value.lower() == str(row_identifier).strip().lower()):
-                        match_found = True
-
-                if match_found:
-                    # Found matching row, create dictionary
-                    row_data = {}
-                    for col_idx, value in enumerate(row):
-                        value_str = str(value).strip() if value else ''
-                        
-                        # Add by degree (from row 1)
-                        if col_idx < len(degrees) and degrees[col_idx]:
-                            degree_key = str(degrees[col_idx]).strip()
-                            if degree_key:
-                                row_data[degree_key] = value_str
-                        
-                        # Add by header name (from row 2)
-                        if col_idx < len(headers) and headers[col_idx]:
-                            header_name = str(headers[col_idx]).strip()
-                            if header_name:
-                                # Add original header name
-                                row_data[header_name] = value_str
-                                # Add normalized header name
-                                norm_key = header_name.lower().replace(' ', '_').replace('-', '_')
-                                row_data[norm_key] = value_str
+            if len(row) > identifier_col_index and matches(row[identifier_col_index]):
+                # Found matching row, create dictionary
+                row_data = {}
+                for col_idx, value in enumerate(row):
+                    value_str = str(value).strip() if value else ''
                     
-                    row_data['_row_number'] = idx
-                    return row_data
+                    # Add by degree (from row 1)
+                    if col_idx < len(degrees) and degrees[col_idx]:
+                        degree_key = str(degrees[col_idx]).strip()
+                        if degree_key:
+                            row_data[degree_key] = value_str
+                    
+                    # Add by header name (from row 2)
+                    if col_idx < len(headers) and headers[col_idx]:
+                        header_name = str(headers[col_idx]).strip()
+                        if header_name:
+                            # Add original header name
+                            row_data[header_name] = value_str
+                            # Add normalized header name
+                            norm_key = header_name.lower().replace(' ', '_').replace('-', '_')
+                            row_data[norm_key] = value_str
+                
+                row_data['_row_number'] = idx
+                return row_data
         
         return None
     except HttpError as e:
@@ -1548,6 +1688,8 @@ def get_ltp_data_with_mapped_headers(user, row_identifier, identifier_column='cl
 
 def get_input_sheet_data(user, row_identifier, identifier_column='client_id', sheet_name='Input'):
     """Get data from Input sheet (standard format with readable headers)
+
+    Uses the sheet snapshot, or targeted reads, like get_ltp_data_with_mapped_headers.
     
     Args:
         user: Django User object
@@ -1559,49 +1701,58 @@ def get_input_sheet_data(user, row_identifier, identifier_column='client_id', sh
         Dictionary with column names and values
     """
     try:
-        service = get_admin_sheets_service()
-        sheet = service.spreadsheets()
-        
-        result = sheet.values().get(
-            spreadsheetId=settings.GOOGLE_SHEET_ID,
-            range=f'{sheet_name}!A:Z'
-        ).execute()
-        
-        rows = result.get('values', [])
-        if not rows:
+        def identifier_index(headers):
+            for idx, header in enumerate(headers):
+                if str(header).strip().lower() == identifier_column.lower():
+                    return idx
+            return None
+
+        # Normalize the search identifier
+        search_id = str(row_identifier).replace('#', '').strip()
+
+        def matches(value):
+            # Match: exact, case-insensitive, with/without #
+            row_identifier_value = str(value).strip()
+            row_id_clean = row_identifier_value.replace('#', '').strip()
+            return (row_id_clean.lower() == search_id.lower() or
+                    row_identifier_value.lower() == str(row_identifier).strip().lower())
+
+        found = None
+        if settings.SHEET_SNAPSHOT_TTL:
+            found = snapshot_rows(admin_sheet_values, sheet_name, 1, 'Z', identifier_index,
+                                  normalize_id, row_identifier)
+        if found is None:
+            values = admin_sheet_values()
+            if settings.SHEET_READ_MODE == 'targeted':
+                found = targeted_rows(values, sheet_name, 1, 'Z', identifier_index, matches)
+            if found is None:
+                result = values.get(
+                    spreadsheetId=settings.GOOGLE_SHEET_ID,
+                    range=f'{sheet_name}!A:Z'
+                ).execute()
+                rows = result.get('values', [])
+                found = rows[:1], enumerate(rows[1:], start=2)
+        head, data_rows = found
+        if not head:
             return None
         
-        headers = rows[0] if rows else []
+        headers = head[0]
         
         # Find the column index for identifier
-        identifier_col_index = None
-        for idx, header in enumerate(headers):
-            if str(header).strip().lower() == identifier_column.lower():
-                identifier_col_index = idx
-                break
-        
+        identifier_col_index = identifier_index(headers)
         if identifier_col_index is None:
             return None
         
-        # Normalize the search identifier
-        search_id = str(row_identifier).replace('#', '').strip()
-        
         # Find matching row
-        for idx, row in enumerate(rows[1:], start=2):
+        for idx, row in data_rows:
             while len(row) < len(headers):
                 row.append('')
             
-            if len(row) > identifier_col_index:
-                row_identifier_value = str(row[identifier_col_index]).strip()
-                row_id_clean = row_identifier_value.replace('#', '').strip()
-                
-                # Match: exact, case-insensitive, with/without #
-                if (row_id_clean.lower() == search_id.lower() or 
-                    row_identifier_value.lower() == str(row_identifier).strip().lower()):
-                    # Found matching row
-                    row_data = dict(zip(headers, row))
-                    row_data['_row_number'] = idx
-                    return row_data
+            if len(row) > identifier_col_index and matches(row[identifier_col_index]):
+                # Found matching row
+                row_data = dict(zip(headers, row))
+                row_data['_row_number'] = idx
+                return row_data
         
         return None
     except HttpError as e:
@@ -5,6 +5,7 @@ import Sidebar from "./components/Sidebar";
 import Navbar from "./components/Navbar";
 import PrivateRoute from "./routes/PrivateRoute";
 import Login from "./pages/Login";
+import AcceptInvite from "./pages/AcceptInvite";
 import Dashboard from "./pages/Dashboard";
 import MyTrends from "./pages/MyTrends";
 import MarketComparison from "./pages/MarketComparison";
@@ -57,6 +58,7 @@ function App() {
         <Router>
           <Routes>
             <Route path="/login" element={<Login />} />
+            <Route path="/accept-invite" element={<AcceptInvite />} />
             <Route
               path="/*"
               element={
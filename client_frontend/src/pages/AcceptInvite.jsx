@@ -0,0 +1,161 @@
+import { useState } from "react";
+import { useNavigate, useSearchParams } from "react-router-dom";
+import { Eye, EyeOff } from "lucide-react";
+import { useAuth } from "../auth/AuthContext";
+import api from "../api/api";
+import logoImage from "../logo.png";
+
+// Landing page of the invite emails sent by provision_clients:
+// /accept-invite?uid=...&token=...
+const AcceptInvite = () => {
+  const navigate = useNavigate();
+  const [searchParams] = useSearchParams();
+  const { login } = useAuth();
+  const [showPassword, setShowPassword] = useState(false);
+  const [password, setPassword] = useState("");
+  const [confirmPassword, setConfirmPassword] = useState("");
+  const [error, setError] = useState("");
+  const [submitting, setSubmitting] = useState(false);
+
+  const uid = searchParams.get("uid");
+  const token = searchParams.get("token");
+
+  const handleSubmit = async (e) => {
+    e.preventDefault();
+    setError("");
+
+    if (password.length < 8) {
+      setError("Your password must be at least 8 characters.");
+      return;
+    }
+    if (password !== confirmPassword) {
+      setError("The passwords don't match.");
+      return;
+    }
+
+    setSubmitting(true);
+    try {
+      const response = await api.post("/api/accounts/invite/accept/", {
+        uid,
+        token,
+        password,
+      });
+
+      const { access, refresh, user } = response.data;
+
+      const userData = {
+        name: user.email.split("@")[0],
+        email: user.email,
+      };
+
+      login(userData, access);
+      localStorage.setItem("refresh_token", refresh);
+      navigate("/dashboard", { replace: true });
+    } catch (error) {
+      if (process.env.NODE_ENV === 'development') {
+        console.error("Accept invite error:", error.response?.data || error.message);
+      }
+      const errorData = error.response?.data;
+      setError(
+        errorData?.error ||
+        (errorData?.errors?.password && errorData.errors.password.join(" ")) ||
+        "Could not set your password. Please try again later."
+      );
+    } finally {
+      setSubmitting(false);
+    }
+  };
+
+  return (
+    <div className="min-h-screen flex flex-col lg:flex-row font-inter">
+      {/* Left Section - Teal Background */}
+      <div className="lg:w-[40%] bg-sidebar lg:rounded-r-3xl flex flex-col justify-between p-8 lg:p-12 text-white">
+        <div className="mb-8 lg:mb-16 flex justify-end ">
+          <img
+            src={logoImage}
+            alt="Service Charge UK"
+            className="h-22 lg:h-40 w-auto object-contain"
+            style={{ display: 'block' }}
+          />
+        </div>
+      </div>
+
+      {/* Right Section - White Background with Form */}
+      <div className="flex-1 lg:w-[60%] flex items-center justify-center p-6 lg:p-8 bg-white">
+        <div className="w-full max-w-md">
+          <div className="mb-8">
+            <h2 className="text-3xl font-bold text-gray-900 mb-2">
+              Welcome.
+            </h2>
+            <p className="text-base text-gray-600">
+              Set a password to activate your account.
+            </p>
+          </div>
+
+          {!uid || !token ? (
+            <p className="text-sm text-red-600">
+              This invite link is incomplete. Please use the link from your invite email.
+            </p>
+          ) : (
+            <form onSubmit={handleSubmit} className="space-y-5">
+              <div>
+                <label htmlFor="password" className="block text-sm font-medium text-gray-700 mb-2">
+                  Password
+                </label>
+                <div className="relative">
+                  <input
+                    type={showPassword ? "text" : "password"}
+                    id="password"
+                    name="password"
+                    value={password}
+                    onChange={(e) => setPassword(e.target.value)}
+                    placeholder="Choose a password..."
+                    className="w-full px-4 py-3 border border-gray-900 rounded-lg focus:outline-none focus:ring-2 focus:ring-sidebar focus:border-transparent text-sm pr-12"
+                  />
+                  <button
+                    type="button"
+                    onClick={() => setShowPassword(!showPassword)}
+                    className="absolute right-3 top-1/2 transform -translate-y-1/2 text-gray-500 hover:text-gray-700"
+                  >
+                    {showPassword ? (
+                      <EyeOff className="w-5 h-5" />
+                    ) : (
+                      <Eye className="w-5 h-5" />
+                    )}
+                  </button>
+                </div>
+              </div>
+
+              <div>
+                <label htmlFor="confirmPassword" className="block text-sm font-medium text-gray-700 mb-2">
+                  Confirm password
+                </label>
+                <input
+                  type={showPassword ? "text" : "password"}
+                  id="confirmPassword"
+                  name="confirmPassword"
+                  value={confirmPassword}
+                  onChange={(e) => setConfirmPassword(e.target.value)}
+                  placeholder="Enter it again..."
+                  className="w-full px-4 py-3 border border-gray-900 rounded-lg focus:outline-none focus:ring-2 focus:ring-sidebar focus:border-transparent text-sm"
+                />
+              </div>
+
+              {error && <p className="text-sm text-red-600">{error}</p>}
+
+              <button
+                type="submit"
+                disabled={submitting}
+                className="w-full bg-sidebar text-white py-3 rounded-lg font-medium hover:bg-teal-600 transition-colors text-sm disabled:opacity-60"
+              >
+                {submitting ? "Activating..." : "Activate account"}
+              </button>
+            </form>
+          )}
+        </div>
+      </div>
+    </div>
+  );
+};
+
+export default AcceptInvite;